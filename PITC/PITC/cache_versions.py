@@ -0,0 +1,58 @@
+"""Versions of database rows kept in a shared cache.
+
+Caches whose entries are derived from database rows (the ETags of
+execution.http_cache, the membership sets of execution.memberships and
+the report statistics of stat_analysis.report_cache) embed versions of
+those rows in their keys instead of deleting entries. A write bumps the
+versions it touches, so entries stored under earlier versions are never
+read again. The versions must be kept in a cache shared by every process
+that writes; shared_cache() refuses process-local ones.
+
+A bump replaces a version with a fresh random value rather than
+incrementing it. incr() is not atomic on every backend: FileBasedCache
+implements it as a get() and a set(), so two concurrent increments can
+store the same value and the second write would not change the version
+the first one produced. Random values need no read, so concurrent bumps
+always leave a version no earlier entry was stored under, and so do sums
+of several versions, which is how report_cache combines them. A version
+that is missing, never set or evicted, also starts at a random value.
+"""
+
+import random
+
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connection, transaction
+
+def shared_cache(alias):
+    """Return the cache ``alias``, or None if it is unset or process-local."""
+    if not alias or isinstance(caches[alias], LocMemCache):
+        # Other processes would never see this process's bumps.
+        return None
+    return caches[alias]
+
+def _new_version():
+    return random.getrandbits(48)
+
+def bump(cache, keys):
+    cache.set_many({key: _new_version() for key in keys}, timeout=None)
+
+def read(cache, keys):
+    """Return {key: version} for ``keys``."""
+    keys = list(keys)
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # add() rather than set(), so that concurrent readers agree on the new version.
+            cache.add(key, _new_version(), timeout=None)
+            versions[key] = cache.get(key, 0)
+    return versions
+
+def bump_after_write(cache, keys):
+    # Bump now, so reads later in this transaction miss, and again on commit,
+    # so entries computed by other connections before the commit miss too.
+    # Outside a transaction the write is already committed: one bump will do.
+    keys = list(keys)
+    bump(cache, keys)
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: bump(cache, keys))
@@ -0,0 +1,91 @@
+"""
+Database configuration read from the environment.
+
+``DATABASE_URL`` selects the backend:
+
+- unset, or ``sqlite:///<path>``: SQLite, for development and single-node
+  deployments. Relative paths are resolved against BASE_DIR.
+- ``postgres://<user>:<password>@<host>:<port>/<name>``: PostgreSQL.
+
+Connection handling is tuned with:
+
+- ``DB_CONN_MAX_AGE``: seconds a connection is kept open between requests
+  (default 60; 0 closes it after every request, ``none`` never does).
+- ``DB_CONN_HEALTH_CHECKS``: check a persistent connection before reusing
+  it (default on).
+- ``DB_POOL``: use psycopg's connection pool instead of persistent
+  connections (PostgreSQL on Django 5.1+ only), sized by
+  ``DB_POOL_MIN_SIZE`` and ``DB_POOL_MAX_SIZE``.
+- ``DB_SQLITE_TIMEOUT``: seconds a SQLite connection waits for a lock
+  before raising "database is locked" (default 20).
+
+``DATABASE_REPLICA_URL``, in the same format, configures the 'replica'
+alias used for read-only queries (see PITC.routers).
+
+SQLite connections additionally get the PRAGMAs in settings.SQLITE_PRAGMAS
+(see apply_sqlite_pragmas()).
+"""
+
+import os
+from pathlib import Path
+from urllib.parse import unquote, urlsplit
+
+import django
+
+POSTGRES_SCHEMES = ('postgres', 'postgresql', 'pgsql')
+
+def _bool(value):
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+def _conn_max_age(value):
+    return None if value.strip().lower() == 'none' else int(value)
+
+def database_config(base_dir, environ=os.environ, url=None):
+    """Return the DATABASES entry described by ``environ``, at ``url`` if given instead of DATABASE_URL."""
+    url = urlsplit(url or environ.get('DATABASE_URL', 'sqlite:///db.sqlite3'))
+    config = {
+        'CONN_MAX_AGE': _conn_max_age(environ.get('DB_CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': _bool(environ.get('DB_CONN_HEALTH_CHECKS', 'true')),
+    }
+    if url.scheme == 'sqlite':
+        # sqlite:///relative.sqlite3 and sqlite:////absolute/path.sqlite3
+        path = Path(unquote(url.path[1:]))
+        config.update({
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': path if path.is_absolute() else Path(base_dir) / path,
+            # Busy timeout: wait for a concurrent writer instead of failing at once.
+            'OPTIONS': {'timeout': float(environ.get('DB_SQLITE_TIMEOUT', '20'))},
+        })
+    elif url.scheme in POSTGRES_SCHEMES:
+        config.update({
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': unquote(url.path[1:]),
+            'USER': unquote(url.username or ''),
+            'PASSWORD': unquote(url.password or ''),
+            'HOST': url.hostname or '',
+            'PORT': str(url.port or ''),
+            'OPTIONS': {},
+        })
+        if _bool(environ.get('DB_POOL', 'false')):
+            if django.VERSION < (5, 1):
+                raise ValueError("DB_POOL requires Django 5.1 or later.")
+            config['OPTIONS']['pool'] = {
+                'min_size': int(environ.get('DB_POOL_MIN_SIZE', '2')),
+                'max_size': int(environ.get('DB_POOL_MAX_SIZE', '10')),
+            }
+            # Pooled connections are returned to the pool after each request;
+            # Django refuses a pool combined with persistent connections.
+            config['CONN_MAX_AGE'] = 0
+    else:
+        raise ValueError(f"Unsupported DATABASE_URL scheme {url.scheme!r}.")
+    return config
+
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    """connection_created receiver applying settings.SQLITE_PRAGMAS to new SQLite connections."""
+    from django.conf import settings
+
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for pragma, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+            cursor.execute(f'PRAGMA {pragma} = {value}')
@@ -0,0 +1,174 @@
+"""
+Per-request instrumentation of the API.
+
+With settings.API_INSTRUMENTATION on, InstrumentationMiddleware records for
+every request:
+
+- the number of SQL queries and the time spent in them, on every database
+  alias;
+- duplicate queries: executions of SQL already run in the same request,
+  usually with other parameters, the signature of an N+1 query pattern;
+- serializer time: time spent validating and representing data in the
+  serializers of ViewSets using InstrumentedViewSetMixin (database time
+  of lazily loaded relations is included in both);
+- the total time.
+
+They are sent in a Server-Timing response header, which browser developer
+tools display, and added to per-route aggregates (request count, latency
+histogram, query and serializer totals) keyed by method and URL name and
+served as JSON by metrics_view at ``/api/metrics/``.
+
+When the setting is off the middleware raises MiddlewareNotUsed, so Django
+leaves it out of the handler, and InstrumentedViewSetMixin finds no metrics
+to record into: a disabled deployment pays one context variable lookup per
+serializer. Aggregates are kept per process. Queries run while a streaming
+response is being sent, after the view returned, are not counted.
+"""
+
+import bisect
+import contextvars
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import Http404, JsonResponse
+
+# Upper bounds, in milliseconds, of the latency histogram buckets; a last bucket holds slower requests.
+LATENCY_EDGES_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+_current_metrics = contextvars.ContextVar('request_metrics', default=None)
+
+def is_enabled():
+    return getattr(settings, 'API_INSTRUMENTATION', False)
+
+def current_metrics():
+    return _current_metrics.get()
+
+class RequestMetrics:
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.statements = Counter()
+
+    @property
+    def duplicate_queries(self):
+        return sum(count - 1 for count in self.statements.values())
+
+    def __call__(self, execute, sql, params, many, context):
+        # Installed with connection.execute_wrapper().
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+            self.statements[sql] += 1
+
+    def time_serializer(self, function):
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.serializer_time += time.perf_counter() - started
+        return timed
+
+def server_timing(metrics, elapsed):
+    return ', '.join([
+        f'db;dur={metrics.db_time * 1000:.2f};desc="{metrics.queries} queries, {metrics.duplicate_queries} duplicate"',
+        f'serializer;dur={metrics.serializer_time * 1000:.2f}',
+        f'total;dur={elapsed * 1000:.2f}',
+    ])
+
+class MetricsRegistry:
+    """Thread-safe per-route aggregates of RequestMetrics."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}
+
+    def record(self, route, elapsed, metrics):
+        elapsed_ms = elapsed * 1000
+        with self._lock:
+            stats = self._routes.get(route)
+            if stats is None:
+                stats = self._routes[route] = {
+                    'count': 0,
+                    'latency_ms_sum': 0.0,
+                    'latency_ms_histogram': [0] * (len(LATENCY_EDGES_MS) + 1),
+                    'queries_sum': 0,
+                    'queries_max': 0,
+                    'duplicate_queries_sum': 0,
+                    'duplicate_queries_max': 0,
+                    'db_ms_sum': 0.0,
+                    'serializer_ms_sum': 0.0,
+                }
+            stats['count'] += 1
+            stats['latency_ms_sum'] += elapsed_ms
+            stats['latency_ms_histogram'][bisect.bisect_left(LATENCY_EDGES_MS, elapsed_ms)] += 1
+            stats['queries_sum'] += metrics.queries
+            stats['queries_max'] = max(stats['queries_max'], metrics.queries)
+            stats['duplicate_queries_sum'] += metrics.duplicate_queries
+            stats['duplicate_queries_max'] = max(stats['duplicate_queries_max'], metrics.duplicate_queries)
+            stats['db_ms_sum'] += metrics.db_time * 1000
+            stats['serializer_ms_sum'] += metrics.serializer_time * 1000
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                route: {**stats, 'latency_ms_histogram': list(stats['latency_ms_histogram'])}
+                for route, stats in self._routes.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+
+registry = MetricsRegistry()
+
+def route_of(request):
+    match = request.resolver_match
+    return f"{request.method} {match.view_name if match else 'unresolved'}"
+
+class InstrumentationMiddleware:
+    def __init__(self, get_response):
+        if not is_enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        token = _current_metrics.set(metrics)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics))
+                response = self.get_response(request)
+        finally:
+            _current_metrics.reset(token)
+        elapsed = time.perf_counter() - started
+        response['Server-Timing'] = server_timing(metrics, elapsed)
+        registry.record(route_of(request), elapsed, metrics)
+        return response
+
+def metrics_view(request):
+    if not is_enabled():
+        raise Http404
+    return JsonResponse({'latency_ms_edges': list(LATENCY_EDGES_MS), 'routes': registry.snapshot()})
+
+class InstrumentedViewSetMixin:
+    """Adds the time spent in the ViewSet's serializers to the request's metrics."""
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        metrics = current_metrics()
+        if metrics is not None:
+            serializer.run_validation = metrics.time_serializer(serializer.run_validation)
+            serializer.to_representation = metrics.time_serializer(serializer.to_representation)
+        return serializer
@@ -0,0 +1,77 @@
+"""
+Routing of read queries to a replica database.
+
+Reads go to settings.READ_REPLICA_ALIAS only inside read_from_replica(),
+which wraps the code paths that tolerate replication lag: the report
+calculators of stat_analysis and the list and export endpoints (see
+ReplicaReadMixin). Everything else, including reads that follow a write
+such as a retrieve after a create, stays on 'default', as do all writes
+and any read made inside a transaction on 'default'.
+
+The flag is a context variable, so it is visible to code running in the
+same context only; thread pools have to run their tasks in a copy of the
+caller's context (contextvars.copy_context()) to inherit it.
+
+Data read from the replica may lag the primary, so caches whose entries are
+invalidated by writes to the primary must not store it under the current
+version; reading_from_replica() tells them when that is the case.
+"""
+
+import contextvars
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_replica_reads = contextvars.ContextVar('replica_reads', default=False)
+
+def replica_alias():
+    alias = getattr(settings, 'READ_REPLICA_ALIAS', None)
+    return alias if alias in settings.DATABASES else None
+
+@contextmanager
+def read_from_replica():
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+def reading_from_replica():
+    """Whether reads are routed to the replica here, i.e. may return data older than the primary's."""
+    return replica_alias() is not None and _replica_reads.get() and not connections[DEFAULT_DB_ALIAS].in_atomic_block
+
+class ReadReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if replica_alias() is None or not _replica_reads.get():
+            # Let Django follow the instance hint, so related objects of rows
+            # read from the replica are read from it too.
+            return None
+        if not reading_from_replica():
+            # The transaction may have written rows the replica cannot see yet.
+            return DEFAULT_DB_ALIAS
+        return replica_alias()
+
+    def db_for_write(self, model, **hints):
+        # Explicit, so that saving an instance read from the replica still writes to the primary.
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica receives its schema through replication.
+        if db == replica_alias():
+            return False
+        return None
+
+class ReplicaReadMixin:
+    """Runs the ViewSet actions in ``replica_read_actions`` inside read_from_replica()."""
+    replica_read_actions = ('list',)
+
+    def dispatch(self, request, *args, **kwargs):
+        if self.action_map.get(request.method.lower()) in self.replica_read_actions:
+            with read_from_replica():
+                return super().dispatch(request, *args, **kwargs)
+        return super().dispatch(request, *args, **kwargs)
@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from .database import database_config
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 AUTH_USER_MODEL = 'execution.User'
@@ -43,6 +46,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so that its timings cover the other middleware; inactive unless API_INSTRUMENTATION is on.
+    'PITC.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -76,14 +81,118 @@ WSGI_APPLICATION = 'PITC.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
+# Configured from DATABASE_URL and the DB_* environment variables; see
+# PITC/database.py. Defaults to SQLite at BASE_DIR / 'db.sqlite3'.
+# 'replica' points at DATABASE_REPLICA_URL, or at the primary when that is
+# unset. Tests get a separate replica database, which nothing replicates
+# to, so they can make it lag behind 'default'.
 DATABASES = {
+    'default': database_config(BASE_DIR),
+    'replica': database_config(BASE_DIR, url=os.environ.get('DATABASE_REPLICA_URL')),
+}
+if DATABASES['replica']['ENGINE'] != 'django.db.backends.sqlite3':
+    # SQLite test databases are in memory and named after their alias; others are named after NAME.
+    DATABASES['replica']['TEST'] = {'NAME': f"test_{DATABASES['replica']['NAME']}_replica"}
+
+# Report computations and list endpoints read from this alias (see
+# PITC.routers); None keeps every query on 'default'.
+READ_REPLICA_ALIAS = 'replica' if os.environ.get('DATABASE_REPLICA_URL') else None
+
+DATABASE_ROUTERS = ['PITC.routers.ReadReplicaRouter']
+
+# Applied to every new SQLite connection (see PITC.database.apply_sqlite_pragmas).
+SQLITE_PRAGMAS = {
+    'temp_store': 'MEMORY',
+    'cache_size': -20000,  # KiB
+    'mmap_size': 128 * 1024 * 1024,
+}
+# WAL lets readers run alongside the single writer, and synchronous=NORMAL
+# only syncs at checkpoints, which is safe in WAL mode. The journal mode is
+# stored in the database file itself, and WAL adds -wal and -shm files next
+# to it, so deployments opt in rather than every manage.py run converting
+# the database it touches.
+if os.environ.get('SQLITE_WAL', '').lower() in ('1', 'true', 'yes', 'on'):
+    SQLITE_PRAGMAS.update({'journal_mode': 'WAL', 'synchronous': 'NORMAL'})
+
+
+# API instrumentation (see PITC.instrumentation): query counts, database and
+# serializer time per request in Server-Timing headers and /api/metrics/.
+# When off, the middleware removes itself at startup.
+API_INSTRUMENTATION = os.environ.get('API_INSTRUMENTATION', '').lower() in ('1', 'true', 'yes', 'on')
+
+
+# Django REST framework
+# https://www.django-rest-framework.org/api-guide/settings/
+
+REST_FRAMEWORK = {
+    'DEFAULT_PAGINATION_CLASS': 'execution.pagination.KeysetPagination',
+    'PAGE_SIZE': 100,
+}
+
+
+# Caches
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+
+# Directory of the file-based caches shared by the processes of one host.
+CACHE_DIR = os.environ.get('CACHE_DIR', os.path.join(BASE_DIR, '.cache'))
+
+CACHES = {
+    # Holds version counters bumped by whichever process writes (see
+    # EXECUTION_HTTP_CACHE and EXECUTION_MEMBERSHIP_CACHE below), so it is
+    # shared by the processes of one host; use e.g. Redis across hosts. It
+    # also holds the cached pages and membership sets, so it is sized well
+    # above the backend's default of 300 entries, which would keep culling
+    # the counters.
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(CACHE_DIR, 'default'),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    # Computed report statistics (see stat_analysis.report_cache). Keep this
+    # alias dedicated: it is cleared when the rollups are rebuilt. Its version
+    # counters are bumped by whichever process writes, so the web workers and
+    # the report worker must share it: a file-based cache on one host, or
+    # e.g. Redis across hosts. Culling evicts superseded entries.
+    'stat_reports': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(CACHE_DIR, 'stat_reports'),
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
 }
 
 
+# Cache alias of the version counters behind the ETags of the job and
+# service provider endpoints (see execution.http_cache); None, or a
+# process-local LocMemCache alias, disables conditional GET.
+EXECUTION_HTTP_CACHE = 'default'
+
+# Also cache the serialized pages of those endpoints, keyed by their ETag.
+EXECUTION_PAGE_CACHE = False
+
+# Cache alias of the per-manager sets of actively managed providers (see
+# execution.memberships); None, or a process-local LocMemCache alias, reads
+# them from the database every time.
+EXECUTION_MEMBERSHIP_CACHE = 'default'
+
+
+# Reporting (stat_analysis)
+
+# Compute the job, order and user statistics of a report concurrently.
+STAT_ANALYSIS_PARALLEL_REPORTS = True
+
+# Cache alias for computed report statistics; None, or a process-local
+# LocMemCache alias, disables the cache.
+STAT_ANALYSIS_REPORT_CACHE = 'stat_reports'
+
+# 'rollup' reads the quarterly rollup tables; 'vectorized' computes reports
+# in memory with NumPy (see stat_analysis.vectorized) when it is installed.
+STAT_ANALYSIS_BACKEND = 'rollup'
+
+# Sum revenue from the stored Order.line_total instead of joining Job (see stat_analysis.revenue).
+STAT_ANALYSIS_USE_LINE_TOTAL = True
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -124,3 +233,6 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Tests run against temporary copies of the file-based caches (see PITC.test_runner).
+TEST_RUNNER = 'PITC.test_runner.TestRunner'
@@ -0,0 +1,31 @@
+"""Test runner for the project.
+
+Tests run against temporary copies of the file-based caches (see
+PITC.testing.temporary_file_caches()): entries of a previous run, keyed by
+primary keys that a fresh test database reuses, would otherwise be read
+as current, and test data would leak into the caches of the development
+server.
+
+The test databases are created without DATABASE_ROUTERS, so the replica
+test database, which nothing replicates to, gets its schema from the
+migrations like 'default'.
+"""
+
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+from .testing import temporary_file_caches
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._file_caches = temporary_file_caches()
+        self._file_caches.__enter__()
+
+    def setup_databases(self, **kwargs):
+        with override_settings(DATABASE_ROUTERS=[]):
+            return super().setup_databases(**kwargs)
+
+    def teardown_test_environment(self, **kwargs):
+        self._file_caches.__exit__(None, None, None)
+        super().teardown_test_environment(**kwargs)
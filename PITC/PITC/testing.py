@@ -0,0 +1,49 @@
+"""Helpers for tests and benchmarks.
+
+temporary_file_caches() moves the file-based caches to a temporary
+directory: they outlive the process and are shared with any running
+server, so throwaway databases must not read or write their entries.
+
+The 'replica' test database is separate from 'default' and nothing
+replicates to it (see PITC.test_runner), so tests can make it lag behind
+the primary and check what reads from it see (ReplicaTestMixin).
+"""
+
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test.utils import override_settings
+
+@contextmanager
+def temporary_file_caches():
+    directory = tempfile.mkdtemp(prefix='pitc-cache-')
+    caches = {
+        alias: {**config, 'LOCATION': f'{directory}/{alias}'} if config['BACKEND'].endswith('FileBasedCache') else config
+        for alias, config in settings.CACHES.items()
+    }
+    try:
+        with override_settings(CACHES=caches):
+            yield
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+class ReplicaTestMixin:
+    """For TransactionTestCases that read from the replica; use with @override_settings(READ_REPLICA_ALIAS='replica')."""
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        super().setUp()
+        # The router keeps flush away from the replica, so its rows would outlive the test.
+        self.addCleanup(self.flush_replica)
+
+    def replicate(self, *models):
+        """Copy the rows of ``models`` written to 'default' so far to the replica, parents first."""
+        for model in models:
+            model._base_manager.using('replica').bulk_create(model._base_manager.using('default').all())
+
+    def flush_replica(self):
+        with override_settings(DATABASE_ROUTERS=[]):
+            call_command('flush', database='replica', interactive=False, inhibit_post_migrate=True, verbosity=0)
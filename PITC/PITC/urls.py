@@ -17,8 +17,12 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from .instrumentation import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('api/metrics/', metrics_view, name='api-metrics'),
     path('api/', include('execution.urls')),
+    path('api/', include('stat_analysis.urls')),
 
 ]
@@ -0,0 +1,12 @@
+"""Benchmarks for the execution and stat_analysis apps.
+
+Each benchmark is a module runnable from the project directory, e.g.::
+
+    python -m benchmarks.report_indexes --orders 200000
+
+Benchmarks run against a throwaway test database (see benchmarks.setup),
+never against the configured development database, seeded by
+benchmarks.datagen. benchmarks.suite times the main code paths and writes
+the results as JSON; benchmarks.compare diffs two such files, e.g. from
+two commits, and fails on regressions.
+"""
@@ -0,0 +1,56 @@
+"""Compare two benchmarks.suite result files and flag regressions.
+
+    python -m benchmarks.compare base.json head.json --threshold 0.15
+
+For every benchmark in both files prints the base and head timings and
+their ratio. A benchmark regressed when its head time exceeds the base time
+by more than ``--threshold`` (a fraction) or when it runs more SQL queries.
+Exits with status 1 if any benchmark regressed, so it can gate CI.
+"""
+
+import argparse
+import json
+import sys
+
+def load(path):
+    with open(path) as file:
+        return json.load(file)
+
+def compare(base, head, metric='min_s', threshold=0.1):
+    """Return a list of (name, base time, head time, ratio, base queries, head queries, regressed)."""
+    rows = []
+    for name in sorted(base['results'].keys() & head['results'].keys()):
+        before, after = base['results'][name], head['results'][name]
+        ratio = after[metric] / before[metric] if before[metric] else float('inf')
+        regressed = ratio > 1 + threshold or after['queries'] > before['queries']
+        rows.append((name, before[metric], after[metric], ratio, before['queries'], after['queries'], regressed))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('base')
+    parser.add_argument('head')
+    parser.add_argument('--metric', choices=('min_s', 'median_s'), default='min_s')
+    parser.add_argument('--threshold', type=float, default=0.1, help="allowed slowdown, as a fraction")
+    args = parser.parse_args()
+
+    base, head = load(args.base), load(args.head)
+    if base['meta'].get('parameters') != head['meta'].get('parameters'):
+        print('warning: the results were produced with different parameters', file=sys.stderr)
+    print(f"base {base['meta'].get('commit')}, head {head['meta'].get('commit')}")
+
+    rows = compare(base, head, metric=args.metric, threshold=args.threshold)
+    for name, before, after, ratio, queries_before, queries_after, regressed in rows:
+        queries = f'{queries_before} -> {queries_after}' if queries_before != queries_after else f'{queries_after}'
+        print(f"{'REGRESSED' if regressed else '':>9} {name:>48}: {before * 1000:10.2f} -> {after * 1000:10.2f} ms "
+              f"({ratio:5.2f}x), {queries} queries")
+    for name in sorted(base['results'].keys() - head['results'].keys()):
+        print(f"{'':>9} {name:>48}: only in base")
+    for name in sorted(head['results'].keys() - base['results'].keys()):
+        print(f"{'':>9} {name:>48}: only in head")
+
+    if any(row[-1] for row in rows):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""Seeded synthetic data for benchmarks.
+
+Rows are inserted with bulk_create, so model signals do not run; call
+stat_analysis.rollup_utils.rebuild_rollups() afterwards when a benchmark
+needs the quarterly rollups.
+"""
+
+import datetime
+import random
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.utils import timezone
+
+from execution import ids
+from execution.models import AccountManager, Customer, Job, Order, ServiceProvider, ServiceProviderAccountManager, User
+
+BATCH_SIZE = 5000
+
+@contextmanager
+def explicit_timestamps(model, *field_names):
+    # auto_now_add fields ignore assigned values; let generated timestamps through.
+    fields = [model._meta.get_field(name) for name in field_names]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+def _random_datetime(rng, start, days):
+    return start + datetime.timedelta(seconds=rng.randrange(days * 86400))
+
+def generate(orders=10000, seed=0, years=5):
+    """Create a consistent dataset sized by the number of orders.
+
+    Returns a dict with the number of rows created per model.
+    """
+    rng = random.Random(seed)
+    start = timezone.make_aware(datetime.datetime(timezone.now().year - years, 1, 1))
+    span_days = years * 365
+
+    n_jobs = max(1, orders // 2)
+    n_customers = max(1, orders // 20)
+    n_managers = max(1, n_customers // 50)
+    n_providers = max(1, n_managers * 4)
+
+    manager_users = [
+        User(username=f'manager{i}', password='!', user_type='ACCOUNT_MANAGER', date_joined=_random_datetime(rng, start, span_days))
+        for i in range(n_managers)
+    ]
+    customer_users = [
+        User(username=f'customer{i}', password='!', user_type='CUSTOMER', date_joined=_random_datetime(rng, start, span_days))
+        for i in range(n_customers)
+    ]
+    User.objects.bulk_create(manager_users + customer_users, batch_size=BATCH_SIZE)
+
+    managers = AccountManager.objects.bulk_create(
+        [AccountManager(user=user) for user in manager_users], batch_size=BATCH_SIZE
+    )
+    customers = Customer.objects.bulk_create(
+        [Customer(user=user, assigned_account_manager=rng.choice(managers)) for user in customer_users],
+        batch_size=BATCH_SIZE,
+    )
+
+    providers = ServiceProvider.objects.bulk_create(
+        [ServiceProvider(name=f'Provider {i}') for i in range(n_providers)], batch_size=BATCH_SIZE
+    )
+    # Each manager looks after a handful of providers; every provider has a manager.
+    managed = {manager.pk: set() for manager in managers}
+    for i, provider in enumerate(providers):
+        managed[managers[i % n_managers].pk].add(provider)
+    for manager in managers:
+        managed[manager.pk].update(rng.sample(providers, min(2, n_providers)))
+    ServiceProviderAccountManager.objects.bulk_create(
+        [
+            ServiceProviderAccountManager(account_manager_id=manager_id, service_provider=provider)
+            for manager_id, manager_providers in managed.items()
+            for provider in manager_providers
+        ],
+        batch_size=BATCH_SIZE,
+    )
+
+    jobs = []
+    for i in range(n_jobs):
+        job_type = 'wafer_run' if rng.random() < 0.3 else 'regular'
+        completion_time = round(rng.uniform(1, 120 if job_type == 'wafer_run' else 30), 2)
+        starting_date = _random_datetime(rng, start, span_days)
+        jobs.append(Job(
+            job_id=ids.encode(int(starting_date.timestamp() * 1000), rng.getrandbits(ids.RANDOM_BITS)),
+            job_name=f'Job {i}',
+            state=rng.choice(('created', 'active', 'completed')),
+            job_type=job_type,
+            starting_date=starting_date,
+            end_date=starting_date + datetime.timedelta(days=completion_time),
+            completion_time=completion_time,
+            service_provider=rng.choice(providers),
+            price=Decimal(rng.randrange(1000, 500000)) / 100,
+        ))
+    Job.objects.bulk_create(jobs, batch_size=BATCH_SIZE)
+
+    jobs_by_provider = {}
+    for job in jobs:
+        jobs_by_provider.setdefault(job.service_provider_id, []).append(job)
+
+    # Orders respect OrderSerializer's rules: placed through the customer's
+    # manager, for a job of a provider that manager manages.
+    order_rows = []
+    for _ in range(orders):
+        customer = rng.choice(customers)
+        manager_providers = [p for p in managed[customer.assigned_account_manager_id] if p.pk in jobs_by_provider]
+        job = rng.choice(jobs_by_provider[rng.choice(manager_providers).pk]) if manager_providers else rng.choice(jobs)
+        quantity = rng.randint(1, 5)
+        order_rows.append(Order(
+            customer=customer,
+            account_manager_id=customer.assigned_account_manager_id,
+            job=job,
+            quantity=quantity,
+            line_total=quantity * job.price,
+            created_at=_random_datetime(rng, start, span_days),
+        ))
+    with explicit_timestamps(Order, 'created_at'):
+        Order.objects.bulk_create(order_rows, batch_size=BATCH_SIZE)
+
+    return {
+        'users': n_managers + n_customers,
+        'account_managers': n_managers,
+        'customers': n_customers,
+        'service_providers': n_providers,
+        'jobs': n_jobs,
+        'orders': orders,
+    }
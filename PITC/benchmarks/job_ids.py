@@ -0,0 +1,63 @@
+"""Job insert throughput with random and time-ordered primary keys.
+
+    python -m benchmarks.job_ids --jobs 200000
+
+Inserts the same jobs into a throwaway database twice: once keyed by the
+former 10-character random hex IDs and once by the ULIDs of
+execution.ids. For each it prints the bulk insert throughput over the
+whole run and for the last batch, where a random key has to touch pages
+all over an index that no longer fits in cache. It also prints the
+chance of at least one collision among that many random hex IDs.
+"""
+
+import argparse
+import datetime
+import math
+import time
+import uuid
+from decimal import Decimal
+
+from .setup import benchmark_database, setup_django
+
+def legacy_id():
+    return uuid.uuid4().hex[:10]
+
+def insert(Job, provider, new_id, jobs, batch_size):
+    now = datetime.datetime.now(datetime.timezone.utc)
+    started = time.perf_counter()
+    last_batch = 0.0
+    for offset in range(0, jobs, batch_size):
+        batch = [
+            Job(
+                job_id=new_id(), job_name='Job', state='created', job_type='regular',
+                starting_date=now, end_date=now, completion_time=1, service_provider=provider, price=Decimal('1.00'),
+            )
+            for _ in range(min(batch_size, jobs - offset))
+        ]
+        batch_started = time.perf_counter()
+        Job.objects.bulk_create(batch)
+        last_batch = time.perf_counter() - batch_started
+    return jobs / (time.perf_counter() - started), min(batch_size, jobs) / last_batch
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--jobs', type=int, default=100000)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    setup_django()
+    from execution.ids import new_ulid
+    from execution.models import Job, ServiceProvider
+
+    with benchmark_database():
+        provider = ServiceProvider.objects.create(name='Provider')
+        for name, new_id in (('random hex (10)', legacy_id), ('ULID (26)', new_ulid)):
+            overall, last = insert(Job, provider, new_id, args.jobs, args.batch_size)
+            print(f'{name}: {overall:,.0f} jobs/s overall, {last:,.0f} jobs/s in the last batch')
+            Job.objects.all().delete()
+
+    collision = -math.expm1(-args.jobs * (args.jobs - 1) / (2 * 16 ** 10))
+    print(f'P(collision) among {args.jobs:,} random hex IDs: {collision:.2e}; ULIDs from one process: 0')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""Rows per second of the DRF serializers and the values() fast path for job and order lists.
+
+    python -m benchmarks.list_serializers --orders 100000 --rows 1000
+
+Seeds a throwaway database, then for JobSerializer and OrderSerializer
+times representing ``--rows`` rows (including the query that fetches them)
+with ``serializer_class(queryset, many=True).data`` and with
+execution.fast_serializers, checks that both render to the same JSON and
+prints the best-of-N throughput of each.
+"""
+
+import argparse
+import time
+
+from .setup import benchmark_database, setup_django
+
+def best_of(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--orders', type=int, default=20000)
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    setup_django()
+    from rest_framework.renderers import JSONRenderer
+
+    from execution.fast_serializers import values_serializer
+    from execution.models import Job, Order
+    from execution.serializers import JobSerializer, OrderSerializer
+    from . import datagen
+
+    with benchmark_database():
+        counts = datagen.generate(orders=args.orders, seed=args.seed)
+        print('Seeded', ', '.join(f'{count} {name}' for name, count in counts.items()))
+
+        for serializer_class, queryset in (
+            (JobSerializer, Job.objects.order_by('job_id')[:args.rows]),
+            (OrderSerializer, Order.objects.order_by('created_at', 'id')[:args.rows]),
+        ):
+            fast = values_serializer(serializer_class)
+            drf_rows = lambda: serializer_class(queryset.all(), many=True).data
+            fast_rows = lambda: fast.to_representation(fast.values(queryset.all()))
+            assert JSONRenderer().render(drf_rows()) == JSONRenderer().render(fast_rows()), serializer_class.__name__
+
+            drf_time = best_of(drf_rows, args.repeat)
+            fast_time = best_of(fast_rows, args.repeat)
+            print(f'\n{serializer_class.__name__}, {args.rows} rows:')
+            print(f'  DRF serializer: {args.rows / drf_time:10.0f} rows/s')
+            print(f'  values() path:  {args.rows / fast_time:10.0f} rows/s ({drf_time / fast_time:.1f}x)')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""API request throughput with fresh and persistent database connections.
+
+    python -m benchmarks.load_test --orders 20000 --concurrency 8 --seconds 10
+
+Seeds a throwaway database (a file for SQLite, so connecting has its real
+cost), serves the API from a WSGI server with a fixed pool of worker
+threads, like a threaded application server, and requests a few list
+endpoints from client threads for a fixed time under each profile:
+
+- sqlite defaults: a new connection per request, rollback journal and
+  synchronous=FULL (SQLite ignores the PRAGMAs on other databases);
+- tuned pragmas: a new connection per request, settings.SQLITE_PRAGMAS
+  with WAL and synchronous=NORMAL, as with SQLITE_WAL=1;
+- persistent: the tuned pragmas and connections kept open for
+  CONN_MAX_AGE seconds, so each worker thread connects once.
+
+Set DATABASE_URL to run it against PostgreSQL; with DB_POOL set the last
+profile is replaced by the pool, which hands out already open connections.
+"""
+
+import argparse
+import os
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+from .setup import benchmark_database, setup_django
+
+# Small pages, so the per-request cost of connecting is not drowned out by serialization.
+PATHS = [f'/api/{resource}/?page_size=10' for resource in ('jobs', 'service-providers', 'orders', 'reports')]
+
+SQLITE_DEFAULT_PRAGMAS = {'journal_mode': 'DELETE', 'synchronous': 'FULL'}
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+class PooledWSGIServer(ThreadingMixIn, WSGIServer):
+    """Handles requests on a fixed pool of threads, so thread-local connections outlive a request."""
+
+    pool = None
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self.process_request_thread, request, client_address)
+
+def serve(application, workers):
+    server = make_server('127.0.0.1', 0, application, server_class=PooledWSGIServer, handler_class=QuietHandler)
+    server.pool = ThreadPoolExecutor(max_workers=workers)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+def load(base_url, concurrency, seconds):
+    """Request PATHS round-robin from ``concurrency`` threads for ``seconds``; return (requests, errors)."""
+    deadline = time.perf_counter() + seconds
+    counts = [[0, 0] for _ in range(concurrency)]
+
+    def client(position):
+        i = position
+        while time.perf_counter() < deadline:
+            try:
+                with urllib.request.urlopen(base_url + PATHS[i % len(PATHS)], timeout=30) as response:
+                    response.read()
+                counts[position][0] += 1
+            except OSError:
+                counts[position][1] += 1
+            i += 1
+
+    threads = [threading.Thread(target=client, args=(position,)) for position in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(count for count, _ in counts), sum(errors for _, errors in counts)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--orders', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--workers', type=int, default=8, help="server threads")
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--conn-max-age', type=int, default=60)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.core.wsgi import get_wsgi_application
+    from django.db import connections
+
+    from . import datagen
+
+    settings.DEBUG = False
+    settings.ALLOWED_HOSTS = ['127.0.0.1']
+    default_pragmas = settings.SQLITE_PRAGMAS
+    # The database is a throwaway file, so it can be switched to WAL.
+    tuned_pragmas = {**default_pragmas, 'journal_mode': 'WAL', 'synchronous': 'NORMAL'}
+    settings_dict = connections['default'].settings_dict
+    pooled = 'pool' in settings_dict.get('OPTIONS', {})
+    profiles = [
+        ('sqlite defaults', 0, SQLITE_DEFAULT_PRAGMAS),
+        ('tuned pragmas', 0, tuned_pragmas),
+        ('pooled' if pooled else 'persistent', 0 if pooled else args.conn_max_age, tuned_pragmas),
+    ]
+
+    with tempfile.TemporaryDirectory() as directory, \
+            benchmark_database(name=os.path.join(directory, 'load_test.sqlite3')) as connection:
+        counts = datagen.generate(orders=args.orders, seed=args.seed)
+        print('Seeded', ', '.join(f'{count} {name}' for name, count in counts.items()))
+        connection.close()
+
+        server = serve(get_wsgi_application(), args.workers)
+        base_url = f'http://127.0.0.1:{server.server_port}'
+        try:
+            baseline = None
+            for label, conn_max_age, pragmas in profiles:
+                # Worker threads share this dict, so the change applies to the connections they open next.
+                settings_dict['CONN_MAX_AGE'] = conn_max_age
+                settings.SQLITE_PRAGMAS = pragmas
+                load(base_url, args.concurrency, 1)  # warm up
+                requests, errors = load(base_url, args.concurrency, args.seconds)
+                throughput = requests / args.seconds
+                baseline = baseline or throughput
+                print(
+                    f'{label:>16}: {throughput:8.1f} requests/s ({throughput / baseline:4.2f}x)'
+                    + (f', {errors} errors' if errors else '')
+                )
+        finally:
+            server.shutdown()
+            server.pool.shutdown()
+            settings.SQLITE_PRAGMAS = default_pragmas
+            connections.close_all()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""Query plans and timings of the raw report queries, with and without the report indexes.
+
+    python -m benchmarks.report_indexes --orders 200000
+
+Seeds a throwaway database, then for each stat_utils aggregate prints the
+database's query plan and the best-of-N timing, first with the indexes from
+execution/migrations/0002_report_indexes.py and then with them dropped.
+"""
+
+import argparse
+import time
+
+from .setup import benchmark_database, setup_django
+
+def explain(connection, sql):
+    prefix = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+    with connection.cursor() as cursor:
+        cursor.execute(prefix + sql)
+        return [' '.join(str(column) for column in row) for row in cursor.fetchall()]
+
+def measure(connection, function, repeat):
+    from django.test.utils import CaptureQueriesContext
+
+    with CaptureQueriesContext(connection) as captured:
+        function()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+    return min(timings), [query['sql'] for query in captured.captured_queries]
+
+def run(connection, queries, repeat):
+    for name, function in queries:
+        best, statements = measure(connection, function, repeat)
+        print(f'  {name}: {best * 1000:.2f} ms')
+        for sql in statements:
+            for line in explain(connection, sql):
+                print(f'      {line}')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--orders', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    setup_django()
+    from execution.models import Job, Order, User
+    from stat_analysis.stat_utils import (
+        aggregate_job_stats, aggregate_order_stats, aggregate_user_stats, get_datetime_range,
+    )
+    from . import datagen
+
+    with benchmark_database() as connection:
+        counts = datagen.generate(orders=args.orders, seed=args.seed)
+        print('Seeded', ', '.join(f'{count} {name}' for name, count in counts.items()))
+
+        year = Job.objects.order_by('-starting_date').values_list('starting_date__year', flat=True).first()
+        start_date, end_date = get_datetime_range('Q2', year - 1, 'Q3', year - 1)
+        queries = [
+            ('aggregate_job_stats', lambda: aggregate_job_stats(start_date, end_date)),
+            ('aggregate_order_stats', lambda: aggregate_order_stats(start_date, end_date)),
+            ('aggregate_user_stats', lambda: aggregate_user_stats(start_date, end_date)),
+        ]
+
+        print('\nWith report indexes:')
+        run(connection, queries, args.repeat)
+
+        with connection.schema_editor() as editor:
+            for model in (Job, Order, User):
+                for index in model._meta.indexes:
+                    editor.remove_index(model, index)
+        print('\nWithout report indexes:')
+        run(connection, queries, args.repeat)
+
+if __name__ == '__main__':
+    main()
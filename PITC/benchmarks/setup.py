@@ -0,0 +1,26 @@
+import os
+from contextlib import contextmanager
+
+import django
+
+def setup_django():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'PITC.settings')
+    django.setup()
+
+@contextmanager
+def benchmark_database(verbosity=0, name=None):
+    # A fresh, fully migrated test database that is destroyed afterwards, with
+    # temporary file-based caches so it does not share entries with the real database.
+    # ``name`` overrides the test database name, e.g. a file instead of SQLite's in-memory default.
+    from django.db import connection
+
+    from PITC.testing import temporary_file_caches
+
+    if name is not None:
+        connection.settings_dict['TEST']['NAME'] = name
+    with temporary_file_caches():
+        old_name = connection.creation.create_test_db(verbosity=verbosity, autoclobber=True, keepdb=False)
+        try:
+            yield connection
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=verbosity)
@@ -0,0 +1,207 @@
+"""Timings of the report calculators, list endpoints, order validation and bulk paths, as JSON.
+
+    python -m benchmarks.suite --orders 100000 --output results/$(git rev-parse --short HEAD).json
+    python -m benchmarks.compare results/base.json results/head.json
+
+Seeds a throwaway database with benchmarks.datagen (the same seed gives
+the same data), then runs each benchmark ``--repeat`` times and records the
+fastest and median wall-clock time and the number of SQL queries of one
+run. Read-only benchmarks run first; the bulk paths insert rows and run
+last. Results, with the commit, the versions and the parameters they were
+produced with, are written to ``--output`` for benchmarks.compare.
+"""
+
+import argparse
+import datetime
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+from .setup import benchmark_database, setup_django
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def measure(function, repeat):
+    from django.db import connection, reset_queries
+    from django.test.utils import CaptureQueriesContext
+
+    # The query log is capped; a full log would make every capture look empty.
+    reset_queries()
+    with CaptureQueriesContext(connection) as captured:
+        function()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+    return {
+        'min_s': min(timings),
+        'median_s': statistics.median(timings),
+        'repeat': repeat,
+        'queries': len(captured),
+    }
+
+def report_benchmarks(year):
+    from django.test import override_settings
+
+    from stat_analysis import stat_utils, vectorized
+    from stat_analysis.batch import calculate_report_batch
+    from stat_analysis.orchestrator import generate_report
+
+    quarter_range = ('Q1', year - 2, 'Q4', year - 1)
+    quarters = [(f'Q{q}', y) for y in (year - 2, year - 1) for q in range(1, 5)]
+    ranges = [(qf, yf, qt, yt) for i, (qf, yf) in enumerate(quarters) for qt, yt in quarters[i:]]
+    # Without the report cache every run computes the statistics.
+    uncached = override_settings(STAT_ANALYSIS_REPORT_CACHE=None)
+    benchmarks = {
+        f'reports.{name}': (lambda name=name: getattr(stat_utils, name)(*quarter_range))
+        for name in (
+            'compute_job_stats', 'compute_order_stats', 'compute_user_stats',
+            'compute_provider_breakdown', 'compute_account_manager_breakdown',
+        )
+    }
+    benchmarks['reports.generate_report'] = lambda: generate_report(*quarter_range)
+    benchmarks[f'reports.calculate_report_batch[{len(ranges)}]'] = lambda: calculate_report_batch(ranges)
+    if vectorized.is_available():
+        vectorized_backend = override_settings(STAT_ANALYSIS_BACKEND='vectorized')
+        benchmarks['reports.generate_report[vectorized]'] = vectorized_backend(lambda: generate_report(*quarter_range))
+    return {name: uncached(function) for name, function in benchmarks.items()}
+
+def endpoint_benchmarks(client, page_size):
+    def get(url):
+        def request():
+            response = client.get(url)
+            assert response.status_code == 200, (url, response.status_code)
+            if response.streaming:
+                for _ in response.streaming_content:
+                    pass
+        return request
+
+    benchmarks = {
+        f'api.list.{resource}': get(f'/api/{resource}/?page_size={page_size}')
+        for resource in ('jobs', 'orders', 'customers', 'account-managers', 'service-providers', 'users', 'reports')
+    }
+    benchmarks['api.export.orders[ndjson]'] = get('/api/orders/export/?output=ndjson')
+    return benchmarks
+
+def order_validation_benchmarks(order_rows):
+    from execution.serializers import OrderSerializer
+
+    payloads = [
+        {'customer': customer, 'account_manager': manager, 'job': job, 'quantity': quantity}
+        for customer, manager, job, quantity in order_rows
+    ]
+
+    def validate():
+        for payload in payloads:
+            serializer = OrderSerializer(data=payload)
+            assert serializer.is_valid(), serializer.errors
+
+    return {f'orders.validate[{len(payloads)}]': validate}
+
+def bulk_benchmarks(client, order_rows, users):
+    from execution import provisioning
+    from execution.models import User
+
+    payload = [
+        {'customer': customer, 'account_manager': manager, 'job': job, 'quantity': quantity}
+        for customer, manager, job, quantity in order_rows
+    ]
+
+    def bulk_orders():
+        response = client.post('/api/orders/bulk/', payload, content_type='application/json')
+        assert response.status_code == 201, response.content[:500]
+
+    runs = iter(range(1_000_000))
+
+    def bulk_users():
+        run = next(runs)
+        provisioning.bulk_create_users([
+            User(username=f'bench{run}-{i}', password='!', user_type='CUSTOMER') for i in range(users)
+        ])
+
+    return {
+        f'orders.bulk_create[{len(payload)}]': bulk_orders,
+        f'users.bulk_create[{users}]': bulk_users,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--orders', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--page-size', type=int, default=100)
+    parser.add_argument('--validate', type=int, default=200, help="orders validated one by one")
+    parser.add_argument('--bulk', type=int, default=1000, help="orders and users created per bulk run")
+    parser.add_argument('--filter', default='', help="only run benchmarks whose name contains this")
+    parser.add_argument('--output', help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    setup_django()
+    import django
+    from django.test import Client
+    from django.test.utils import setup_test_environment
+
+    from execution.models import Order
+    from . import datagen
+
+    setup_test_environment()
+    with benchmark_database() as connection:
+        started = time.perf_counter()
+        counts = datagen.generate(orders=args.orders, seed=args.seed)
+        from stat_analysis.rollup_utils import rebuild_rollups
+        rebuild_rollups()
+        print('Seeded', ', '.join(f'{count} {name}' for name, count in counts.items()),
+              f'in {time.perf_counter() - started:.1f}s', file=sys.stderr)
+
+        client = Client()
+        year = datetime.date.today().year
+        order_rows = list(
+            Order.objects.order_by('pk').values_list('customer_id', 'account_manager_id', 'job_id', 'quantity')[:max(args.validate, args.bulk)]
+        )
+        benchmarks = {
+            **report_benchmarks(year),
+            **endpoint_benchmarks(client, args.page_size),
+            **order_validation_benchmarks(order_rows[:args.validate]),
+            **bulk_benchmarks(client, order_rows[:args.bulk], args.bulk),
+        }
+
+        results = {}
+        for name, function in benchmarks.items():
+            if args.filter not in name:
+                continue
+            results[name] = measure(function, args.repeat)
+            print(f"{name:>48}: {results[name]['min_s'] * 1000:10.2f} ms min, "
+                  f"{results[name]['median_s'] * 1000:10.2f} ms median, {results[name]['queries']:6} queries",
+                  file=sys.stderr)
+
+        output = {
+            'meta': {
+                'commit': git_commit(),
+                'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'parameters': {key: value for key, value in vars(args).items() if key != 'output'},
+                'rows': counts,
+            },
+            'results': results,
+        }
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(output, file, indent=2, sort_keys=True)
+    else:
+        json.dump(output, sys.stdout, indent=2, sort_keys=True)
+        print()
+
+if __name__ == '__main__':
+    main()
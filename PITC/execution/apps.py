@@ -1,6 +1,12 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 class ExecutionConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'execution'
 
+    def ready(self):
+        from PITC.database import apply_sqlite_pragmas
+        from . import http_cache, memberships  # noqa: F401
+
+        connection_created.connect(apply_sqlite_pragmas, dispatch_uid='apply_sqlite_pragmas')
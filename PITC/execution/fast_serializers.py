@@ -0,0 +1,175 @@
+"""execution.fast_serializers
+
+Read-only fast path for large list responses.
+
+For a ModelSerializer of plain model fields, ValuesSerializer compiles
+once which column each field reads and how its value is converted, then
+represents rows fetched with queryset.values() instead of model instances
+and per-field DRF calls. Conversions follow the DRF fields exactly, so the
+output, and the JSON rendered from it, is identical to
+``serializer_class(instances, many=True).data``:
+
+- datetimes: ISO 8601 in the current time zone with a trailing Z for UTC;
+- decimals: quantized to the field's decimal places, as strings;
+- primary key relations: the raw foreign key column;
+- None stays None;
+- any other field, or a field with non-default formatting options, is
+  converted by the DRF field's own to_representation().
+
+Serializers with nested serializers, method fields or sources spanning
+relations are not compiled (values_serializer() returns None) and keep
+using DRF. FastListMixin picks the fast path automatically for the list
+and export actions of a ViewSet.
+"""
+
+import decimal
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.utils import timezone
+from rest_framework import fields as drf_fields
+from rest_framework import relations
+from rest_framework.response import Response
+from rest_framework.serializers import BaseSerializer
+from rest_framework.settings import api_settings
+
+from PITC.instrumentation import current_metrics
+
+def _datetime_converter(field):
+    if getattr(field, 'format', api_settings.DATETIME_FORMAT) != drf_fields.ISO_8601 or hasattr(field, 'timezone') or not settings.USE_TZ:
+        return field.to_representation
+    current_timezone = timezone.get_current_timezone()
+
+    def convert(value):
+        if timezone.is_naive(value):
+            return field.to_representation(value)
+        value = value.astimezone(current_timezone).isoformat()
+        return value[:-6] + 'Z' if value.endswith('+00:00') else value
+    return convert
+
+def _decimal_converter(field):
+    coerce_to_string = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+    if not coerce_to_string or field.localize or field.normalize_output or field.decimal_places is None:
+        return field.to_representation
+    exponent = decimal.Decimal(1).scaleb(-field.decimal_places)
+    context = decimal.getcontext().copy()
+    if field.max_digits is not None:
+        context.prec = field.max_digits
+    rounding = field.rounding
+
+    def convert(value):
+        if not isinstance(value, decimal.Decimal):
+            return field.to_representation(value)
+        return f'{value.quantize(exponent, rounding=rounding, context=context):f}'
+    return convert
+
+def _identity_if(value_type, field):
+    def convert(value):
+        return value if type(value) is value_type else field.to_representation(value)
+    return convert
+
+def _converter(field):
+    """Return a function with the result of field.to_representation() for a non-None column value."""
+    if isinstance(field, drf_fields.DateTimeField):
+        return _datetime_converter(field)
+    if isinstance(field, drf_fields.DecimalField):
+        return _decimal_converter(field)
+    if isinstance(field, relations.PrimaryKeyRelatedField):
+        return field.pk_field.to_representation if field.pk_field is not None else (lambda value: value)
+    if isinstance(field, drf_fields.ChoiceField):
+        mapping = field.choice_strings_to_values
+        return lambda value: mapping.get(str(value), value)
+    if type(field) is drf_fields.IntegerField:
+        return _identity_if(int, field)
+    if type(field) is drf_fields.FloatField:
+        return _identity_if(float, field)
+    if type(field) is drf_fields.CharField:
+        return _identity_if(str, field)
+    return field.to_representation
+
+class ValuesSerializer:
+    """Represents queryset.values() rows like ``serializer_class`` represents instances."""
+
+    def __init__(self, serializer_class, fields):
+        self.serializer_class = serializer_class
+        # (output name, values() lookup, DRF field)
+        self.fields = fields
+        self.lookups = list(dict.fromkeys(lookup for _, lookup, _ in fields))
+
+    @classmethod
+    def compile(cls, serializer_class):
+        """Return a ValuesSerializer for ``serializer_class``, or None if it has fields this path cannot read."""
+        model = serializer_class.Meta.model
+        compiled = []
+        for name, field in serializer_class().fields.items():
+            if field.write_only:
+                continue
+            if isinstance(field, (drf_fields.SerializerMethodField, relations.ManyRelatedField, relations.HyperlinkedRelatedField)):
+                return None
+            if isinstance(field, BaseSerializer) or '.' in field.source or field.source == '*':
+                return None
+            try:
+                model_field = model._meta.get_field(field.source)
+            except FieldDoesNotExist:
+                return None
+            if not model_field.concrete or model_field.many_to_many:
+                return None
+            compiled.append((name, model_field.name, field))
+        return cls(serializer_class, compiled)
+
+    def values(self, queryset, *extra):
+        # Extra lookups, e.g. the pagination ordering, are fetched but not represented.
+        return queryset.values(*dict.fromkeys(self.lookups + list(extra)))
+
+    def to_representation(self, rows):
+        converters = [(name, lookup, _converter(field)) for name, lookup, field in self.fields]
+        return [
+            {name: None if row[lookup] is None else convert(row[lookup]) for name, lookup, convert in converters}
+            for row in rows
+        ]
+
+_compiled = {}
+
+def values_serializer(serializer_class):
+    if serializer_class not in _compiled:
+        _compiled[serializer_class] = ValuesSerializer.compile(serializer_class)
+    return _compiled[serializer_class]
+
+class FastListMixin:
+    """Serves the list action, and the export action if present, from queryset.values()."""
+
+    def fast_serializer(self):
+        return values_serializer(self.get_serializer_class())
+
+    def fast_representation(self, fast, rows):
+        metrics = current_metrics()
+        if metrics is not None:
+            return metrics.time_serializer(fast.to_representation)(rows)
+        return fast.to_representation(rows)
+
+    def list(self, request, *args, **kwargs):
+        fast = self.fast_serializer()
+        if fast is None:
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        ordering = getattr(self.paginator, 'ordering', None) or ()
+        if isinstance(ordering, str):
+            ordering = (ordering,)
+        rows = fast.values(queryset, *(field.lstrip('-') for field in ordering))
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(self.fast_representation(fast, page))
+        return Response(self.fast_representation(fast, rows))
+
+    def get_export_rows(self, queryset):
+        fast = self.fast_serializer()
+        if fast is None:
+            yield from super().get_export_rows(queryset)
+            return
+        rows = []
+        for row in fast.values(queryset).iterator(chunk_size=self.export_chunk_size):
+            rows.append(row)
+            if len(rows) == self.export_chunk_size:
+                yield from fast.to_representation(rows)
+                rows = []
+        yield from fast.to_representation(rows)
@@ -0,0 +1,116 @@
+"""execution.http_cache
+
+Conditional GET for read-heavy ViewSets.
+
+Each model has a version counter (see PITC.cache_versions), kept in the
+cache alias named by settings.EXECUTION_HTTP_CACHE. Saving or deleting an instance, or creating
+orders in bulk, bumps the counter of its model. ConditionalGetMixin gives
+list and detail responses an ETag: a hash of the counters of the models
+the response depends on (``conditional_models``), the request path with
+its query string and the Accept header. There is no Last-Modified: HTTP
+dates have a resolution of one second, so a write in the same second as a
+response would leave If-Modified-Since validating it.
+
+A request whose If-None-Match still matches gets ``304 Not Modified``
+after a cache read, without querying the database or serializing. With settings.EXECUTION_PAGE_CACHE the serialized
+data of 200 responses is cached as well, keyed by the ETag, so unchanged
+pages are served without serializing either; entries of earlier versions
+are never read again and expire with the cache's timeout.
+
+Counters are bumped when the write happens and again when its transaction
+commits, so a response computed from data read before the commit never
+carries the committed version. Writes that bypass save() and delete(),
+such as queryset.update(), do not bump the counters unless they send one
+of the batch signals of execution.signals.
+
+Responses read from the replica (see PITC.routers) get no ETag and are
+not cached: the replica may lag the counters, so their data could be
+older than the version the ETag would claim.
+
+The counters must be shared by every process that writes or serves these
+endpoints, management commands and the shell included, so the alias must
+not be process-local: the default cache is file-based, deployments on
+several hosts need e.g. Redis or Memcached, and a LocMemCache alias
+disables conditional GET.
+"""
+
+import hashlib
+
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.cache import get_conditional_response
+from rest_framework.response import Response
+
+from PITC import cache_versions
+from PITC.routers import reading_from_replica
+
+from .models import Job, Order, ServiceProvider
+from .signals import jobs_repriced, orders_bulk_created
+
+def get_cache():
+    return cache_versions.shared_cache(getattr(settings, 'EXECUTION_HTTP_CACHE', None))
+
+def _version_key(model):
+    return f'http_cache:version:{model._meta.label_lower}'
+
+def bump_version(model):
+    cache = get_cache()
+    if cache is not None:
+        cache_versions.bump_after_write(cache, [_version_key(model)])
+
+def versions(models):
+    """Return {model label: version} for ``models``."""
+    values = cache_versions.read(get_cache(), [_version_key(model) for model in models])
+    return {model._meta.label_lower: values[_version_key(model)] for model in models}
+
+@receiver(post_save, sender=ServiceProvider)
+@receiver(post_delete, sender=ServiceProvider)
+@receiver(post_save, sender=Job)
+@receiver(post_delete, sender=Job)
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def model_changed(sender, **kwargs):
+    bump_version(sender)
+
+@receiver(orders_bulk_created)
+def orders_bulk_created_handler(sender, orders, **kwargs):
+    bump_version(Order)
+
+@receiver(jobs_repriced)
+def jobs_repriced_handler(sender, price_deltas, **kwargs):
+    bump_version(Job)
+
+class ConditionalGetMixin:
+    """Answers list and retrieve requests with an ETag and 304 Not Modified."""
+    conditional_models = ()
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(super().retrieve, request, *args, **kwargs)
+
+    def conditional_response(self, view, request, *args, **kwargs):
+        cache = get_cache()
+        if cache is None or reading_from_replica():
+            return view(request, *args, **kwargs)
+        model_versions = versions(self.conditional_models)
+        etag = '"%s"' % hashlib.md5(
+            repr((sorted(model_versions.items()), request.get_full_path(), request.META.get('HTTP_ACCEPT'))).encode(),
+            usedforsecurity=False,
+        ).hexdigest()
+
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            page_key = f'http_cache:page:{etag}'
+            data = cache.get(page_key) if getattr(settings, 'EXECUTION_PAGE_CACHE', False) else None
+            if data is not None:
+                response = Response(data)
+            else:
+                response = view(request, *args, **kwargs)
+                if response.status_code == 200 and getattr(settings, 'EXECUTION_PAGE_CACHE', False):
+                    cache.set(page_key, response.data)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+        return response
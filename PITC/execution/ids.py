@@ -0,0 +1,56 @@
+"""execution.ids
+
+Time-ordered identifiers for Job.job_id.
+
+IDs are ULIDs: a 48-bit millisecond timestamp followed by 80 random bits,
+written as 26 Crockford base32 characters, so their string order is their
+creation order. New rows are therefore appended at the right edge of the
+primary key index instead of landing on random pages of it.
+
+Within a process, IDs created in the same millisecond increment the random
+part of the previous ID rather than drawing a new one, so the generator
+is strictly monotonic and never repeats itself. IDs from different
+processes can only collide if they share the millisecond and all 80
+random bits.
+"""
+
+import os
+import threading
+import time
+
+ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+LENGTH = 26
+RANDOM_BITS = 80
+
+_lock = threading.Lock()
+_last = (0, 0)
+
+def encode(timestamp_ms, randomness):
+    value = (timestamp_ms << RANDOM_BITS) | randomness
+    characters = []
+    for _ in range(LENGTH):
+        value, digit = divmod(value, 32)
+        characters.append(ALPHABET[digit])
+    return ''.join(reversed(characters))
+
+def timestamp_of(identifier):
+    """Creation time, in milliseconds since the epoch, of an ID."""
+    value = 0
+    for character in identifier[:10]:
+        value = value * 32 + ALPHABET.index(character)
+    return value
+
+def new_ulid():
+    global _last
+    with _lock:
+        timestamp_ms = time.time_ns() // 1_000_000
+        last_timestamp, last_randomness = _last
+        if timestamp_ms <= last_timestamp:
+            # Same millisecond, or the clock went back: continue the previous sequence.
+            timestamp_ms, randomness = last_timestamp, last_randomness + 1
+            if randomness >> RANDOM_BITS:
+                timestamp_ms, randomness = last_timestamp + 1, int.from_bytes(os.urandom(10), 'big')
+        else:
+            randomness = int.from_bytes(os.urandom(10), 'big')
+        _last = (timestamp_ms, randomness)
+    return encode(timestamp_ms, randomness)
@@ -0,0 +1,151 @@
+import csv
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from execution.models import User
+from execution.provisioning import PROFILE_MODELS, bulk_create_users
+
+def _init_worker():
+    # Spawned (rather than forked) workers start without configured settings.
+    django.setup()
+
+def _chunks(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+class Command(BaseCommand):
+    help = (
+        "Import account managers and customers from a CSV file with the columns username, password, "
+        "user_type and optionally email, first_name, last_name, date_joined and account_manager "
+        "(a manager's username, for customers)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_file', help="Path of the CSV file, or - to read standard input.")
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Users hashed and inserted per batch.")
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Processes hashing passwords; 1 hashes in this process.")
+        parser.add_argument('--prehashed', action='store_true', help="The password column already holds Django password hashes.")
+
+    def handle(self, *args, **options):
+        self.prehashed = options['prehashed']
+        self.imported = self.skipped = 0
+        started = time.perf_counter()
+
+        handle = sys.stdin if options['csv_file'] == '-' else open(options['csv_file'], newline='', encoding='utf-8')
+        pool = ProcessPoolExecutor(options['workers'], initializer=_init_worker) if options['workers'] > 1 and not self.prehashed else None
+        try:
+            reader = csv.DictReader(handle)
+            missing = {'username', 'password', 'user_type'}.difference(reader.fieldnames or ())
+            if missing:
+                raise CommandError(f"Missing CSV columns: {', '.join(sorted(missing))}")
+            for chunk in _chunks(enumerate(reader, start=2), options['chunk_size']):
+                self.import_chunk(chunk, pool)
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f"{self.imported} imported, {self.skipped} skipped ({self.imported / elapsed:.0f} users/s)")
+        finally:
+            if pool is not None:
+                pool.shutdown()
+            if handle is not sys.stdin:
+                handle.close()
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f"Imported {self.imported} user(s) in {elapsed:.1f}s; skipped {self.skipped}."))
+
+    def skip(self, line, reason):
+        self.skipped += 1
+        self.stderr.write(f"Line {line}: {reason}")
+
+    def import_chunk(self, chunk, pool):
+        chunk = [(line, self.normalize_row(row)) for line, row in chunk]
+        usernames = {row['username'] for _, row in chunk}
+        existing = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+        rows, dates_joined = [], []
+        for line, row in chunk:
+            try:
+                date_joined = self.parse_date_joined(row)
+            except ValueError:
+                self.skip(line, f"invalid date_joined {row['date_joined']!r}")
+                continue
+            if row['user_type'] not in PROFILE_MODELS:
+                self.skip(line, f"unknown user_type {row['user_type']!r}")
+            elif not row['username'] or row['username'] in existing:
+                self.skip(line, f"username {row['username']!r} is empty or already exists")
+            else:
+                existing.add(row['username'])
+                rows.append((line, row))
+                dates_joined.append(date_joined)
+
+        passwords = [row['password'] for _, row in rows]
+        if not self.prehashed:
+            hashed = pool.map(make_password, passwords, chunksize=max(1, len(passwords) // 32)) if pool else map(make_password, passwords)
+            passwords = list(hashed)
+        users = [
+            self.build_user(row, password, date_joined)
+            for (_, row), password, date_joined in zip(rows, passwords, dates_joined)
+        ]
+
+        # Managers go first, so customers can reference managers imported in the same chunk.
+        managers = [user for user in users if user.user_type == 'ACCOUNT_MANAGER']
+        bulk_create_users(managers)
+        self.imported += len(managers)
+
+        customers, profiles = [], {}
+        manager_ids = dict(User.objects.filter(
+            username__in={row.get('account_manager') for _, row in rows if row.get('account_manager')},
+            user_type='ACCOUNT_MANAGER',
+        ).values_list('username', 'pk'))
+        for (line, row), user in zip(rows, users):
+            if user.user_type != 'CUSTOMER':
+                continue
+            manager = row.get('account_manager')
+            if manager and manager not in manager_ids:
+                self.skip(line, f"unknown account manager {manager!r}")
+                continue
+            if manager:
+                profiles[len(customers)] = {'assigned_account_manager_id': manager_ids[manager]}
+            customers.append(user)
+        bulk_create_users(customers, profiles=profiles)
+        self.imported += len(customers)
+
+    def normalize_row(self, row):
+        """Normalize the usernames and email of ``row`` as UserManager.create_user() does."""
+        return {
+            **row,
+            'username': User.normalize_username(row['username'] or ''),
+            'email': User.objects.normalize_email(row.get('email') or ''),
+            'account_manager': User.normalize_username(row.get('account_manager') or ''),
+        }
+
+    def parse_date_joined(self, row):
+        """Return the aware date_joined of ``row``, or None if it has none; raises ValueError if it is invalid."""
+        if not row.get('date_joined'):
+            return None
+        # parse_datetime() returns None for malformed values and raises ValueError for impossible dates.
+        date_joined = parse_datetime(row['date_joined'])
+        if date_joined is None:
+            raise ValueError(row['date_joined'])
+        return timezone.make_aware(date_joined) if timezone.is_naive(date_joined) else date_joined
+
+    def build_user(self, row, password, date_joined=None):
+        return User(
+            username=row['username'],
+            password=password,
+            user_type=row['user_type'],
+            email=row['email'],
+            first_name=row.get('first_name') or '',
+            last_name=row.get('last_name') or '',
+            date_joined=date_joined or timezone.now(),
+        )
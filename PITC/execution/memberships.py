@@ -0,0 +1,142 @@
+"""execution.memberships
+
+Which service providers each account manager actively manages.
+
+A manager manages a provider when an active ServiceProviderAccountManager
+link joins them; inactive links are kept for history but grant nothing.
+active_providers() returns a manager's providers as a frozenset of
+primary keys, so membership checks are set lookups. The sets are cached
+in the alias named by settings.EXECUTION_MEMBERSHIP_CACHE, and read for
+many managers at once with one query for all the cache misses, served by
+the partial index on active links (execution/migrations/0005).
+
+Order validation trusts the cached sets, so they must never be older than
+the links on the primary: the alias must be shared by every process that
+writes links (a LocMemCache alias disables the cache), and sets read from
+the read replica, e.g. by the account manager list, are returned but not
+stored.
+
+Cache keys embed a version per manager, and a generation shared by all
+managers (see PITC.cache_versions). Saving or deleting a link, m2m add/remove/clear on
+AccountManager.managed_providers and the functions of this module bump
+the versions of the managers they touch, when the write is made and again
+when its transaction commits, so a set read before the commit is never
+stored under the committed version. Writes that bypass those paths, such
+as queryset.update() on the links, must call invalidate().
+"""
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from PITC import cache_versions
+from PITC.routers import reading_from_replica
+
+from .models import AccountManager, ServiceProviderAccountManager
+
+def get_cache():
+    return cache_versions.shared_cache(getattr(settings, 'EXECUTION_MEMBERSHIP_CACHE', None))
+
+GENERATION_KEY = 'memberships:generation'
+
+def _version_key(account_manager_id):
+    return f'memberships:version:{account_manager_id}'
+
+def invalidate(account_manager_ids):
+    cache = get_cache()
+    if cache is not None:
+        cache_versions.bump_after_write(cache, [_version_key(pk) for pk in set(account_manager_ids)])
+
+def invalidate_all():
+    cache = get_cache()
+    if cache is not None:
+        cache_versions.bump_after_write(cache, [GENERATION_KEY])
+
+def _load(account_manager_ids):
+    providers = {pk: set() for pk in account_manager_ids}
+    links = ServiceProviderAccountManager.objects.filter(
+        account_manager_id__in=account_manager_ids, is_active=True,
+    ).values_list('account_manager_id', 'service_provider_id')
+    for account_manager_id, service_provider_id in links:
+        providers[account_manager_id].add(service_provider_id)
+    return {pk: frozenset(provider_ids) for pk, provider_ids in providers.items()}
+
+def active_providers_many(account_manager_ids):
+    """Return {account manager pk: frozenset of the pks of the providers it actively manages}."""
+    account_manager_ids = set(account_manager_ids)
+    if not account_manager_ids:
+        return {}
+    cache = get_cache()
+    if cache is None:
+        return _load(account_manager_ids)
+
+    version_keys = {pk: _version_key(pk) for pk in account_manager_ids}
+    versions = cache_versions.read(cache, [GENERATION_KEY, *version_keys.values()])
+    data_keys = {
+        pk: f'memberships:active:{versions[GENERATION_KEY]}:{pk}:{versions[key]}'
+        for pk, key in version_keys.items()
+    }
+    cached = cache.get_many(data_keys.values())
+    result = {pk: cached[key] for pk, key in data_keys.items() if key in cached}
+    missing = account_manager_ids - result.keys()
+    if missing:
+        loaded = _load(missing)
+        # A lagging replica may not have the link changes behind the current versions yet.
+        if not reading_from_replica():
+            cache.set_many({data_keys[pk]: providers for pk, providers in loaded.items()}, timeout=None)
+        result.update(loaded)
+    return result
+
+def active_providers(account_manager_id):
+    return active_providers_many([account_manager_id])[account_manager_id]
+
+def manages(account_manager_id, service_provider_id):
+    return service_provider_id in active_providers(account_manager_id)
+
+def set_link(account_manager_id, service_provider_id, is_active):
+    """Create or update the link between a manager and a provider; link_changed() invalidates the manager."""
+    ServiceProviderAccountManager.objects.update_or_create(
+        account_manager_id=account_manager_id,
+        service_provider_id=service_provider_id,
+        defaults={'is_active': is_active},
+    )
+
+def set_active_providers(account_manager_id, service_provider_ids):
+    """Make ``service_provider_ids`` exactly the providers the manager actively manages.
+
+    Links to other providers are deactivated, inactive links to the given
+    providers reactivated and missing links inserted, with one statement each.
+    """
+    wanted = set(service_provider_ids)
+    links = ServiceProviderAccountManager.objects.filter(account_manager_id=account_manager_id)
+    with transaction.atomic():
+        current = dict(links.select_for_update().values_list('service_provider_id', 'is_active'))
+        deactivate = [pk for pk, is_active in current.items() if is_active and pk not in wanted]
+        reactivate = [pk for pk, is_active in current.items() if not is_active and pk in wanted]
+        if deactivate:
+            links.filter(service_provider_id__in=deactivate).update(is_active=False)
+        if reactivate:
+            links.filter(service_provider_id__in=reactivate).update(is_active=True)
+        ServiceProviderAccountManager.objects.bulk_create([
+            ServiceProviderAccountManager(account_manager_id=account_manager_id, service_provider_id=pk, is_active=True)
+            for pk in wanted - current.keys()
+        ])
+        invalidate([account_manager_id])
+
+@receiver(post_save, sender=ServiceProviderAccountManager)
+@receiver(post_delete, sender=ServiceProviderAccountManager)
+def link_changed(sender, instance, **kwargs):
+    invalidate([instance.account_manager_id])
+
+@receiver(m2m_changed, sender=AccountManager.managed_providers.through)
+def managed_providers_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        invalidate([instance.pk])
+    elif pk_set is not None:
+        invalidate(pk_set)
+    else:
+        # provider.account_managers.clear(): the affected managers are no longer known.
+        invalidate_all()
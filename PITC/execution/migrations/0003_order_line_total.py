@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:27
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery
+
+
+def fill_line_totals(apps, schema_editor):
+    Job = apps.get_model('execution', 'Job')
+    Order = apps.get_model('execution', 'Order')
+    price = Job.objects.filter(pk=OuterRef('job_id')).values('price')[:1]
+    Order.objects.update(line_total=F('quantity') * Subquery(price))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('execution', '0002_report_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='order',
+            name='order_created_at_idx',
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='line_total',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=16, null=True),
+        ),
+        migrations.RunPython(fill_line_totals, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['created_at', 'job', 'quantity', 'line_total'], name='order_created_at_idx'),
+        ),
+    ]
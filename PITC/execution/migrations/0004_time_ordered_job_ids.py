@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:35
+
+import execution.ids
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('execution', '0003_order_line_total'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='job',
+            name='job_id',
+            field=models.CharField(default=execution.ids.new_ulid, editable=False, max_length=26, primary_key=True, serialize=False, unique=True),
+        ),
+    ]
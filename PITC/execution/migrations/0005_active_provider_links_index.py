@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('execution', '0004_time_ordered_job_ids'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='serviceprovideraccountmanager',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['account_manager', 'service_provider'], name='spam_active_idx'),
+        ),
+    ]
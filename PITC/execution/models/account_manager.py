@@ -17,3 +17,11 @@ class ServiceProviderAccountManager(models.Model):
 
     class Meta:
         unique_together = ('account_manager', 'service_provider')
+        indexes = [
+            # Active memberships per manager (see execution.memberships); inactive links stay out of the index.
+            models.Index(
+                fields=['account_manager', 'service_provider'],
+                condition=models.Q(is_active=True),
+                name='spam_active_idx',
+            ),
+        ]
@@ -1,7 +1,26 @@
-from django.db import models
-import uuid
+from django.db import models, transaction
+from ..ids import LENGTH as JOB_ID_LENGTH, new_ulid
 from .service_provider import ServiceProvider
 
+class JobQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        # Order.line_total stores quantity * price; recompute it for the orders of
+        # repriced jobs, as Job.save() does. Also covers bulk_update(jobs, ['price']).
+        if 'price' not in kwargs:
+            return super().update(**kwargs)
+        from ..signals import jobs_repriced
+        from .order import Order
+
+        with transaction.atomic(using=self.db, savepoint=False):
+            previous = dict(self.values_list('pk', 'price'))
+            rows = super().update(**kwargs)
+            current = self.model._base_manager.using(self.db).filter(pk__in=previous).values_list('pk', 'price')
+            price_deltas = {pk: price - previous[pk] for pk, price in current if price != previous[pk]}
+            if price_deltas:
+                Order.fill_line_totals(Order.objects.using(self.db).filter(job_id__in=price_deltas))
+                jobs_repriced.send(sender=self.model, price_deltas=price_deltas)
+        return rows
+
 class Job(models.Model):
     JOB_TYPE_CHOICES = [
         ('regular', 'Regular'),
@@ -13,7 +32,8 @@ class Job(models.Model):
         ('completed', 'Completed'),
     ]
 
-    job_id = models.CharField(max_length=10, unique=True, primary_key=True, editable=False)
+    # Time-ordered, see execution.ids.
+    job_id = models.CharField(max_length=JOB_ID_LENGTH, unique=True, primary_key=True, editable=False, default=new_ulid)
     job_name = models.CharField(max_length=200)
     state = models.CharField(max_length=100, choices=STATE_CHOICES)
     job_type = models.CharField(max_length=20, choices=JOB_TYPE_CHOICES)
@@ -23,10 +43,34 @@ class Job(models.Model):
     service_provider = models.ForeignKey(ServiceProvider, on_delete=models.CASCADE, related_name='jobs')
     price = models.DecimalField(max_digits=10, decimal_places=2)
 
+    objects = JobQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Report range filter (starting_date >= start AND end_date < end); the trailing
+            # columns make the index covering for the report aggregates.
+            models.Index(fields=['starting_date', 'end_date', 'job_type', 'state', 'completion_time'], name='job_date_range_idx'),
+            models.Index(fields=['job_type', 'state'], name='job_type_state_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored price, so save() only rewrites order line totals when it changes.
+        instance._loaded_price = instance.__dict__.get('price')
+        return instance
+
     def save(self, *args, **kwargs):
         if not self.job_id:
-            self.job_id = str(uuid.uuid4().hex)[:10]
-        super().save(*args, **kwargs)
+            self.job_id = new_ulid()
+        adding = self._state.adding
+        # One transaction for the row, its orders' line totals and the rollups updated by post_save.
+        with transaction.atomic(using=kwargs.get('using'), savepoint=False):
+            super().save(*args, **kwargs)
+            update_fields = kwargs.get('update_fields')
+            if not adding and getattr(self, '_loaded_price', None) != self.price and (update_fields is None or 'price' in update_fields):
+                self.orders.update(line_total=models.F('quantity') * self.price)
+        self._loaded_price = self.price
 
     def __str__(self):
         return self.job_name
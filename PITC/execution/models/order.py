@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, OuterRef, Subquery
 from .customer import Customer
 from .account_manager import AccountManager
 from .job import Job
@@ -9,6 +10,33 @@ class Order(models.Model):
     job = models.ForeignKey(Job, on_delete=models.CASCADE, related_name='orders')
     quantity = models.PositiveIntegerField(default=1)
     created_at = models.DateTimeField(auto_now_add=True)
+    # quantity * job.price, kept in step by save(), Job.save() and
+    # JobQuerySet.update(price=...), so that revenue can be summed without joining Job.
+    # Null until filled for rows inserted without save() (bulk_create,
+    # fixtures); see fill_line_totals() and stat_analysis.revenue.
+    line_total = models.DecimalField(max_digits=16, decimal_places=2, null=True, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'job', 'quantity', 'line_total'], name='order_created_at_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or {'quantity', 'job', 'job_id'}.intersection(update_fields):
+            self.line_total = self.quantity * self.job.price
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'line_total'}
+        # The rollups are updated by post_save; keep them in the transaction of the row.
+        with transaction.atomic(using=kwargs.get('using'), savepoint=False):
+            super().save(*args, **kwargs)
+
+    @classmethod
+    def fill_line_totals(cls, orders=None):
+        """Recompute line_total of ``orders`` (default: those without one) in one UPDATE."""
+        orders = cls.objects.filter(line_total__isnull=True) if orders is None else orders
+        price = Job.objects.filter(pk=OuterRef('job_id')).values('price')[:1]
+        return orders.update(line_total=F('quantity') * Subquery(price))
 
     def __str__(self):
         return f"Order {self.id} by {self.customer}"
\ No newline at end of file
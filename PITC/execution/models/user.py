@@ -11,23 +11,14 @@ class User(AbstractUser):
     
     user_type = models.CharField(max_length=20, choices=USER_TYPE_CHOICES)
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            models.Index(fields=['date_joined'], name='user_date_joined_idx'),
+        ]
+
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
+    # Profiles are created once, with the user; saves of existing users leave them alone.
     if created:
-        if instance.user_type == 'ACCOUNT_MANAGER':
-            from .account_manager import AccountManager
-            AccountManager.objects.create(user=instance)
-        elif instance.user_type == 'CUSTOMER':
-            from .customer import Customer
-            Customer.objects.create(user=instance)
-
-@receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    if instance.user_type == 'ACCOUNT_MANAGER':
-        from .account_manager import AccountManager
-        if hasattr(instance, 'account_manager'):
-            instance.account_manager.save()
-    elif instance.user_type == 'CUSTOMER':
-        from .customer import Customer
-        if hasattr(instance, 'customer'):
-            instance.customer.save()
\ No newline at end of file
+        from ..provisioning import create_profile
+        create_profile(instance)
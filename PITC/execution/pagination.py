@@ -0,0 +1,23 @@
+from rest_framework.pagination import CursorPagination
+
+class KeysetPagination(CursorPagination):
+    """Cursor pagination over a stable ordering.
+
+    Pages are fetched with a WHERE on the ordering key instead of an
+    OFFSET, so every page costs the same no matter how deep the client
+    has paged and no rows are skipped or repeated while others are inserted.
+    """
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    ordering = 'id'
+
+class ProfilePagination(KeysetPagination):
+    # AccountManager and Customer use their user as primary key.
+    ordering = 'user_id'
+
+class JobPagination(KeysetPagination):
+    ordering = 'job_id'
+
+class OrderPagination(KeysetPagination):
+    ordering = ('created_at', 'id')
@@ -0,0 +1,65 @@
+"""execution.provisioning
+
+Creation of users together with their profile row.
+
+Every user of type ACCOUNT_MANAGER or CUSTOMER has an AccountManager or
+Customer profile. It is created exactly once, when the user is created:
+by the post_save receiver in execution.models.user for single saves
+(including createsuperuser, the admin and create_user()), or by
+bulk_create_users() for batches. Later saves of a user never touch the
+profile.
+"""
+
+from django.db import transaction
+
+from .models import AccountManager, Customer, User
+from .signals import users_bulk_created
+
+PROFILE_MODELS = {
+    'ACCOUNT_MANAGER': AccountManager,
+    'CUSTOMER': Customer,
+}
+
+def create_profile(user, **profile_fields):
+    """Create the profile row of a newly created user; returns None for users without a profile type."""
+    model = PROFILE_MODELS.get(user.user_type)
+    if model is None:
+        return None
+    return model.objects.create(user=user, **profile_fields)
+
+def create_user(username, password, user_type, profile=None, **extra_fields):
+    """Create a user and its profile, and set the fields in ``profile`` on the profile row."""
+    with transaction.atomic():
+        # create_user() normalizes the username and email; the post_save receiver creates the profile.
+        user = User.objects.create_user(username=username, password=password, user_type=user_type, **extra_fields)
+        model = PROFILE_MODELS.get(user_type)
+        if model is not None and profile:
+            # The receiver's create() cached the profile on the user.
+            profile_row = getattr(user, model.user.field.remote_field.get_accessor_name())
+            for field, value in profile.items():
+                setattr(profile_row, field, value)
+            profile_row.save(update_fields=list(profile))
+    return user
+
+def bulk_create_users(users, profiles=None, batch_size=1000):
+    """Insert unsaved users and their profiles with one bulk INSERT per table.
+
+    ``users`` must already carry hashed passwords (see set_password() or
+    make_password()). ``profiles`` optionally maps a position in ``users``
+    to extra fields of that user's profile row. bulk_create() sends no
+    post_save, so users_bulk_created is sent for the batch instead.
+    """
+    profiles = profiles or {}
+    with transaction.atomic():
+        users = User.objects.bulk_create(users, batch_size=batch_size)
+        for user_type, model in PROFILE_MODELS.items():
+            model.objects.bulk_create(
+                [
+                    model(user=user, **profiles.get(position, {}))
+                    for position, user in enumerate(users)
+                    if user.user_type == user_type
+                ],
+                batch_size=batch_size,
+            )
+        users_bulk_created.send(sender=User, users=users)
+    return users
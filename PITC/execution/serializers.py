@@ -1,5 +1,10 @@
+from django.db import transaction
 from rest_framework import serializers
 from .models import User, ServiceProvider, AccountManager, Customer, Job, Order, ServiceProviderAccountManager
+from . import memberships
+from .ids import LENGTH as JOB_ID_LENGTH
+from .provisioning import create_user
+from .signals import orders_bulk_created
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -18,42 +23,37 @@ class ServiceProviderAccountManagerSerializer(serializers.ModelSerializer):
         model = ServiceProviderAccountManager
         fields = ['id', 'service_provider', 'assigned_date', 'is_active']
 
+class AccountManagerListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        # Look the active providers of the whole page up at once.
+        instances = list(data.all() if hasattr(data, 'all') else data)
+        self.child.active_providers = memberships.active_providers_many(instance.pk for instance in instances)
+        return super().to_representation(instances)
+
 class AccountManagerSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
-    managed_providers = serializers.PrimaryKeyRelatedField(queryset=ServiceProvider.objects.all(), many=True)
+    # Written as the complete set of active providers; represented from execution.memberships
+    # in to_representation() rather than from the m2m, which would also list inactive links.
+    managed_providers = serializers.PrimaryKeyRelatedField(queryset=ServiceProvider.objects.all(), many=True, write_only=True)
 
     class Meta:
         model = AccountManager
         fields = ['user', 'managed_providers']
+        list_serializer_class = AccountManagerListSerializer
+
+    def to_representation(self, instance):
+        ret = super().to_representation(instance)
+        active = getattr(self, 'active_providers', None)
+        providers = active[instance.pk] if active and instance.pk in active else memberships.active_providers(instance.pk)
+        ret['managed_providers'] = sorted(providers)
+        return ret
 
     def update(self, instance, validated_data):
         managed_providers = validated_data.pop('managed_providers', None)
         instance = super().update(instance, validated_data)
-        
         if managed_providers is not None:
-            current_providers = set(instance.managed_providers.all())
-            new_providers = set(managed_providers)
-            
-            for provider in current_providers - new_providers:
-                ServiceProviderAccountManager.objects.filter(
-                    account_manager=instance,
-                    service_provider=provider
-                ).update(is_active=False)
-            
-            for provider in new_providers - current_providers:
-                ServiceProviderAccountManager.objects.update_or_create(
-                    account_manager=instance,
-                    service_provider=provider,
-                    defaults={'is_active': True}
-                )
-        
+            memberships.set_active_providers(instance.pk, [provider.pk for provider in managed_providers])
         return instance
-    def get_managed_providers(self, obj):
-        managed_providers = ServiceProviderAccountManager.objects.filter(
-            account_manager=obj,
-            is_active=True
-        )
-        return ServiceProviderAccountManagerSerializer(managed_providers, many=True).data
 
 class CustomerSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
@@ -68,13 +68,14 @@ class CustomerSerializer(serializers.ModelSerializer):
         if not user_data:
             raise serializers.ValidationError("User data is required")
         
-        user = User.objects.create_user(
+        # The profile is created with the user, so it must not be created again here.
+        user = create_user(
             username=user_data['username'],
             password=user_data['password'],
-            user_type='CUSTOMER'
+            user_type='CUSTOMER',
+            profile=validated_data,
         )
-        customer = Customer.objects.create(user=user, **validated_data)
-        return customer
+        return user.customer
 
 
 class OrderSerializer(serializers.ModelSerializer):
@@ -87,14 +88,96 @@ class OrderSerializer(serializers.ModelSerializer):
         job = data['job']
         account_manager = data['account_manager']
 
-        if account_manager != customer.assigned_account_manager:
+        # Compare keys rather than related objects, so no extra rows are fetched.
+        if account_manager is None or account_manager.pk != customer.assigned_account_manager_id:
             raise serializers.ValidationError("The account manager must be the customer's assigned manager.")
 
-        if job.service_provider not in account_manager.managed_providers.all():
+        if not memberships.manages(account_manager.pk, job.service_provider_id):
             raise serializers.ValidationError("The job's service provider must be managed by the account manager.")
 
         return data
 
+class OrderBulkItemSerializer(serializers.Serializer):
+    # Shape-only validation of one bulk order; references are resolved in bulk by OrderBatch.
+    customer = serializers.IntegerField()
+    account_manager = serializers.IntegerField(allow_null=True)
+    job = serializers.CharField(max_length=JOB_ID_LENGTH)
+    quantity = serializers.IntegerField(min_value=0, max_value=2147483647, required=False, default=1)
+
+class OrderBatch:
+    """Validates and creates a batch of orders.
+
+    Applies the same rules as OrderSerializer, but checks the shape of each
+    item with OrderBulkItemSerializer and then resolves the referenced
+    customers, jobs and account managers for the whole batch in one query
+    each, and the managers' active providers with one membership lookup.
+    Invalid items are reported by index and the valid ones are inserted
+    with a single bulk_create.
+    """
+    batch_size = 1000
+
+    def __init__(self, data):
+        self.initial_data = data
+        self.errors = []
+        self.valid_orders = []
+
+    def is_valid(self):
+        items = []
+        for index, item in enumerate(self.initial_data):
+            serializer = OrderBulkItemSerializer(data=item)
+            if serializer.is_valid():
+                items.append((index, serializer.validated_data))
+            else:
+                self.errors.append({'index': index, 'errors': serializer.errors})
+
+        customer_ids = {data['customer'] for _, data in items}
+        manager_ids = {data['account_manager'] for _, data in items if data['account_manager'] is not None}
+        job_ids = {data['job'] for _, data in items}
+
+        customers = dict(Customer.objects.filter(pk__in=customer_ids).values_list('pk', 'assigned_account_manager_id'))
+        managers = set(AccountManager.objects.filter(pk__in=manager_ids).values_list('pk', flat=True))
+        jobs, prices = {}, {}
+        for pk, service_provider_id, price in Job.objects.filter(pk__in=job_ids).values_list('pk', 'service_provider_id', 'price'):
+            jobs[pk] = service_provider_id
+            prices[pk] = price
+        active_providers = memberships.active_providers_many(managers)
+
+        for index, data in items:
+            errors = {}
+            for field, known in (('customer', customers), ('account_manager', managers), ('job', jobs)):
+                if data[field] is not None and data[field] not in known:
+                    errors[field] = [f'Invalid pk "{data[field]}" - object does not exist.']
+            if not errors:
+                errors = self.validate_item(data, customers, jobs, active_providers)
+            if errors:
+                self.errors.append({'index': index, 'errors': errors})
+            else:
+                self.valid_orders.append(Order(
+                    customer_id=data['customer'],
+                    account_manager_id=data['account_manager'],
+                    job_id=data['job'],
+                    quantity=data['quantity'],
+                    # bulk_create skips Order.save(), which would fill this in.
+                    line_total=data['quantity'] * prices[data['job']],
+                ))
+
+        self.errors.sort(key=lambda error: error['index'])
+        return not self.errors
+
+    def validate_item(self, data, customers, jobs, active_providers):
+        account_manager_id = data['account_manager']
+        if account_manager_id is None or account_manager_id != customers[data['customer']]:
+            return {'non_field_errors': ["The account manager must be the customer's assigned manager."]}
+        if jobs[data['job']] not in active_providers[account_manager_id]:
+            return {'non_field_errors': ["The job's service provider must be managed by the account manager."]}
+        return {}
+
+    def save(self):
+        with transaction.atomic():
+            orders = Order.objects.bulk_create(self.valid_orders, batch_size=self.batch_size)
+            orders_bulk_created.send(sender=Order, orders=orders)
+        return orders
+
 class JobSerializer(serializers.ModelSerializer):
     class Meta:
         model = Job
@@ -0,0 +1,22 @@
+"""execution.signals
+
+Signals for bulk write paths.
+
+bulk_create() and QuerySet.update() do not send post_save, so code that
+writes rows in bulk sends one of these signals instead, once per batch.
+Receivers that keep derived data up to date (e.g. the report rollups in
+stat_analysis) must listen to both.
+"""
+
+from django.dispatch import Signal
+
+# Sent with ``orders``: the list of created Order instances.
+orders_bulk_created = Signal()
+
+# Sent with ``users``: the list of created User instances (see execution.provisioning).
+users_bulk_created = Signal()
+
+# Sent with ``price_deltas``: {job pk: new price - old price} of the jobs
+# repriced with QuerySet.update() (see execution.models.job.JobQuerySet),
+# after the line totals of their orders were recomputed.
+jobs_repriced = Signal()
@@ -1,28 +1,41 @@
 from rest_framework import viewsets, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
-from .models import User, ServiceProvider, AccountManager, Customer, Job, Order, ServiceProviderAccountManager
+from PITC.instrumentation import InstrumentedViewSetMixin
+from PITC.routers import ReplicaReadMixin
+from . import memberships
+from .exports import StreamingExportMixin
+from .fast_serializers import FastListMixin
+from .http_cache import ConditionalGetMixin
+from .pagination import KeysetPagination, ProfilePagination, JobPagination, OrderPagination
+from .models import User, ServiceProvider, AccountManager, Customer, Job, Order
 from .serializers import (
     UserSerializer, 
     ServiceProviderSerializer, 
     AccountManagerSerializer,
     CustomerSerializer,
     JobSerializer,
-    OrderSerializer
+    OrderSerializer,
+    OrderBatch
 )
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(InstrumentedViewSetMixin, ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
+    pagination_class = KeysetPagination
 
-class ServiceProviderViewSet(viewsets.ModelViewSet):
+class ServiceProviderViewSet(InstrumentedViewSetMixin, ReplicaReadMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = ServiceProvider.objects.all()
     serializer_class = ServiceProviderSerializer
+    pagination_class = KeysetPagination
+    conditional_models = (ServiceProvider,)
 
 
-class AccountManagerViewSet(viewsets.ModelViewSet):
-    queryset = AccountManager.objects.all()
+class AccountManagerViewSet(InstrumentedViewSetMixin, ReplicaReadMixin, viewsets.ModelViewSet):
+    # managed_providers is read from execution.memberships, not the m2m relation.
+    queryset = AccountManager.objects.select_related('user')
     serializer_class = AccountManagerSerializer
+    pagination_class = ProfilePagination
 
     @action(detail=True, methods=['post'])
     def add_provider(self, request, pk=None):
@@ -32,11 +45,7 @@ class AccountManagerViewSet(viewsets.ModelViewSet):
         if provider_id:
             try:
                 provider = ServiceProvider.objects.get(id=provider_id)
-                ServiceProviderAccountManager.objects.get_or_create(
-                    account_manager=account_manager,
-                    service_provider=provider,
-                    defaults={'is_active': True}
-                )
+                memberships.set_link(account_manager.pk, provider.pk, is_active=True)
                 return Response({'status': 'provider added'}, status=status.HTTP_200_OK)
             except ServiceProvider.DoesNotExist:
                 return Response({'error': 'Provider not found'}, status=status.HTTP_404_NOT_FOUND)
@@ -51,19 +60,18 @@ class AccountManagerViewSet(viewsets.ModelViewSet):
         if provider_id:
             try:
                 provider = ServiceProvider.objects.get(id=provider_id)
-                ServiceProviderAccountManager.objects.filter(
-                    account_manager=account_manager,
-                    service_provider=provider
-                ).update(is_active=False)
+                if provider.pk in memberships.active_providers(account_manager.pk):
+                    memberships.set_link(account_manager.pk, provider.pk, is_active=False)
                 return Response({'status': 'provider removed'}, status=status.HTTP_200_OK)
             except ServiceProvider.DoesNotExist:
                 return Response({'error': 'Provider not found'}, status=status.HTTP_404_NOT_FOUND)
         
         return Response({'error': 'provider_id is required'}, status=status.HTTP_400_BAD_REQUEST)
     
-class CustomerViewSet(viewsets.ModelViewSet):
-    queryset = Customer.objects.all()
+class CustomerViewSet(InstrumentedViewSetMixin, ReplicaReadMixin, viewsets.ModelViewSet):
+    queryset = Customer.objects.select_related('user')
     serializer_class = CustomerSerializer
+    pagination_class = ProfilePagination
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data, context={'request': request})
@@ -86,9 +94,13 @@ class CustomerViewSet(viewsets.ModelViewSet):
                 return Response({'error': 'Account manager not found'}, status=status.HTTP_404_NOT_FOUND)
         return Response({'error': 'account_manager_id is required'}, status=status.HTTP_400_BAD_REQUEST)
 
-class OrderViewSet(viewsets.ModelViewSet):
+class OrderViewSet(InstrumentedViewSetMixin, ReplicaReadMixin, FastListMixin, StreamingExportMixin, viewsets.ModelViewSet):
     queryset = Order.objects.all()
     serializer_class = OrderSerializer
+    pagination_class = OrderPagination
+    export_filename = 'orders'
+    replica_read_actions = ('list', 'export')
+    max_bulk_size = 10000
 
     def get_queryset(self):
         account_manager_id = self.request.query_params.get('account_manager_id')
@@ -103,6 +115,47 @@ class OrderViewSet(viewsets.ModelViewSet):
         
         return queryset
 
-class JobViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk_create(self, request):
+        if not isinstance(request.data, list):
+            return Response({'error': 'A list of orders is required'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(request.data) > self.max_bulk_size:
+            return Response({'error': f'At most {self.max_bulk_size} orders can be created at once'}, status=status.HTTP_400_BAD_REQUEST)
+
+        batch = OrderBatch(data=request.data)
+        batch.is_valid()
+        orders = batch.save() if batch.valid_orders else []
+
+        if not batch.errors:
+            response_status = status.HTTP_201_CREATED
+        elif orders:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+        return Response(
+            {'created': OrderSerializer(orders, many=True).data, 'errors': batch.errors},
+            status=response_status,
+        )
+
+class JobViewSet(InstrumentedViewSetMixin, ReplicaReadMixin, ConditionalGetMixin, FastListMixin, StreamingExportMixin, viewsets.ModelViewSet):
     queryset = Job.objects.all()
-    serializer_class = JobSerializer
\ No newline at end of file
+    serializer_class = JobSerializer
+    pagination_class = JobPagination
+    export_filename = 'jobs'
+    # Lists filtered by account manager or customer depend on the orders too.
+    conditional_models = (Job, Order)
+    replica_read_actions = ('list', 'export')
+
+    def get_queryset(self):
+        account_manager_id = self.request.query_params.get('account_manager_id')
+        customer_id = self.request.query_params.get('customer_id')
+
+        queryset = Job.objects.all()
+
+        # Jobs that were ordered through the account manager / by the customer
+        if account_manager_id:
+            queryset = queryset.filter(job_id__in=Order.objects.filter(account_manager_id=account_manager_id).values('job_id'))
+        elif customer_id:
+            queryset = queryset.filter(job_id__in=Order.objects.filter(customer_id=customer_id).values('job_id'))
+
+        return queryset
\ No newline at end of file
@@ -1,45 +1,59 @@
 from django.contrib import admin
 from .models import Report, JobReportResult, OrderReportResult, UserReportResult
+from .models import ProviderReportResult, AccountManagerReportResult
+from .tasks import enqueue_report
 
-class JobReportResultInline(admin.StackedInline):
+class ReportResultInline(admin.StackedInline):
+    # Results are written by the report worker, not edited by hand.
+    extra = 0
+    can_delete = False
+
+    def get_readonly_fields(self, request, obj=None):
+        return [field.name for field in self.model._meta.fields]
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+class JobReportResultInline(ReportResultInline):
     model = JobReportResult
 
-class OrderReportResultInline(admin.StackedInline):
+class OrderReportResultInline(ReportResultInline):
     model = OrderReportResult
 
-class UserReportResultInline(admin.StackedInline):
+class UserReportResultInline(ReportResultInline):
     model = UserReportResult
 
+class ProviderReportResultInline(ReportResultInline):
+    model = ProviderReportResult
+    template = admin.TabularInline.template
+
+class AccountManagerReportResultInline(ReportResultInline):
+    model = AccountManagerReportResult
+    template = admin.TabularInline.template
+
 @admin.register(Report)
 class ReportAdmin(admin.ModelAdmin):
-    list_display = ('title', 'created_at', 'year_from', 'quarter_from', 'year_to', 'quarter_to')
-    list_filter = ('year_from', 'year_to', 'created_at')
+    list_display = ('title', 'created_at', 'year_from', 'quarter_from', 'year_to', 'quarter_to', 'status', 'progress')
+    list_filter = ('status', 'year_from', 'year_to', 'created_at')
     search_fields = ('title',)
-    inlines = [JobReportResultInline, OrderReportResultInline, UserReportResultInline]
+    readonly_fields = ('status', 'progress', 'error', 'started_at', 'finished_at')
+    inlines = [
+        JobReportResultInline, OrderReportResultInline, UserReportResultInline,
+        ProviderReportResultInline, AccountManagerReportResultInline,
+    ]
+    actions = ['recompute_reports']
 
     def save_model(self, request, obj, form, change):
         if not obj.pk:
             obj.created_by = request.user
         super().save_model(request, obj, form, change)
+        # Statistics are computed by the report worker rather than inside the request.
+        range_fields = {'quarter_from', 'year_from', 'quarter_to', 'year_to'}
+        if not change or range_fields.intersection(form.changed_data):
+            enqueue_report(obj)
 
-    def save_formset(self, request, form, formset, change):
-        instances = formset.save(commit=False)
-        for instance in instances:
-            if not instance.pk:
-                from .stat_utils import calculate_job_statistics, calculate_order_statistics, calculate_user_statistics
-                
-                if isinstance(instance, JobReportResult):
-                    stats = calculate_job_statistics(form.instance.year_from, form.instance.quarter_from, form.instance.year_to, form.instance.quarter_to)
-                    for key, value in stats.items():
-                        setattr(instance, key, value)
-                elif isinstance(instance, OrderReportResult):
-                    stats = calculate_order_statistics(form.instance.year_from, form.instance.quarter_from, form.instance.year_to, form.instance.quarter_to)
-                    for key, value in stats.items():
-                        setattr(instance, key, value)
-                elif isinstance(instance, UserReportResult):
-                    stats = calculate_user_statistics(form.instance.year_from, form.instance.quarter_from, form.instance.year_to, form.instance.quarter_to)
-                    for key, value in stats.items():
-                        setattr(instance, key, value)
-            
-            instance.save()
-        formset.save_m2m()
\ No newline at end of file
+    @admin.action(description="Recompute selected reports")
+    def recompute_reports(self, request, queryset):
+        for report in queryset:
+            enqueue_report(report)
+        self.message_user(request, f"{queryset.count()} report(s) queued.")
@@ -2,4 +2,7 @@ from django.apps import AppConfig
 
 class StatAnalysisConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'stat_analysis'
\ No newline at end of file
+    name = 'stat_analysis'
+
+    def ready(self):
+        from . import signals  # noqa: F401
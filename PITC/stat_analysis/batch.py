@@ -0,0 +1,190 @@
+"""stat_analysis.batch
+
+Computes many reports from one pass over the data.
+
+calculate_report_batch() takes a list of quarter ranges, groups Job,
+Order and User by quarter once, and derives every range's statistics
+from prefix sums over those groups:
+
+- orders and users: 1-D prefix sums over quarters;
+- jobs: a job counts toward [a, b] when it starts at or after a and ends
+  at or before b, so jobs are summed over a 2-D table of
+  (start quarter, end quarter) cells, accumulated over start quarters
+  from the right and over end quarters from the left.
+
+Completion time percentiles and histograms are merged, per range, from
+the sketches stored on the JobQuarterRollup cells the range covers.
+
+These reads run inside read_from_replica() (see PITC.routers). The Report
+rows and all result rows are then written to the primary with bulk upserts.
+"""
+
+from decimal import Decimal
+
+from django.db import transaction
+
+from PITC.routers import read_from_replica
+
+from . import rollup_utils, stat_utils
+from .quarters import quarter_start
+
+JOB_METRICS = ('total', 'regular_count', 'regular_time', 'wafer_run_count', 'wafer_run_time', 'created', 'active', 'completed')
+
+def _job_metrics(row):
+    count, time = row['job_count'], row['completion_time_sum'] or 0
+    return (
+        count,
+        count if row['job_type'] == 'regular' else 0,
+        time if row['job_type'] == 'regular' else 0,
+        count if row['job_type'] == 'wafer_run' else 0,
+        time if row['job_type'] == 'wafer_run' else 0,
+        count if row['state'] == 'created' else 0,
+        count if row['state'] == 'active' else 0,
+        count if row['state'] == 'completed' else 0,
+    )
+
+def _add(left, right):
+    return tuple(a + b for a, b in zip(left, right))
+
+def _sub(left, right):
+    return tuple(a - b for a, b in zip(left, right))
+
+def job_stats_table(lo, hi):
+    """Dominance sums: table[s][e] totals the jobs starting in s..hi and ending in lo..e."""
+    size = hi - lo + 1
+    zero = (0,) * len(JOB_METRICS)
+    cells = [[zero] * size for _ in range(size)]
+    jobs = rollup_utils.Job.objects.filter(starting_date__gte=quarter_start(lo), end_date__lt=quarter_start(hi + 1))
+    for row in rollup_utils.job_quarter_groups(jobs):
+        s, e = row['start_quarter'] - lo, row['end_quarter'] - lo
+        cells[s][e] = _add(cells[s][e], _job_metrics(row))
+
+    table = [[zero] * (size + 1) for _ in range(size + 1)]
+    for s in range(size - 1, -1, -1):
+        for e in range(size):
+            # table is shifted by one in e so that table[.][0] is the empty prefix
+            table[s][e + 1] = _sub(
+                _add(_add(cells[s][e], table[s + 1][e + 1]), table[s][e]),
+                table[s + 1][e],
+            )
+    return table
+
+def _job_stats(table, lo, index_from, index_to):
+    total, regular_count, regular_time, wafer_run_count, wafer_run_time, created, active, completed = table[index_from - lo][index_to - lo + 1]
+    return {
+        'total_jobs': total,
+        'avg_completion_time_regular': regular_time / regular_count if regular_count else 0,
+        'avg_completion_time_wafer_run': wafer_run_time / wafer_run_count if wafer_run_count else 0,
+        'jobs_created': created,
+        'jobs_active': active,
+        'jobs_completed': completed,
+    }
+
+def job_sketch_cells(lo, hi):
+    return list(
+        rollup_utils.job_rollup_model.objects.filter(start_quarter__gte=lo, end_quarter__lte=hi).values_list(
+            'start_quarter', 'end_quarter', 'job_type', 'completion_time_sketch',
+        )
+    )
+
+def _completion_time_distribution(cells, index_from, index_to):
+    return rollup_utils.completion_time_distribution(
+        (job_type, sketch) for start, end, job_type, sketch in cells if start >= index_from and end <= index_to
+    )
+
+def order_prefix_sums(lo, hi):
+    counts, revenues = [0] * (hi - lo + 2), [Decimal('0')] * (hi - lo + 2)
+    orders = rollup_utils.Order.objects.filter(created_at__gte=quarter_start(lo), created_at__lt=quarter_start(hi + 1))
+    for row in rollup_utils.order_quarter_groups(orders):
+        counts[row['quarter'] - lo + 1] += row['order_count']
+        revenues[row['quarter'] - lo + 1] += row['revenue_sum'] or 0
+    for i in range(1, len(counts)):
+        counts[i] += counts[i - 1]
+        revenues[i] += revenues[i - 1]
+    return counts, revenues
+
+def _order_stats(prefix, lo, index_from, index_to):
+    counts, revenues = prefix
+    total_orders = counts[index_to - lo + 1] - counts[index_from - lo]
+    total_revenue = revenues[index_to - lo + 1] - revenues[index_from - lo]
+    return {
+        'total_orders': total_orders,
+        'total_revenue': total_revenue,
+        'average_order_value': total_revenue / total_orders if total_orders > 0 else 0,
+    }
+
+def user_prefix_sums(lo, hi):
+    # Index 0 holds every user who joined before lo.
+    counts = [0] * (hi - lo + 2)
+    users = rollup_utils.User.objects.filter(date_joined__lt=quarter_start(hi + 1))
+    for row in rollup_utils.user_quarter_groups(users):
+        counts[max(row['quarter'] - lo + 1, 0)] += row['user_count']
+    for i in range(1, len(counts)):
+        counts[i] += counts[i - 1]
+    return counts
+
+def _user_stats(counts, lo, index_from, index_to):
+    return {
+        'total_users': counts[index_to - lo + 1],
+        'new_users': counts[index_to - lo + 1] - counts[index_from - lo],
+    }
+
+def get_or_create_reports(ranges):
+    """Return {range: Report} for the given quarter ranges, creating missing reports in bulk."""
+    model = stat_utils.report_model
+    existing = model.objects.filter(
+        year_from__gte=min(r[1] for r in ranges), year_to__lte=max(r[3] for r in ranges),
+    ).order_by('pk')
+    reports = {}
+    for report in existing:
+        reports.setdefault((report.quarter_from, report.year_from, report.quarter_to, report.year_to), report)
+    missing = [r for r in ranges if r not in reports]
+    created = model.objects.bulk_create([
+        model(
+            title=f'Report {year_from}Q{quarter_from} - {year_to}Q{quarter_to}',
+            quarter_from=quarter_from, year_from=year_from, quarter_to=quarter_to, year_to=year_to,
+            status=model.STATUS_DONE, progress=100,
+        )
+        for quarter_from, year_from, quarter_to, year_to in missing
+    ])
+    reports.update(zip(missing, created))
+    return reports
+
+def calculate_report_batch(ranges):
+    """Compute and store the statistics of every (quarter_from, year_from, quarter_to, year_to) range.
+
+    Returns {range: Report}.
+    """
+    ranges = list(dict.fromkeys(tuple(r) for r in ranges))
+    if not ranges:
+        return {}
+    indices = {r: stat_utils.get_quarter_range(*r) for r in ranges}
+    lo = min(index_from for index_from, _ in indices.values())
+    hi = max(index_to for _, index_to in indices.values())
+    if any(index_from > index_to for index_from, index_to in indices.values()):
+        raise ValueError("Each range must start at or before the quarter it ends in.")
+
+    with read_from_replica():
+        job_table = job_stats_table(lo, hi)
+        job_cells = job_sketch_cells(lo, hi)
+        order_prefix = order_prefix_sums(lo, hi)
+        user_prefix = user_prefix_sums(lo, hi)
+
+    with transaction.atomic():
+        reports = get_or_create_reports(ranges)
+        for result_model, stats_for in (
+            (stat_utils.job_stats_model, lambda r: {
+                **_job_stats(job_table, lo, *indices[r]),
+                **_completion_time_distribution(job_cells, *indices[r]),
+            }),
+            (stat_utils.order_stats_model, lambda r: _order_stats(order_prefix, lo, *indices[r])),
+            (stat_utils.user_stats_model, lambda r: _user_stats(user_prefix, lo, *indices[r])),
+        ):
+            rows = [result_model(report=reports[r], **stats_for(r)) for r in ranges]
+            result_model.objects.bulk_create(
+                rows,
+                update_conflicts=True,
+                unique_fields=['report'],
+                update_fields=[field for field in stats_for(ranges[0])],
+            )
+    return reports
@@ -0,0 +1,9 @@
+from django.core.management.base import BaseCommand
+from stat_analysis.rollup_utils import rebuild_rollups
+
+class Command(BaseCommand):
+    help = "Recompute the quarterly report rollups from the Job, Order and User tables."
+
+    def handle(self, *args, **options):
+        rebuild_rollups()
+        self.stdout.write(self.style.SUCCESS("Quarterly rollups rebuilt."))
@@ -0,0 +1,20 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from stat_analysis.tasks import run_worker
+
+class Command(BaseCommand):
+    help = "Compute queued reports in the background."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Exit once the queue is empty.")
+        parser.add_argument('--poll-interval', type=float, default=2.0, help="Seconds to wait between polls of an empty queue.")
+        parser.add_argument('--stale-after', type=int, default=60, help="Minutes after which a running report is considered abandoned and requeued.")
+
+    def handle(self, *args, **options):
+        processed = run_worker(
+            poll_interval=options['poll_interval'],
+            once=options['once'],
+            stale_after=timedelta(minutes=options['stale_after']),
+        )
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} report(s)."))
@@ -9,7 +9,17 @@ The Report model defines the reporting range.
 Each Report has results of statistical analysis,
 i.e. statistics of orders and jobs, which are stored in
 OrderReportResult and JobReportResult models.
+
+The *QuarterRollup models hold per-quarter pre-aggregated
+counts and sums, kept up to date incrementally, from which
+reports over any range of whole quarters are computed.
+
+ProviderReportResult and AccountManagerReportResult break the
+order and job statistics of a report down per service provider
+and per account manager.
 """
 
 from .report import Report
-from .statistics import JobReportResult, OrderReportResult, UserReportResult
\ No newline at end of file
+from .statistics import JobReportResult, OrderReportResult, UserReportResult
+from .rollup import JobQuarterRollup, OrderQuarterRollup, UserQuarterRollup
+from .breakdown import ProviderReportResult, AccountManagerReportResult
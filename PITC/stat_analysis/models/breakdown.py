@@ -0,0 +1,28 @@
+from django.db import models
+from .report import Report
+
+class ProviderReportResult(models.Model):
+    report = models.ForeignKey(Report, on_delete=models.CASCADE, related_name='provider_results')
+    service_provider = models.ForeignKey('execution.ServiceProvider', on_delete=models.CASCADE, related_name='+')
+    total_jobs = models.IntegerField(default=0)
+    avg_completion_time = models.FloatField(default=0)
+    total_orders = models.IntegerField(default=0)
+    total_revenue = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    class Meta:
+        app_label = 'stat_analysis'
+        unique_together = ('report', 'service_provider')
+        # Top-N by revenue within a report is an index range scan.
+        indexes = [models.Index(fields=['report', '-total_revenue'], name='provider_result_top_idx')]
+
+class AccountManagerReportResult(models.Model):
+    report = models.ForeignKey(Report, on_delete=models.CASCADE, related_name='account_manager_results')
+    account_manager = models.ForeignKey('execution.AccountManager', on_delete=models.CASCADE, related_name='+')
+    total_orders = models.IntegerField(default=0)
+    total_revenue = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    avg_completion_time = models.FloatField(default=0, help_text="Average completion time of the jobs of the orders.")
+
+    class Meta:
+        app_label = 'stat_analysis'
+        unique_together = ('report', 'account_manager')
+        indexes = [models.Index(fields=['report', '-total_revenue'], name='manager_result_top_idx')]
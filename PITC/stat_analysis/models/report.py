@@ -1,6 +1,17 @@
 from django.db import models
 
 class Report(models.Model):
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
     # metadata
     title = models.CharField(max_length=100)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -11,6 +22,13 @@ class Report(models.Model):
     quarter_to = models.CharField(max_length=2, choices=[('Q1', 'Q1'), ('Q2', 'Q2'), ('Q3', 'Q3'), ('Q4', 'Q4')])
     year_to = models.IntegerField()
 
+    # Background computation, see stat_analysis.tasks
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_QUEUED, db_index=True)
+    progress = models.PositiveSmallIntegerField(default=0, help_text="Percentage of the statistics computed.")
+    error = models.TextField(blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
     # PDF file
     pdf_file = models.FileField(upload_to='reports/', null=True, blank=True)
 
@@ -18,4 +36,4 @@ class Report(models.Model):
         return f"{self.title} - {self.year_from} Q{self.quarter_from} to {self.year_to} Q{self.quarter_to}"
 
     class Meta:
-        app_label = 'stat_analysis'
\ No newline at end of file
+        app_label = 'stat_analysis'
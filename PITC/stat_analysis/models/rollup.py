@@ -0,0 +1,31 @@
+from django.db import models
+
+class JobQuarterRollup(models.Model):
+    # A job falls into a report range when it both starts and ends inside it,
+    # so jobs are bucketed by the pair of quarters they start and end in.
+    start_quarter = models.IntegerField(help_text="Quarter index (year * 4 + quarter - 1) of starting_date.")
+    end_quarter = models.IntegerField(help_text="Quarter index (year * 4 + quarter - 1) of end_date.")
+    job_type = models.CharField(max_length=20)
+    state = models.CharField(max_length=100)
+    job_count = models.IntegerField(default=0)
+    completion_time_sum = models.FloatField(default=0)
+    completion_time_sketch = models.JSONField(default=dict, help_text="Quantile sketch of completion_time, see stat_analysis.sketches.")
+
+    class Meta:
+        app_label = 'stat_analysis'
+        unique_together = ('start_quarter', 'end_quarter', 'job_type', 'state')
+
+class OrderQuarterRollup(models.Model):
+    quarter = models.IntegerField(unique=True, help_text="Quarter index (year * 4 + quarter - 1) of created_at.")
+    order_count = models.IntegerField(default=0)
+    revenue_sum = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    class Meta:
+        app_label = 'stat_analysis'
+
+class UserQuarterRollup(models.Model):
+    quarter = models.IntegerField(unique=True, help_text="Quarter index (year * 4 + quarter - 1) of date_joined.")
+    user_count = models.IntegerField(default=0)
+
+    class Meta:
+        app_label = 'stat_analysis'
@@ -9,6 +9,15 @@ class JobReportResult(models.Model):
     jobs_created = models.IntegerField()
     jobs_active = models.IntegerField()
     jobs_completed = models.IntegerField()
+    # Approximate completion time percentiles (see stat_analysis.sketches); null without jobs of the type.
+    completion_time_p50_regular = models.FloatField(null=True, blank=True)
+    completion_time_p90_regular = models.FloatField(null=True, blank=True)
+    completion_time_p99_regular = models.FloatField(null=True, blank=True)
+    completion_time_p50_wafer_run = models.FloatField(null=True, blank=True)
+    completion_time_p90_wafer_run = models.FloatField(null=True, blank=True)
+    completion_time_p99_wafer_run = models.FloatField(null=True, blank=True)
+    # {'edges': [...], '<job type>': [count per bucket, ...]}
+    completion_time_histogram = models.JSONField(null=True, blank=True)
 
 class OrderReportResult(models.Model):
     report = models.OneToOneField(Report, on_delete=models.CASCADE)
@@ -0,0 +1,113 @@
+"""stat_analysis.orchestrator
+
+Computes all statistics of a report at once.
+
+The job, order and user calculators and the per-provider and
+per-account-manager breakdowns are independent, so they run
+concurrently on a thread pool, each thread on its own database
+connection. Report wall-clock time is then roughly that of the slowest
+calculator. All results are stored in a single transaction.
+
+The calculators only read, so they run inside read_from_replica() and
+query the read replica when one is configured (see PITC.routers); each
+thread runs in a copy of the caller's context to inherit that.
+
+With ``STAT_ANALYSIS_BACKEND = 'vectorized'`` (and NumPy installed) the
+statistics are instead computed in memory by stat_analysis.vectorized.
+"""
+
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+
+from PITC.routers import read_from_replica
+
+from . import stat_utils, vectorized
+
+# (result model, name of the stat_utils function computing its fields)
+REPORT_CALCULATORS = [
+    (stat_utils.job_stats_model, 'compute_job_stats'),
+    (stat_utils.order_stats_model, 'compute_order_stats'),
+    (stat_utils.user_stats_model, 'compute_user_stats'),
+]
+# Breakdowns return one row per provider or account manager rather than a single result.
+BREAKDOWN_CALCULATORS = [
+    (stat_utils.provider_breakdown_model, 'compute_provider_breakdown'),
+    (stat_utils.account_manager_breakdown_model, 'compute_account_manager_breakdown'),
+]
+
+def can_run_in_parallel():
+    # Other connections cannot see rows written inside the current transaction,
+    # and in-memory SQLite databases are private to their connection.
+    if not getattr(settings, 'STAT_ANALYSIS_PARALLEL_REPORTS', True):
+        return False
+    if connection.in_atomic_block:
+        return False
+    return not (connection.vendor == 'sqlite' and connection.is_in_memory_db())
+
+def use_vectorized_backend():
+    return getattr(settings, 'STAT_ANALYSIS_BACKEND', 'rollup') == 'vectorized' and vectorized.is_available()
+
+def _run_in_thread(function, *args):
+    try:
+        return function(*args)
+    finally:
+        # Worker threads open their own connections; do not leak them.
+        connections.close_all()
+
+def compute_report(quarter_from, year_from, quarter_to, year_to, on_progress=None):
+    """Run every calculator for the range.
+
+    Returns a list of (result model, stats) pairs. ``on_progress`` is
+    called with (completed, total) as each calculator finishes.
+    """
+    with read_from_replica():
+        return _compute_report((quarter_from, year_from, quarter_to, year_to), on_progress)
+
+def _compute_report(quarter_range, on_progress):
+    if use_vectorized_backend():
+        results = list(vectorized.compute_report(*quarter_range))
+        results += [getattr(stat_utils, name)(*quarter_range) for _, name in BREAKDOWN_CALCULATORS]
+        if on_progress:
+            on_progress(1, 1)
+        return [(result_model, stats) for (result_model, _), stats in zip(REPORT_CALCULATORS + BREAKDOWN_CALCULATORS, results)]
+
+    calculators = REPORT_CALCULATORS + BREAKDOWN_CALCULATORS
+    functions = [getattr(stat_utils, name) for _, name in calculators]
+    total = len(functions)
+    results = [None] * total
+
+    if can_run_in_parallel():
+        with ThreadPoolExecutor(max_workers=total) as executor:
+            # A context can only be entered by one thread at a time, hence one copy per task.
+            futures = {
+                executor.submit(contextvars.copy_context().run, _run_in_thread, function, *quarter_range): position
+                for position, function in enumerate(functions)
+            }
+            for completed, future in enumerate(as_completed(futures), start=1):
+                results[futures[future]] = future.result()
+                if on_progress:
+                    on_progress(completed, total)
+    else:
+        for position, function in enumerate(functions):
+            results[position] = function(*quarter_range)
+            if on_progress:
+                on_progress(position + 1, total)
+
+    return [(result_model, stats) for (result_model, _), stats in zip(calculators, results)]
+
+def generate_report(quarter_from, year_from, quarter_to, year_to, report=None, on_progress=None):
+    """Compute and store every statistic of a report, creating the report if needed."""
+    if report is None:
+        report = stat_utils.get_or_create_report(quarter_from, year_from, quarter_to, year_to)
+    results = compute_report(quarter_from, year_from, quarter_to, year_to, on_progress=on_progress)
+    with transaction.atomic():
+        breakdown_models = {result_model for result_model, _ in BREAKDOWN_CALCULATORS}
+        for result_model, stats in results:
+            if result_model in breakdown_models:
+                stat_utils.save_report_breakdown(result_model, report, stats)
+            else:
+                stat_utils.save_report_result(result_model, report, stats)
+    return report
@@ -0,0 +1,34 @@
+"""stat_analysis.quarters
+
+Helpers to map timestamps onto calendar quarters.
+
+Quarters are identified by a single integer index, ``year * 4 + quarter - 1``,
+so that consecutive quarters are consecutive integers and a report range
+is simply ``[index_from, index_to]``.
+"""
+
+import datetime
+from django.db.models.functions import ExtractQuarter, ExtractYear
+from django.utils import timezone
+
+def quarter_index(quarter, year):
+    if quarter not in ('Q1', 'Q2', 'Q3', 'Q4'):
+        raise ValueError("Invalid quarter. Please use 'Q1', 'Q2', 'Q3', or 'Q4'.")
+    return int(year) * 4 + int(quarter[1]) - 1
+
+def quarter_index_of(value):
+    if timezone.is_aware(value):
+        value = timezone.localtime(value)
+    return value.year * 4 + (value.month - 1) // 3
+
+def quarter_index_expression(field_name):
+    # Database-side equivalent of quarter_index_of, for grouping by quarter.
+    return ExtractYear(field_name) * 4 + ExtractQuarter(field_name) - 1
+
+def quarter_start(index):
+    year, quarter = divmod(index, 4)
+    return timezone.make_aware(datetime.datetime(year, quarter * 3 + 1, 1))
+
+def quarter_bounds(index_from, index_to):
+    # Half-open [start, end) datetime range covering both quarters inclusively.
+    return quarter_start(index_from), quarter_start(index_to + 1)
@@ -0,0 +1,95 @@
+"""stat_analysis.report_cache
+
+Caches computed report statistics per quarter range.
+
+Entries are never deleted explicitly. Instead each cache key embeds a
+version of the data the statistics depend on, and writes to Job, Order
+and User bump the version of the quarters they touch (see
+stat_analysis.signals). A lookup after a relevant write therefore misses,
+while entries for ranges the write did not touch, e.g. closed quarters,
+stay valid. Stale entries are evicted by the backend's LRU culling.
+
+Versions are kept in the cache (see PITC.cache_versions), one set per
+statistics kind:
+
+- job and order statistics of [a, b] depend on writes in quarters a..b,
+  so there is one version per quarter; a write bumps one of them and a
+  lookup sums those of the range, read with one get_many();
+- user statistics of [a, b] depend on writes in all quarters up to b
+  (total_users counts every user who joined before the range ends), so
+  their versions form a Fenwick tree, and both bumping a quarter and
+  reading the version of a prefix take O(log n) cache operations.
+
+Writes bump the versions in whichever process makes them, so the cache
+must be shared by the web workers and the report worker (a file-based
+cache by default); a process-local LocMemCache alias disables caching.
+Statistics computed from the read replica are returned but not stored,
+since they may predate the current version.
+"""
+
+from django.conf import settings
+
+from PITC import cache_versions
+from PITC.routers import reading_from_replica
+
+# Quarter indices are below 4 * 4096; the user tree needs one node per index.
+TREE_SIZE = 1 << 14
+
+def get_cache():
+    return cache_versions.shared_cache(getattr(settings, 'STAT_ANALYSIS_REPORT_CACHE', None))
+
+def invalidate_all():
+    # The report cache alias is dedicated to report statistics, so it can simply be cleared.
+    cache = get_cache()
+    if cache is not None:
+        cache.clear()
+
+def _version_key(kind, node):
+    return f'stat_reports:version:{kind}:{node}'
+
+def _update_nodes(quarter):
+    node = quarter + 1
+    while node <= TREE_SIZE:
+        yield node
+        node += node & -node
+
+def _prefix_nodes(quarter):
+    node = quarter + 1
+    while node > 0:
+        yield node
+        node -= node & -node
+
+def _version_keys(kind, quarter):
+    nodes = _update_nodes(quarter) if kind == 'user' else [quarter]
+    return [_version_key(kind, node) for node in nodes]
+
+def invalidate(kind, quarters):
+    """Bump the versions of the ``kind`` statistics of ``quarters`` after a write to them."""
+    cache = get_cache()
+    if cache is not None:
+        keys = {key for quarter in set(quarters) for key in _version_keys(kind, quarter)}
+        cache_versions.bump_after_write(cache, keys)
+
+def _sum_versions(cache, kind, nodes):
+    return sum(cache_versions.read(cache, [_version_key(kind, node) for node in nodes]).values())
+
+def range_version(cache, kind, index_from, index_to):
+    if kind == 'user':
+        return _sum_versions(cache, kind, _prefix_nodes(index_to))
+    return _sum_versions(cache, kind, range(index_from, index_to + 1))
+
+def cached_stats(kind, index_from, index_to, compute):
+    cache = get_cache()
+    if cache is None:
+        return compute()
+    # The version is read before computing, so a write that lands while the
+    # statistics are computed invalidates the entry being stored.
+    version = range_version(cache, kind, index_from, index_to)
+    key = f'stat_reports:{kind}:{index_from}:{index_to}:{version}'
+    stats = cache.get(key)
+    if stats is None:
+        stats = compute()
+        # A lagging replica may not have the writes behind the current version yet.
+        if not reading_from_replica():
+            cache.set(key, stats, timeout=None)
+    return stats
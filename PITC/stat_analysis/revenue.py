@@ -0,0 +1,36 @@
+"""stat_analysis.revenue
+
+Revenue of orders, i.e. ``quantity * job.price`` per order.
+
+By default revenue is summed from Order.line_total, the stored product.
+Job.save() keeps it in step with the job price, and Job querysets refuse
+update(price=...), which would bypass that. Rows inserted without save()
+may still have no line total until Order.fill_line_totals() runs; their
+revenue falls back to the job price read by a subquery, which COALESCE
+only evaluates for those rows, so Job is still not joined. With
+``STAT_ANALYSIS_USE_LINE_TOTAL = False`` the product is computed in SQL
+from the joined job price instead.
+"""
+
+from django.conf import settings
+from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from execution.models import Job
+
+def revenue_field():
+    return DecimalField(max_digits=16, decimal_places=2)
+
+def order_revenue(prefix=''):
+    """Expression for the revenue of an order; ``prefix`` is the path from the queried model to Order."""
+    if getattr(settings, 'STAT_ANALYSIS_USE_LINE_TOTAL', True):
+        price = Subquery(Job.objects.filter(pk=OuterRef(f'{prefix}job_id')).values('price')[:1])
+        return Coalesce(
+            F(f'{prefix}line_total'),
+            ExpressionWrapper(F(f'{prefix}quantity') * price, output_field=revenue_field()),
+            output_field=revenue_field(),
+        )
+    return ExpressionWrapper(F(f'{prefix}quantity') * F(f'{prefix}job__price'), output_field=revenue_field())
+
+def revenue_sum(prefix=''):
+    return Sum(order_revenue(prefix), output_field=revenue_field())
@@ -0,0 +1,265 @@
+"""stat_analysis.rollup_utils
+
+Maintenance and querying of the per-quarter rollup tables.
+
+The rollups are updated incrementally by the signal handlers in
+stat_analysis.signals; rebuild_rollups() recomputes them from scratch
+(e.g. after a bulk import or loaddata, which do not send signals).
+"""
+
+from decimal import Decimal
+from django.apps import apps
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.contrib.auth import get_user_model
+from . import report_cache, sketches
+from .quarters import quarter_index_expression, quarter_index_of
+from .revenue import revenue_sum
+
+User = get_user_model()
+Job = apps.get_model('execution', 'Job')
+Order = apps.get_model('execution', 'Order')
+
+job_rollup_model = apps.get_model('stat_analysis', 'JobQuarterRollup')
+order_rollup_model = apps.get_model('stat_analysis', 'OrderQuarterRollup')
+user_rollup_model = apps.get_model('stat_analysis', 'UserQuarterRollup')
+
+def job_rollup_key(starting_date, end_date, job_type, state):
+    return {
+        'start_quarter': quarter_index_of(starting_date),
+        'end_quarter': quarter_index_of(end_date),
+        'job_type': job_type,
+        'state': state,
+    }
+
+def bump_rollup(model, key, **deltas):
+    # Apply deltas with an UPDATE ... SET f = f + delta so that concurrent
+    # writers never lose increments; create the row on first use.
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    expressions = {field: F(field) + delta for field, delta in deltas.items()}
+    if model.objects.filter(**key).update(**expressions):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**key, **deltas)
+    except IntegrityError:
+        model.objects.filter(**key).update(**expressions)
+
+def add_job(starting_date, end_date, job_type, state, completion_time, sign=1):
+    # The sketch is not a number that can be bumped in SQL, so the bucket is
+    # locked, updated and written back in one UPDATE, counters included.
+    key = job_rollup_key(starting_date, end_date, job_type, state)
+    with transaction.atomic(savepoint=False):
+        rollup = job_rollup_model.objects.select_for_update().filter(**key).first()
+        if rollup is None:
+            try:
+                with transaction.atomic():
+                    job_rollup_model.objects.create(
+                        **key, job_count=sign, completion_time_sum=sign * completion_time,
+                        completion_time_sketch=sketches.add(sketches.empty(), completion_time, sign),
+                    )
+                return
+            except IntegrityError:
+                rollup = job_rollup_model.objects.select_for_update().get(**key)
+        rollup.job_count += sign
+        rollup.completion_time_sum += sign * completion_time
+        sketches.add(rollup.completion_time_sketch, completion_time, sign)
+        rollup.save(update_fields=['job_count', 'completion_time_sum', 'completion_time_sketch'])
+
+def add_orders(created_at, count, revenue):
+    bump_rollup(
+        order_rollup_model,
+        {'quarter': quarter_index_of(created_at)},
+        order_count=count,
+        revenue_sum=revenue,
+    )
+
+def add_order_batch(orders):
+    prices = dict(Job.objects.filter(pk__in={order.job_id for order in orders}).values_list('pk', 'price'))
+    totals = {}
+    for order in orders:
+        quarter = quarter_index_of(order.created_at)
+        count, revenue = totals.get(quarter, (0, Decimal('0')))
+        totals[quarter] = (count + 1, revenue + order.quantity * prices[order.job_id])
+    for quarter, (count, revenue) in totals.items():
+        bump_rollup(order_rollup_model, {'quarter': quarter}, order_count=count, revenue_sum=revenue)
+    return list(totals)
+
+def add_users(date_joined, count):
+    bump_rollup(user_rollup_model, {'quarter': quarter_index_of(date_joined)}, user_count=count)
+
+def add_user_batch(users):
+    totals = {}
+    for user in users:
+        quarter = quarter_index_of(user.date_joined)
+        totals[quarter] = totals.get(quarter, 0) + 1
+    for quarter, count in totals.items():
+        bump_rollup(user_rollup_model, {'quarter': quarter}, user_count=count)
+    return list(totals)
+
+def reprice_job_orders(price_deltas):
+    # A job's price is part of the revenue of every order placed for it, once per unit ordered.
+    # price_deltas maps job pks to their new price minus their old one.
+    orders_by_quarter = (
+        Order.objects.filter(job_id__in=price_deltas)
+        .annotate(quarter=quarter_index_expression('created_at'))
+        .values('quarter', 'job_id')
+        .annotate(quantity=Sum('quantity'))
+        .order_by()
+    )
+    revenue_deltas = {}
+    for row in orders_by_quarter:
+        revenue_deltas[row['quarter']] = revenue_deltas.get(row['quarter'], 0) + row['quantity'] * price_deltas[row['job_id']]
+    for quarter, revenue_delta in revenue_deltas.items():
+        bump_rollup(order_rollup_model, {'quarter': quarter}, revenue_sum=revenue_delta)
+    return list(revenue_deltas)
+
+def job_quarter_groups(jobs=None):
+    # One grouped pass over Job, yielding rows shaped like JobQuarterRollup.
+    jobs = Job.objects.all() if jobs is None else jobs
+    return (
+        jobs.annotate(
+            start_quarter=quarter_index_expression('starting_date'),
+            end_quarter=quarter_index_expression('end_date'),
+        )
+        .values('start_quarter', 'end_quarter', 'job_type', 'state')
+        .annotate(job_count=Count('pk'), completion_time_sum=Sum('completion_time'))
+        .order_by()
+    )
+
+def job_quarter_sketches(jobs=None):
+    # Streams the jobs once, returning {(start_quarter, end_quarter, job_type, state): sketch}.
+    jobs = Job.objects.all() if jobs is None else jobs
+    result = {}
+    rows = jobs.values_list('starting_date', 'end_date', 'job_type', 'state', 'completion_time').iterator(chunk_size=5000)
+    for starting_date, end_date, job_type, state, completion_time in rows:
+        key = (quarter_index_of(starting_date), quarter_index_of(end_date), job_type, state)
+        sketches.add(result.setdefault(key, sketches.empty()), completion_time)
+    return result
+
+def order_quarter_groups(orders=None):
+    orders = Order.objects.all() if orders is None else orders
+    return (
+        orders.annotate(quarter=quarter_index_expression('created_at'))
+        .values('quarter')
+        .annotate(order_count=Count('pk'), revenue_sum=revenue_sum())
+        .order_by()
+    )
+
+def user_quarter_groups(users=None):
+    users = User.objects.all() if users is None else users
+    return (
+        users.annotate(quarter=quarter_index_expression('date_joined'))
+        .values('quarter')
+        .annotate(user_count=Count('pk'))
+        .order_by()
+    )
+
+def rebuild_rollups():
+    with transaction.atomic():
+        # Orders inserted without Order.save() may lack the line total revenue is summed from.
+        Order.fill_line_totals()
+        job_rollup_model.objects.all().delete()
+        order_rollup_model.objects.all().delete()
+        user_rollup_model.objects.all().delete()
+
+        job_sketches = job_quarter_sketches()
+        job_rollup_model.objects.bulk_create(
+            job_rollup_model(
+                **row,
+                completion_time_sketch=job_sketches.get(
+                    (row['start_quarter'], row['end_quarter'], row['job_type'], row['state']), sketches.empty(),
+                ),
+            )
+            for row in job_quarter_groups()
+        )
+        order_rollup_model.objects.bulk_create(order_rollup_model(**row) for row in order_quarter_groups())
+        user_rollup_model.objects.bulk_create(user_rollup_model(**row) for row in user_quarter_groups())
+        transaction.on_commit(report_cache.invalidate_all)
+    report_cache.invalidate_all()
+
+def _job_stats(totals):
+    return {
+        'total_jobs': totals['total_jobs'] or 0,
+        'avg_completion_time_regular': (totals['regular_time'] or 0) / totals['regular_count'] if totals['regular_count'] else 0,
+        'avg_completion_time_wafer_run': (totals['wafer_run_time'] or 0) / totals['wafer_run_count'] if totals['wafer_run_count'] else 0,
+        'jobs_created': totals['jobs_created'] or 0,
+        'jobs_active': totals['jobs_active'] or 0,
+        'jobs_completed': totals['jobs_completed'] or 0,
+    }
+
+def rollup_job_stats(index_from, index_to):
+    return _job_stats(job_rollup_model.objects.filter(start_quarter__gte=index_from, end_quarter__lte=index_to).aggregate(
+        total_jobs=Sum('job_count'),
+        regular_count=Sum('job_count', filter=Q(job_type='regular')),
+        regular_time=Sum('completion_time_sum', filter=Q(job_type='regular')),
+        wafer_run_count=Sum('job_count', filter=Q(job_type='wafer_run')),
+        wafer_run_time=Sum('completion_time_sum', filter=Q(job_type='wafer_run')),
+        jobs_created=Sum('job_count', filter=Q(state='created')),
+        jobs_active=Sum('job_count', filter=Q(state='active')),
+        jobs_completed=Sum('job_count', filter=Q(state='completed')),
+    ))
+
+def completion_time_distribution(rows):
+    """Percentile and histogram fields of JobReportResult from (job_type, sketch) pairs."""
+    merged = {'regular': sketches.empty(), 'wafer_run': sketches.empty()}
+    for job_type, sketch in rows:
+        if job_type in merged:
+            sketches.merge_into(merged[job_type], sketch)
+    stats = {}
+    for job_type, sketch in merged.items():
+        for percentile in (50, 90, 99):
+            stats[f'completion_time_p{percentile}_{job_type}'] = sketches.quantile(sketch, percentile / 100)
+    stats['completion_time_histogram'] = {
+        'edges': list(sketches.HISTOGRAM_EDGES),
+        **{job_type: sketches.histogram(sketch) for job_type, sketch in merged.items()},
+    }
+    return stats
+
+def rollup_completion_time_distribution(index_from, index_to):
+    rows = job_rollup_model.objects.filter(start_quarter__gte=index_from, end_quarter__lte=index_to).values_list(
+        'job_type', 'completion_time_sketch',
+    )
+    return completion_time_distribution(rows)
+
+def rollup_job_report(index_from, index_to):
+    """rollup_job_stats() and rollup_completion_time_distribution() from one read of the buckets."""
+    rows = job_rollup_model.objects.filter(start_quarter__gte=index_from, end_quarter__lte=index_to).values_list(
+        'job_type', 'state', 'job_count', 'completion_time_sum', 'completion_time_sketch',
+    )
+    totals = dict.fromkeys(('total_jobs', 'regular_count', 'regular_time', 'wafer_run_count', 'wafer_run_time', 'jobs_created', 'jobs_active', 'jobs_completed'), 0)
+    distribution_rows = []
+    for job_type, state, job_count, completion_time_sum, sketch in rows:
+        totals['total_jobs'] += job_count
+        if job_type in ('regular', 'wafer_run'):
+            totals[f'{job_type}_count'] += job_count
+            totals[f'{job_type}_time'] += completion_time_sum
+        if state in ('created', 'active', 'completed'):
+            totals[f'jobs_{state}'] += job_count
+        distribution_rows.append((job_type, sketch))
+    return {**_job_stats(totals), **completion_time_distribution(distribution_rows)}
+
+def rollup_order_stats(index_from, index_to):
+    stats = order_rollup_model.objects.filter(quarter__gte=index_from, quarter__lte=index_to).aggregate(
+        total_orders=Sum('order_count'),
+        total_revenue=Sum('revenue_sum'),
+    )
+    total_orders = stats['total_orders'] or 0
+    total_revenue = stats['total_revenue'] or Decimal('0')
+    return {
+        'total_orders': total_orders,
+        'total_revenue': total_revenue,
+        'average_order_value': total_revenue / total_orders if total_orders > 0 else 0,
+    }
+
+def rollup_user_stats(index_from, index_to):
+    stats = user_rollup_model.objects.filter(quarter__lte=index_to).aggregate(
+        total_users=Sum('user_count'),
+        new_users=Sum('user_count', filter=Q(quarter__gte=index_from)),
+    )
+    return {
+        'total_users': stats['total_users'] or 0,
+        'new_users': stats['new_users'] or 0,
+    }
@@ -0,0 +1,26 @@
+from rest_framework import serializers
+from .models import Report, ProviderReportResult, AccountManagerReportResult
+from .quarters import quarter_index
+
+class ReportSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Report
+        fields = ['id', 'title', 'created_at', 'quarter_from', 'year_from', 'quarter_to', 'year_to',
+                  'status', 'progress', 'error', 'started_at', 'finished_at']
+        read_only_fields = ['status', 'progress', 'error', 'started_at', 'finished_at']
+
+    def validate(self, data):
+        index_from = quarter_index(data['quarter_from'], data['year_from'])
+        if index_from > quarter_index(data['quarter_to'], data['year_to']):
+            raise serializers.ValidationError("The report must start at or before the quarter it ends in.")
+        return data
+
+class ProviderReportResultSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ProviderReportResult
+        fields = ['service_provider', 'total_jobs', 'avg_completion_time', 'total_orders', 'total_revenue']
+
+class AccountManagerReportResultSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = AccountManagerReportResult
+        fields = ['account_manager', 'total_orders', 'total_revenue', 'avg_completion_time']
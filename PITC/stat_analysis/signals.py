@@ -0,0 +1,151 @@
+"""stat_analysis.signals
+
+Keeps the quarterly rollups in step with writes to Job, Order and User,
+and invalidates the cached report statistics of the quarters they touch.
+
+pre_save snapshots the stored row of an existing instance so that
+post_save can move its contribution from the old bucket to the new one.
+Bulk inserts and bulk price updates are covered by the batch signals of
+execution.signals.
+Raw saves (fixture loading) are ignored; run ``manage.py rebuild_rollups``
+afterwards.
+
+The rollups are written in the transaction of the change: post_save
+handlers open one (Job.save() and Order.save() already run in one, with
+the row), deletes run in the transaction of the deletion collector, and
+the batch signals are sent inside the transaction of the bulk write. So
+moving a row between buckets (-1 on the old one, +1 on the new one) is
+never seen or left half done.
+"""
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from execution.signals import jobs_repriced, orders_bulk_created, users_bulk_created
+from . import report_cache, rollup_utils
+from .quarters import quarter_index_of
+
+User = get_user_model()
+Job = apps.get_model('execution', 'Job')
+Order = apps.get_model('execution', 'Order')
+
+# The fields that pick a job's bucket or are aggregated in it; price only feeds the order rollups.
+JOB_BUCKET_FIELDS = ('starting_date', 'end_date', 'job_type', 'state', 'completion_time')
+JOB_ROLLUP_FIELDS = (*JOB_BUCKET_FIELDS, 'price')
+ORDER_ROLLUP_FIELDS = ('created_at', 'job', 'quantity')
+USER_ROLLUP_FIELDS = ('date_joined',)
+
+def _is_tracked(fields, update_fields):
+    # Saves restricted to untracked columns (e.g. a last_login bump) cannot move a row between buckets.
+    return update_fields is None or not update_fields.isdisjoint(fields)
+
+def _stored_row(instance, fields, values=None):
+    if instance._state.adding or instance.pk is None:
+        return None
+    return type(instance)._base_manager.filter(pk=instance.pk).values(*(values or fields)).first()
+
+def _job_price(job_id):
+    return Job._base_manager.filter(pk=job_id).values_list('price', flat=True).first() or 0
+
+@receiver(pre_save, sender=Job)
+def snapshot_job(sender, instance, raw=False, update_fields=None, **kwargs):
+    if not raw and _is_tracked(JOB_ROLLUP_FIELDS, update_fields):
+        instance._rollup_previous = _stored_row(instance, JOB_ROLLUP_FIELDS)
+
+@receiver(post_save, sender=Job)
+def rollup_job_saved(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw or not _is_tracked(JOB_ROLLUP_FIELDS, update_fields):
+        return
+    previous = getattr(instance, '_rollup_previous', None)
+    instance._rollup_previous = None
+    if previous is not None and all(previous[field] == getattr(instance, field) for field in JOB_ROLLUP_FIELDS):
+        return
+    with transaction.atomic(savepoint=False):
+        if previous is not None:
+            if previous['price'] != instance.price:
+                repriced = rollup_utils.reprice_job_orders({instance.pk: instance.price - previous['price']})
+                report_cache.invalidate('order', repriced)
+            if all(previous[field] == getattr(instance, field) for field in JOB_BUCKET_FIELDS):
+                # A price change alone leaves the job in its bucket.
+                return
+            rollup_utils.add_job(
+                previous['starting_date'], previous['end_date'], previous['job_type'], previous['state'],
+                previous['completion_time'], sign=-1,
+            )
+            report_cache.invalidate('job', [quarter_index_of(previous['starting_date'])])
+        rollup_utils.add_job(
+            instance.starting_date, instance.end_date, instance.job_type, instance.state, instance.completion_time,
+        )
+        report_cache.invalidate('job', [quarter_index_of(instance.starting_date)])
+
+@receiver(post_delete, sender=Job)
+def rollup_job_deleted(sender, instance, **kwargs):
+    rollup_utils.add_job(
+        instance.starting_date, instance.end_date, instance.job_type, instance.state, instance.completion_time,
+        sign=-1,
+    )
+    report_cache.invalidate('job', [quarter_index_of(instance.starting_date)])
+
+@receiver(jobs_repriced)
+def rollup_jobs_repriced(sender, price_deltas, **kwargs):
+    report_cache.invalidate('order', rollup_utils.reprice_job_orders(price_deltas))
+
+@receiver(pre_save, sender=Order)
+def snapshot_order(sender, instance, raw=False, update_fields=None, **kwargs):
+    if not raw and _is_tracked(ORDER_ROLLUP_FIELDS, update_fields):
+        instance._rollup_previous = _stored_row(instance, ORDER_ROLLUP_FIELDS, ('created_at', 'job_id', 'quantity', 'job__price'))
+
+@receiver(post_save, sender=Order)
+def rollup_order_saved(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw or not _is_tracked(ORDER_ROLLUP_FIELDS, update_fields):
+        return
+    previous = getattr(instance, '_rollup_previous', None)
+    instance._rollup_previous = None
+    if previous is not None and all(previous[field] == getattr(instance, field) for field in ('created_at', 'job_id', 'quantity')):
+        return
+    with transaction.atomic(savepoint=False):
+        if previous is not None:
+            rollup_utils.add_orders(previous['created_at'], -1, -previous['quantity'] * (previous['job__price'] or 0))
+            report_cache.invalidate('order', [quarter_index_of(previous['created_at'])])
+        rollup_utils.add_orders(instance.created_at, 1, instance.quantity * instance.job.price)
+        report_cache.invalidate('order', [quarter_index_of(instance.created_at)])
+
+@receiver(post_delete, sender=Order)
+def rollup_order_deleted(sender, instance, **kwargs):
+    rollup_utils.add_orders(instance.created_at, -1, -instance.quantity * _job_price(instance.job_id))
+    report_cache.invalidate('order', [quarter_index_of(instance.created_at)])
+
+@receiver(orders_bulk_created)
+def rollup_orders_bulk_created(sender, orders, **kwargs):
+    report_cache.invalidate('order', rollup_utils.add_order_batch(orders))
+
+@receiver(pre_save, sender=User)
+def snapshot_user(sender, instance, raw=False, update_fields=None, **kwargs):
+    if not raw and _is_tracked(USER_ROLLUP_FIELDS, update_fields):
+        instance._rollup_previous = _stored_row(instance, USER_ROLLUP_FIELDS)
+
+@receiver(post_save, sender=User)
+def rollup_user_saved(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw or not _is_tracked(USER_ROLLUP_FIELDS, update_fields):
+        return
+    previous = getattr(instance, '_rollup_previous', None)
+    instance._rollup_previous = None
+    if previous is not None and previous['date_joined'] == instance.date_joined:
+        return
+    with transaction.atomic(savepoint=False):
+        if previous is not None:
+            rollup_utils.add_users(previous['date_joined'], -1)
+            report_cache.invalidate('user', [quarter_index_of(previous['date_joined'])])
+        rollup_utils.add_users(instance.date_joined, 1)
+        report_cache.invalidate('user', [quarter_index_of(instance.date_joined)])
+
+@receiver(post_delete, sender=User)
+def rollup_user_deleted(sender, instance, **kwargs):
+    rollup_utils.add_users(instance.date_joined, -1)
+    report_cache.invalidate('user', [quarter_index_of(instance.date_joined)])
+
+@receiver(users_bulk_created)
+def rollup_users_bulk_created(sender, users, **kwargs):
+    report_cache.invalidate('user', rollup_utils.add_user_batch(users))
@@ -0,0 +1,106 @@
+"""stat_analysis.sketches
+
+Mergeable quantile sketches of Job.completion_time.
+
+A sketch (in the style of DDSketch) counts values in logarithmic buckets:
+bucket ``i`` holds the values in (GAMMA ** (i - 1), GAMMA ** i], so
+every quantile read from it is within RELATIVE_ACCURACY of the exact
+value. Sketches are plain JSON-serialisable dicts,
+``{'zero': <count of values <= MIN_VALUE>, 'buckets': {'<i>': <count>}}``.
+
+Because a sketch is just a vector of counts, merging adds counts and
+removing a value subtracts one from its bucket. This lets each
+JobQuarterRollup row carry the sketch of its jobs, lets the signal
+handlers keep that sketch up to date as jobs change, and lets a report
+over many quarters merge the stored sketches without reading the jobs
+again.
+"""
+
+import math
+
+RELATIVE_ACCURACY = 0.01
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+LOG_GAMMA = math.log(GAMMA)
+# Completion times are in days; anything shorter than this is counted as zero.
+MIN_VALUE = 1e-6
+
+# Upper edges, in days, of the completion time histogram buckets stored in reports.
+HISTOGRAM_EDGES = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+def empty():
+    return {'zero': 0, 'buckets': {}}
+
+def bucket_of(value):
+    return math.ceil(math.log(value) / LOG_GAMMA)
+
+def bucket_value(index):
+    # Value whose relative distance to both bucket bounds is RELATIVE_ACCURACY.
+    return 2 * GAMMA ** index / (GAMMA + 1)
+
+def add(sketch, value, count=1):
+    """Add ``count`` occurrences of ``value`` to ``sketch`` in place; a negative count removes them."""
+    sketch.setdefault('zero', 0)
+    buckets = sketch.setdefault('buckets', {})
+    if value <= MIN_VALUE:
+        sketch['zero'] += count
+        return sketch
+    key = str(bucket_of(value))
+    total = buckets.get(key, 0) + count
+    if total:
+        buckets[key] = total
+    else:
+        buckets.pop(key, None)
+    return sketch
+
+def merge_into(sketch, other):
+    sketch['zero'] = sketch.get('zero', 0) + other.get('zero', 0)
+    buckets = sketch.setdefault('buckets', {})
+    for key, count in other.get('buckets', {}).items():
+        total = buckets.get(key, 0) + count
+        if total:
+            buckets[key] = total
+        else:
+            buckets.pop(key, None)
+    return sketch
+
+def merge(*sketches):
+    merged = empty()
+    for sketch in sketches:
+        merge_into(merged, sketch)
+    return merged
+
+def count(sketch):
+    return sketch.get('zero', 0) + sum(sketch.get('buckets', {}).values())
+
+def _sorted_buckets(sketch):
+    return sorted((int(key), count) for key, count in sketch.get('buckets', {}).items())
+
+def quantile(sketch, q):
+    """Return the approximate ``q`` quantile (0 <= q <= 1), or None for an empty sketch."""
+    total = count(sketch)
+    if total <= 0:
+        return None
+    rank = q * (total - 1)
+    seen = sketch.get('zero', 0)
+    if seen > rank:
+        return 0.0
+    for index, bucket_count in _sorted_buckets(sketch):
+        seen += bucket_count
+        if seen > rank:
+            return bucket_value(index)
+    return bucket_value(_sorted_buckets(sketch)[-1][0])
+
+def histogram(sketch, edges=HISTOGRAM_EDGES):
+    """Return counts of values in (-inf, edges[0]], (edges[0], edges[1]], ..., (edges[-1], inf).
+
+    A sketch bucket is counted in the first histogram bucket it overlaps,
+    so values on an edge (typically whole days) land on the right side of
+    it, and values less than RELATIVE_ACCURACY above an edge may not.
+    """
+    counts = [0] * (len(edges) + 1)
+    counts[0] = sketch.get('zero', 0)
+    for index, bucket_count in _sorted_buckets(sketch):
+        lower = GAMMA ** (index - 1)
+        position = next((i for i, edge in enumerate(edges) if lower < edge), len(edges))
+        counts[position] += bucket_count
+    return counts
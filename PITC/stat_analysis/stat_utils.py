@@ -1,9 +1,14 @@
 import datetime
+from decimal import Decimal
 from django.apps import apps
-from django.db.models import Avg, Count, Sum
+from django.db import transaction
+from django.db.models import Avg, Count, F, Q, Sum
 from execution.models import Job
 from django.contrib.auth import get_user_model
 from django.utils import timezone
+from . import report_cache, rollup_utils
+from .quarters import quarter_bounds, quarter_index
+from .revenue import revenue_sum
 
 User = get_user_model()
 Order = apps.get_model('execution', 'Order')
@@ -12,75 +17,136 @@ job_stats_model = apps.get_model("stat_analysis", "JobReportResult")
 order_stats_model = apps.get_model("stat_analysis", "OrderReportResult")
 user_stats_model = apps.get_model("stat_analysis", "UserReportResult")
 report_model = apps.get_model("stat_analysis", "Report")
+provider_breakdown_model = apps.get_model("stat_analysis", "ProviderReportResult")
+account_manager_breakdown_model = apps.get_model("stat_analysis", "AccountManagerReportResult")
 
-def calculate_job_stats(quarter_from, year_from, quarter_to, year_to):
-    start_date, end_date = get_date_range(quarter_from, year_from, quarter_to, year_to)
-
-    jobs = Job.objects.filter(starting_date__gte=start_date, end_date__lte=end_date)
-    total_jobs = jobs.count()
-    
-    avg_completion_time_regular = jobs.filter(job_type='regular').aggregate(Avg('completion_time'))['completion_time__avg'] or 0
-    avg_completion_time_wafer_run = jobs.filter(job_type='wafer_run').aggregate(Avg('completion_time'))['completion_time__avg'] or 0
-    
-    jobs_by_status = jobs.values('state').annotate(count=Count('state'))
-    jobs_created = next((item['count'] for item in jobs_by_status if item['state'] == 'created'), 0)
-    jobs_active = next((item['count'] for item in jobs_by_status if item['state'] == 'active'), 0)
-    jobs_completed = next((item['count'] for item in jobs_by_status if item['state'] == 'completed'), 0)
+# The calculators read the quarterly rollups (see rollup_utils), so their cost
+# depends on the number of quarters in the range rather than on table sizes,
+# and their results are cached until the data of the range changes (see report_cache).
+# The aggregate_* functions compute the same metrics from the raw tables.
 
+def calculate_job_stats(quarter_from, year_from, quarter_to, year_to):
+    stats = compute_job_stats(quarter_from, year_from, quarter_to, year_to)
     report = get_or_create_report(quarter_from, year_from, quarter_to, year_to)
-
-    job_stats, _ = job_stats_model.objects.update_or_create(
-        report=report,
-        defaults={
-            'total_jobs': total_jobs,
-            'avg_completion_time_regular': avg_completion_time_regular,
-            'avg_completion_time_wafer_run': avg_completion_time_wafer_run,
-            'jobs_created': jobs_created,
-            'jobs_active': jobs_active,
-            'jobs_completed': jobs_completed
-        }
-    )
-
-    return job_stats
+    return save_report_result(job_stats_model, report, stats)
 
 def calculate_order_stats(quarter_from, year_from, quarter_to, year_to):
-    start_date, end_date = get_date_range(quarter_from, year_from, quarter_to, year_to)
-
-    orders = Order.objects.filter(created_at__gte=start_date, created_at__lte=end_date)
-    total_orders = orders.count()
-    total_revenue = orders.aggregate(Sum('job__price'))['job__price__sum'] or 0
-    average_order_value = total_revenue / total_orders if total_orders > 0 else 0
-
+    stats = compute_order_stats(quarter_from, year_from, quarter_to, year_to)
     report = get_or_create_report(quarter_from, year_from, quarter_to, year_to)
-
-    order_stats, _ = order_stats_model.objects.update_or_create(
-        report=report,
-        defaults={
-            'total_orders': total_orders,
-            'total_revenue': total_revenue,
-            'average_order_value': average_order_value
-        }
-    )
-
-    return order_stats
+    return save_report_result(order_stats_model, report, stats)
 
 def calculate_user_stats(quarter_from, year_from, quarter_to, year_to):
-    start_date, end_date = get_date_range(quarter_from, year_from, quarter_to, year_to)
-
-    total_users = User.objects.filter(date_joined__lte=end_date).count()
-    new_users = User.objects.filter(date_joined__gte=start_date, date_joined__lte=end_date).count()
-
+    stats = compute_user_stats(quarter_from, year_from, quarter_to, year_to)
     report = get_or_create_report(quarter_from, year_from, quarter_to, year_to)
-
-    user_stats, _ = user_stats_model.objects.update_or_create(
-        report=report,
-        defaults={
-            'total_users': total_users,
-            'new_users': new_users
-        }
+    return save_report_result(user_stats_model, report, stats)
+
+def compute_job_stats(quarter_from, year_from, quarter_to, year_to):
+    index_from, index_to = get_quarter_range(quarter_from, year_from, quarter_to, year_to)
+    return report_cache.cached_stats('job', index_from, index_to, lambda: rollup_utils.rollup_job_report(index_from, index_to))
+
+def compute_order_stats(quarter_from, year_from, quarter_to, year_to):
+    index_from, index_to = get_quarter_range(quarter_from, year_from, quarter_to, year_to)
+    return report_cache.cached_stats('order', index_from, index_to, lambda: rollup_utils.rollup_order_stats(index_from, index_to))
+
+def compute_user_stats(quarter_from, year_from, quarter_to, year_to):
+    index_from, index_to = get_quarter_range(quarter_from, year_from, quarter_to, year_to)
+    return report_cache.cached_stats('user', index_from, index_to, lambda: rollup_utils.rollup_user_stats(index_from, index_to))
+
+def save_report_result(result_model, report, stats):
+    result, _ = result_model.objects.update_or_create(report=report, defaults=stats)
+    return result
+
+def save_report_breakdown(result_model, report, rows):
+    # A breakdown is replaced as a whole: providers or managers absent from the new rows had no activity.
+    with transaction.atomic():
+        result_model.objects.filter(report=report).delete()
+        return result_model.objects.bulk_create(result_model(report=report, **row) for row in rows)
+
+def top_report_breakdown(result_model, report, n=10, order_by='-total_revenue'):
+    return result_model.objects.filter(report=report).order_by(order_by, 'pk')[:n]
+
+# The breakdowns group the raw tables once per dimension. With ``top`` the
+# ranking and limit happen in SQL, and only the selected providers' jobs
+# are aggregated, so the result size and cost do not grow with the number
+# of providers.
+
+def compute_provider_breakdown(quarter_from, year_from, quarter_to, year_to, top=None):
+    start_date, end_date = get_datetime_range(quarter_from, year_from, quarter_to, year_to)
+    orders = (
+        Order.objects.filter(created_at__gte=start_date, created_at__lt=end_date)
+        .values(service_provider_id=F('job__service_provider'))
+        .annotate(total_orders=Count('pk'), total_revenue=revenue_sum())
+        .order_by('-total_revenue', 'service_provider_id')
+    )
+    jobs = (
+        Job.objects.filter(starting_date__gte=start_date, end_date__lt=end_date)
+        .values('service_provider_id')
+        .annotate(total_jobs=Count('pk'), avg_completion_time=Avg('completion_time'))
+        .order_by()
+    )
+    if top is not None:
+        orders = orders[:top]
+        jobs = jobs.filter(service_provider_id__in=[row['service_provider_id'] for row in orders])
+
+    rows = {}
+    for row in orders:
+        rows[row['service_provider_id']] = {**row, 'total_jobs': 0, 'avg_completion_time': 0}
+    for row in jobs:
+        rows.setdefault(row['service_provider_id'], {
+            'service_provider_id': row['service_provider_id'], 'total_orders': 0, 'total_revenue': Decimal('0'),
+        }).update(total_jobs=row['total_jobs'], avg_completion_time=row['avg_completion_time'] or 0)
+    return list(rows.values())
+
+def compute_account_manager_breakdown(quarter_from, year_from, quarter_to, year_to, top=None):
+    start_date, end_date = get_datetime_range(quarter_from, year_from, quarter_to, year_to)
+    orders = (
+        Order.objects.filter(created_at__gte=start_date, created_at__lt=end_date, account_manager__isnull=False)
+        .values('account_manager_id')
+        .annotate(
+            total_orders=Count('pk'),
+            total_revenue=revenue_sum(),
+            avg_completion_time=Avg('job__completion_time'),
+        )
+        .order_by('-total_revenue', 'account_manager_id')
+    )
+    if top is not None:
+        orders = orders[:top]
+    return [{**row, 'avg_completion_time': row['avg_completion_time'] or 0} for row in orders]
+
+def aggregate_job_stats(start_date, end_date):
+    # Every job metric comes out of a single scan of the range: the per-type
+    # averages and per-state counts are conditional aggregates over the same rows.
+    # Only columns of job_date_range_idx are referenced, so the scan is index-only.
+    stats = Job.objects.filter(starting_date__gte=start_date, end_date__lt=end_date).aggregate(
+        total_jobs=Count('state'),
+        avg_completion_time_regular=Avg('completion_time', filter=Q(job_type='regular')),
+        avg_completion_time_wafer_run=Avg('completion_time', filter=Q(job_type='wafer_run')),
+        jobs_created=Count('state', filter=Q(state='created')),
+        jobs_active=Count('state', filter=Q(state='active')),
+        jobs_completed=Count('state', filter=Q(state='completed')),
+    )
+    stats['avg_completion_time_regular'] = stats['avg_completion_time_regular'] or 0
+    stats['avg_completion_time_wafer_run'] = stats['avg_completion_time_wafer_run'] or 0
+    return stats
+
+def aggregate_order_stats(start_date, end_date):
+    orders = Order.objects.filter(created_at__gte=start_date, created_at__lt=end_date)
+    # Count and revenue come out of one scan of order_created_at_idx; the
+    # average is derived from them rather than by a second Avg aggregate.
+    stats = orders.aggregate(total_orders=Count('job'), total_revenue=revenue_sum())
+    total_orders = stats['total_orders']
+    total_revenue = stats['total_revenue'] or Decimal('0')
+    return {
+        'total_orders': total_orders,
+        'total_revenue': total_revenue,
+        'average_order_value': total_revenue / total_orders if total_orders > 0 else 0,
+    }
+
+def aggregate_user_stats(start_date, end_date):
+    return User.objects.filter(date_joined__lt=end_date).aggregate(
+        total_users=Count('pk'),
+        new_users=Count('pk', filter=Q(date_joined__gte=start_date)),
     )
-
-    return user_stats
 
 def get_or_create_report(quarter_from, year_from, quarter_to, year_to):
     # Use timezone.now() for timezone-aware datetime
@@ -92,9 +158,19 @@ def get_or_create_report(quarter_from, year_from, quarter_to, year_to):
         defaults={
             'title': f'Report {year_from}Q{quarter_from} - {year_to}Q{quarter_to}',
             'created_at': timezone.now(),  # Ensure timezone-aware datetime
+            # Computed by the caller, so the report worker must not pick it up.
+            'status': report_model.STATUS_DONE,
+            'progress': 100,
         }
     )[0]
 
+def get_quarter_range(quarter_from, year_from, quarter_to, year_to):
+    return quarter_index(quarter_from, year_from), quarter_index(quarter_to, year_to)
+
+def get_datetime_range(quarter_from, year_from, quarter_to, year_to):
+    # Half-open [start, end) range of aware datetimes, so that the whole last day is included.
+    return quarter_bounds(*get_quarter_range(quarter_from, year_from, quarter_to, year_to))
+
 def get_date_range(quarter_from, year_from, quarter_to, year_to):
     start_date_from, _ = get_quarter_dates(quarter_from, year_from)
     _, end_date_to = get_quarter_dates(quarter_to, year_to)
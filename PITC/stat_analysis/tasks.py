@@ -0,0 +1,98 @@
+"""stat_analysis.tasks
+
+Background computation of reports.
+
+The Report table doubles as the job queue, so no message broker is
+needed: a report is queued by setting its status, and workers
+(``manage.py run_report_worker``) claim queued reports with a conditional
+UPDATE, which only one worker can win, before computing them.
+"""
+
+import logging
+import time
+from datetime import timedelta
+
+from django.apps import apps
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+report_model = apps.get_model('stat_analysis', 'Report')
+
+def enqueue_report(report):
+    report.status = report_model.STATUS_QUEUED
+    report.progress = 0
+    report.error = ''
+    report.started_at = None
+    report.finished_at = None
+    report.save(update_fields=['status', 'progress', 'error', 'started_at', 'finished_at'])
+
+def claim_next_report():
+    queued = report_model.objects.filter(status=report_model.STATUS_QUEUED).order_by('created_at', 'pk')
+    for report_id in queued.values_list('pk', flat=True)[:10]:
+        claimed = report_model.objects.filter(pk=report_id, status=report_model.STATUS_QUEUED).update(
+            status=report_model.STATUS_RUNNING, progress=0, started_at=timezone.now(),
+        )
+        if claimed:
+            return report_model.objects.get(pk=report_id)
+    return None
+
+def requeue_stale_reports(stale_after):
+    # Reports left running by a worker that died are picked up again.
+    return report_model.objects.filter(
+        status=report_model.STATUS_RUNNING, started_at__lt=timezone.now() - stale_after,
+    ).update(status=report_model.STATUS_QUEUED, progress=0)
+
+def _this_run(report):
+    # The report as claimed by this run: requeued, reclaimed or deleted reports no longer match.
+    return report_model.objects.filter(pk=report.pk, status=report_model.STATUS_RUNNING, started_at=report.started_at)
+
+def _set_progress(report, progress):
+    report.progress = progress
+    _this_run(report).update(progress=progress)
+
+def run_report(report):
+    from .orchestrator import generate_report
+
+    def on_progress(completed, total):
+        # Storing the results is the last step, so stop short of 100 here.
+        _set_progress(report, 100 * completed // (total + 1))
+
+    try:
+        generate_report(
+            report.quarter_from, report.year_from, report.quarter_to, report.year_to,
+            report=report, on_progress=on_progress,
+        )
+    except Exception as exc:
+        # The traceback goes to the log only: error is shown to API clients.
+        logger.exception("Report %s failed", report.pk)
+        report.status = report_model.STATUS_FAILED
+        report.error = f"{type(exc).__name__}: {exc}"
+    else:
+        report.status = report_model.STATUS_DONE
+        report.progress = 100
+    report.finished_at = timezone.now()
+    finished = _this_run(report).update(
+        status=report.status, progress=report.progress, error=report.error, finished_at=report.finished_at,
+    )
+    if not finished:
+        logger.info("Report %s was requeued or deleted while it was computed; its status is left as is", report.pk)
+    return report
+
+def run_worker(poll_interval=2.0, once=False, stale_after=timedelta(hours=1)):
+    """Process queued reports until interrupted.
+
+    With ``once`` the worker drains the queue and returns the number of
+    reports processed instead of waiting for new ones.
+    """
+    processed = 0
+    requeue_stale_reports(stale_after)
+    while True:
+        report = claim_next_report()
+        if report is not None:
+            run_report(report)
+            processed += 1
+            continue
+        if once:
+            return processed
+        time.sleep(poll_interval)
@@ -1,11 +1,41 @@
-from django.test import TestCase
+import itertools
+import random
+import threading
+import unittest
+from unittest import mock
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
 from django.utils import timezone
 from django.apps import apps
 from django.contrib.auth import get_user_model
 from datetime import timedelta
+from decimal import Decimal
 from execution.models import Job, ServiceProvider, Order, AccountManager
 from stat_analysis.models import Report, JobReportResult, OrderReportResult, UserReportResult
-from stat_analysis.stat_utils import calculate_job_stats, calculate_order_stats, calculate_user_stats
+from stat_analysis.models import JobQuarterRollup, OrderQuarterRollup, UserQuarterRollup
+from stat_analysis.models import ProviderReportResult, AccountManagerReportResult
+from stat_analysis.stat_utils import (
+    calculate_job_stats, calculate_order_stats, calculate_user_stats,
+    aggregate_job_stats, aggregate_order_stats, aggregate_user_stats, get_datetime_range, get_quarter_range,
+)
+from stat_analysis.rollup_utils import rebuild_rollups, rollup_job_stats, rollup_order_stats, rollup_user_stats
+from stat_analysis.rollup_utils import rollup_completion_time_distribution
+from stat_analysis.quarters import quarter_index, quarter_start
+from stat_analysis.tasks import claim_next_report, enqueue_report, run_report, run_worker
+from stat_analysis.orchestrator import generate_report
+from stat_analysis.batch import calculate_report_batch
+from stat_analysis import report_cache, rollup_utils, sketches, vectorized
+from PITC import cache_versions
+from PITC.routers import read_from_replica
+from PITC.testing import ReplicaTestMixin
+from stat_analysis.stat_utils import compute_job_stats, compute_order_stats, compute_user_stats
+from stat_analysis.stat_utils import compute_provider_breakdown, compute_account_manager_breakdown
 
 User = get_user_model()
 ServiceProvider = apps.get_model('execution', 'ServiceProvider')
@@ -14,6 +44,7 @@ AccountManager = apps.get_model('execution', 'AccountManager')
 
 class StatisticsTestCase(TestCase):
     def setUp(self):
+        caches['stat_reports'].clear()
         # Create users
         self.user = User.objects.create_user(username="testuser", password="testpass", user_type="CUSTOMER")
         self.manager_user = User.objects.create_user(username="manager", password="managerpass", user_type="ACCOUNT_MANAGER")
@@ -54,4 +85,748 @@ class StatisticsTestCase(TestCase):
     def test_user_statistics(self):
         stats = calculate_user_stats(self.quarter, self.year, self.quarter, self.year)
         self.assertEqual(stats.total_users, 2)
-        self.assertEqual(stats.new_users, 2)
\ No newline at end of file
+        self.assertEqual(stats.new_users, 2)
+
+    def test_job_aggregation_is_single_query(self):
+        start_date, end_date = get_datetime_range(self.quarter, self.year, self.quarter, self.year)
+        with self.assertNumQueries(1):
+            stats = aggregate_job_stats(start_date, end_date)
+        self.assertEqual(stats['total_jobs'], 3)
+        self.assertEqual(stats['jobs_created'], 1)
+        self.assertAlmostEqual(stats['avg_completion_time_regular'], 6, places=2)
+
+    def test_job_aggregation_empty_range(self):
+        start_date, end_date = get_datetime_range('Q1', self.year - 10, 'Q4', self.year - 10)
+        stats = aggregate_job_stats(start_date, end_date)
+        self.assertEqual(stats['total_jobs'], 0)
+        self.assertEqual(stats['avg_completion_time_regular'], 0)
+        self.assertEqual(stats['avg_completion_time_wafer_run'], 0)
+
+
+class QuarterlyRollupTestCase(TestCase):
+    def setUp(self):
+        caches['stat_reports'].clear()
+        self.customer_user = User.objects.create_user(username="customer", password="pass", user_type="CUSTOMER")
+        self.manager_user = User.objects.create_user(username="manager", password="pass", user_type="ACCOUNT_MANAGER")
+        self.service_provider = ServiceProvider.objects.create(name="Provider")
+
+        # Quarter indices for Q1..Q4 of a past year
+        self.year = timezone.now().year - 2
+        self.q1 = quarter_index('Q1', self.year)
+        self.q4 = quarter_index('Q4', self.year)
+
+        self.job_q1 = self.create_job(self.q1, self.q1, 'regular', 'completed', 4, 100)
+        # Spans Q1-Q2: only part of ranges covering both quarters
+        self.job_q1_q2 = self.create_job(self.q1, self.q1 + 1, 'wafer_run', 'active', 30, 300)
+        self.job_q4 = self.create_job(self.q4, self.q4, 'regular', 'created', 8, 50)
+
+    def create_job(self, start_quarter, end_quarter, job_type, state, completion_time, price):
+        return Job.objects.create(
+            job_name=f"{job_type} {start_quarter}", state=state, job_type=job_type,
+            starting_date=quarter_start(start_quarter) + timedelta(days=1),
+            # Last day of the end quarter
+            end_date=quarter_start(end_quarter + 1) - timedelta(hours=1),
+            completion_time=completion_time, service_provider=self.service_provider, price=price,
+        )
+
+    def create_order(self, job, quarter):
+        order = Order.objects.create(
+            customer=self.customer_user.customer, account_manager=self.manager_user.account_manager, job=job,
+        )
+        order.created_at = quarter_start(quarter) + timedelta(days=2)
+        order.save()
+        return order
+
+    def assertMatchesRawTables(self, index_from, index_to):
+        start_date, end_date = quarter_start(index_from), quarter_start(index_to + 1)
+        self.assertEqual(rollup_job_stats(index_from, index_to), aggregate_job_stats(start_date, end_date))
+        self.assertEqual(rollup_order_stats(index_from, index_to), aggregate_order_stats(start_date, end_date))
+        self.assertEqual(rollup_user_stats(index_from, index_to), aggregate_user_stats(start_date, end_date))
+
+    def test_job_spanning_quarters(self):
+        self.assertEqual(rollup_job_stats(self.q1, self.q1)['total_jobs'], 1)
+        self.assertEqual(rollup_job_stats(self.q1 + 1, self.q4)['total_jobs'], 1)
+        stats = rollup_job_stats(self.q1, self.q4)
+        self.assertEqual(stats['total_jobs'], 3)
+        self.assertAlmostEqual(stats['avg_completion_time_regular'], 6)
+        self.assertAlmostEqual(stats['avg_completion_time_wafer_run'], 30)
+        self.assertMatchesRawTables(self.q1, self.q4)
+
+    def test_job_updates_move_between_buckets(self):
+        self.job_q1.state = 'active'
+        self.job_q1.completion_time = 6
+        self.job_q1.save()
+        self.job_q4.delete()
+
+        stats = rollup_job_stats(self.q1, self.q4)
+        self.assertEqual(stats['jobs_completed'], 0)
+        self.assertEqual(stats['jobs_active'], 2)
+        self.assertEqual(stats['jobs_created'], 0)
+        self.assertAlmostEqual(stats['avg_completion_time_regular'], 6)
+        self.assertMatchesRawTables(self.q1, self.q4)
+
+        # The removed and moved jobs left the sketches too
+        distribution = rollup_completion_time_distribution(self.q1, self.q4)
+        self.assertAlmostEqual(distribution['completion_time_p99_regular'], 6, delta=6 * sketches.RELATIVE_ACCURACY)
+        self.assertAlmostEqual(distribution['completion_time_p50_wafer_run'], 30, delta=30 * sketches.RELATIVE_ACCURACY)
+        self.assertEqual(distribution['completion_time_histogram']['regular'], [0, 0, 0, 1, 0, 0, 0, 0, 0, 0])
+
+    def test_job_bucket_is_updated_in_one_write(self):
+        # Lock and read the bucket, then write its counters and sketch back together
+        with self.assertNumQueries(2):
+            rollup_utils.add_job(self.job_q1.starting_date, self.job_q1.end_date, 'regular', 'completed', 6)
+        stats = rollup_job_stats(self.q1, self.q1)
+        self.assertEqual(stats['total_jobs'], 2)
+        self.assertAlmostEqual(stats['avg_completion_time_regular'], 5)
+
+    def test_job_report_reads_the_buckets_once(self):
+        with self.assertNumQueries(1):
+            report = rollup_utils.rollup_job_report(self.q1, self.q4)
+        expected = {**rollup_job_stats(self.q1, self.q4), **rollup_completion_time_distribution(self.q1, self.q4)}
+        self.assertEqual(report.keys(), expected.keys())
+        for field, value in expected.items():
+            if isinstance(value, float):
+                self.assertAlmostEqual(report[field], value, msg=field)
+            else:
+                self.assertEqual(report[field], value, msg=field)
+
+    def test_order_revenue_follows_job_price(self):
+        self.create_order(self.job_q1, self.q1)
+        self.create_order(self.job_q1, self.q4)
+        order = self.create_order(self.job_q4, self.q4)
+        self.assertEqual(rollup_order_stats(self.q1, self.q4)['total_revenue'], 250)
+
+        self.job_q1.price = 120
+        self.job_q1.save()
+        order.delete()
+
+        stats = rollup_order_stats(self.q1, self.q4)
+        self.assertEqual(stats['total_orders'], 2)
+        self.assertEqual(stats['total_revenue'], 240)
+        self.assertEqual(rollup_order_stats(self.q4, self.q4)['total_revenue'], 120)
+        self.assertMatchesRawTables(self.q1, self.q4)
+
+    def test_price_change_leaves_job_rollups_alone(self):
+        self.create_order(self.job_q1, self.q1)
+        self.job_q1.price = 120
+        with CaptureQueriesContext(connection) as queries:
+            self.job_q1.save()
+        self.assertFalse([query for query in queries if 'stat_analysis_jobquarterrollup' in query['sql']])
+        self.assertEqual(rollup_order_stats(self.q1, self.q1)['total_revenue'], 120)
+        self.assertMatchesRawTables(self.q1, self.q4)
+
+    def test_failed_rollup_update_rolls_back_the_save(self):
+        add_job = rollup_utils.add_job
+        calls = []
+
+        def fail_on_second_call(*args, **kwargs):
+            # Let the job leave its old bucket, then fail before it enters the new one.
+            calls.append(args)
+            if len(calls) > 1:
+                raise RuntimeError
+            return add_job(*args, **kwargs)
+
+        self.job_q1.state = 'active'
+        with mock.patch.object(rollup_utils, 'add_job', fail_on_second_call), self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                self.job_q1.save()
+        self.assertEqual(Job.objects.get(pk=self.job_q1.pk).state, 'completed')
+        self.assertEqual(rollup_job_stats(self.q1, self.q4)['jobs_completed'], 1)
+        self.assertMatchesRawTables(self.q1, self.q4)
+
+    def test_bulk_price_updates_move_revenue(self):
+        order = self.create_order(self.job_q1, self.q1)
+        order.quantity = 2
+        order.save()
+        self.create_order(self.job_q4, self.q4)
+
+        Job.objects.filter(pk=self.job_q1.pk).update(price=120)
+        self.job_q4.price = 70
+        Job.objects.bulk_update([self.job_q4], ['price'])
+        self.assertEqual(rollup_order_stats(self.q1, self.q1)['total_revenue'], 240)
+        self.assertEqual(rollup_order_stats(self.q4, self.q4)['total_revenue'], 70)
+        self.assertMatchesRawTables(self.q1, self.q4)
+
+    def test_revenue_counts_quantity(self):
+        order = self.create_order(self.job_q1, self.q1)
+        order.quantity = 3
+        order.save()
+        self.create_order(self.job_q4, self.q4)
+        self.assertEqual(rollup_order_stats(self.q1, self.q4)['total_revenue'], 350)
+
+        self.job_q1.price = 120
+        self.job_q1.save()
+        self.assertEqual(rollup_order_stats(self.q1, self.q4)['total_revenue'], 410)
+        self.assertMatchesRawTables(self.q1, self.q4)
+
+        # Revenue comes from the stored line totals in one query without joining Job
+        start_date, end_date = quarter_start(self.q1), quarter_start(self.q4 + 1)
+        with CaptureQueriesContext(connection) as queries:
+            stats = aggregate_order_stats(start_date, end_date)
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('JOIN "execution_job"', queries[0]['sql'])
+        with override_settings(STAT_ANALYSIS_USE_LINE_TOTAL=False):
+            self.assertEqual(aggregate_order_stats(start_date, end_date), stats)
+
+        # Orders whose line total is not filled yet count at the job price
+        Order.objects.update(line_total=None)
+        self.assertEqual(aggregate_order_stats(start_date, end_date), stats)
+
+    def test_bulk_created_orders(self):
+        from execution.signals import orders_bulk_created
+
+        orders = Order.objects.bulk_create([
+            Order(customer=self.customer_user.customer, account_manager=self.manager_user.account_manager, job=job)
+            for job in (self.job_q1, self.job_q1, self.job_q4)
+        ])
+        orders_bulk_created.send(sender=Order, orders=orders)
+        quarter = quarter_index(f"Q{(timezone.now().month - 1) // 3 + 1}", timezone.now().year)
+        self.assertEqual(rollup_order_stats(quarter, quarter), {'total_orders': 3, 'total_revenue': 250, 'average_order_value': Decimal('250') / 3})
+
+    def test_user_signups(self):
+        User.objects.filter(pk=self.customer_user.pk).update(date_joined=quarter_start(self.q1))
+        rebuild_rollups()
+        self.manager_user.date_joined = quarter_start(self.q4)
+        self.manager_user.save()
+        # Saves that do not touch date_joined leave the rollups alone
+        self.manager_user.date_joined = quarter_start(self.q1)
+        self.manager_user.save(update_fields=['last_login'])
+
+        self.assertEqual(rollup_user_stats(self.q1, self.q1), {'total_users': 1, 'new_users': 1})
+        self.assertEqual(rollup_user_stats(self.q4, self.q4), {'total_users': 2, 'new_users': 1})
+        self.assertMatchesRawTables(self.q1 + 1, self.q4)
+
+    def test_bulk_created_users(self):
+        from execution.provisioning import bulk_create_users
+
+        bulk_create_users([
+            User(username=f"imported{i}", password="!", user_type="CUSTOMER", date_joined=quarter_start(self.q1 + i % 2))
+            for i in range(5)
+        ])
+        self.assertMatchesRawTables(self.q1, self.q1 + 1)
+        self.assertEqual(rollup_user_stats(self.q1 + 1, self.q1 + 1)['new_users'], 2)
+
+    def test_rebuild_matches_incremental(self):
+        self.create_order(self.job_q1, self.q1)
+        self.create_order(self.job_q4, self.q4)
+
+        def snapshot():
+            return (
+                sorted(JobQuarterRollup.objects.filter(job_count__gt=0).values_list('start_quarter', 'end_quarter', 'job_type', 'state', 'job_count', 'completion_time_sketch')),
+                sorted(OrderQuarterRollup.objects.filter(order_count__gt=0).values_list('quarter', 'order_count', 'revenue_sum')),
+                sorted(UserQuarterRollup.objects.filter(user_count__gt=0).values_list('quarter', 'user_count')),
+            )
+
+        incremental = snapshot()
+        rebuild_rollups()
+        self.assertEqual(snapshot(), incremental)
+
+    def test_report_reads_rollups_only(self):
+        calculate_job_stats('Q1', self.year, 'Q4', self.year)
+        # The statistics of a quarter range are one aggregate query over the rollup table, not over Job
+        with CaptureQueriesContext(connection) as queries:
+            rollup_job_stats(self.q1, self.q4)
+        self.assertEqual(len(queries), 1)
+        self.assertIn(JobQuarterRollup._meta.db_table, queries[0]['sql'])
+        self.assertNotIn(f'"{Job._meta.db_table}"', queries[0]['sql'])
+        stats = calculate_job_stats('Q1', self.year, 'Q4', self.year)
+        self.assertEqual(stats.total_jobs, 3)
+
+
+class ReportQueueTestCase(APITestCase):
+    def setUp(self):
+        caches['stat_reports'].clear()
+        self.service_provider = ServiceProvider.objects.create(name="Provider")
+        self.year = timezone.now().year
+        self.quarter = f"Q{(timezone.now().month - 1) // 3 + 1}"
+        Job.objects.create(job_name="Job", state="completed", job_type="regular", starting_date=timezone.now(), end_date=timezone.now(), completion_time=3, service_provider=self.service_provider, price=100)
+
+    def create_report(self):
+        response = self.client.post(reverse('report-list'), {
+            'title': 'Quarterly', 'quarter_from': self.quarter, 'year_from': self.year,
+            'quarter_to': self.quarter, 'year_to': self.year,
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.data['id']
+
+    def test_report_is_computed_by_worker(self):
+        report_id = self.create_report()
+        response = self.client.get(reverse('report-detail', args=[report_id]))
+        self.assertEqual(response.data['status'], 'queued')
+        self.assertFalse(JobReportResult.objects.filter(report_id=report_id).exists())
+
+        call_command('run_report_worker', '--once', stdout=mock.MagicMock())
+
+        response = self.client.get(reverse('report-detail', args=[report_id]))
+        self.assertEqual(response.data['status'], 'done')
+        self.assertEqual(response.data['progress'], 100)
+        self.assertEqual(JobReportResult.objects.get(report_id=report_id).total_jobs, 1)
+        self.assertTrue(OrderReportResult.objects.filter(report_id=report_id).exists())
+        self.assertTrue(UserReportResult.objects.filter(report_id=report_id).exists())
+
+    def test_report_is_claimed_once(self):
+        self.create_report()
+        self.assertIsNotNone(claim_next_report())
+        self.assertIsNone(claim_next_report())
+
+    def test_failed_report(self):
+        report_id = self.create_report()
+        with mock.patch('stat_analysis.stat_utils.compute_order_stats', side_effect=RuntimeError('boom')):
+            self.assertEqual(run_worker(once=True), 1)
+
+        report = Report.objects.get(pk=report_id)
+        self.assertEqual(report.status, 'failed')
+        # Clients see the error, not the traceback with the server's paths
+        self.assertEqual(report.error, 'RuntimeError: boom')
+        # No partial results are stored
+        self.assertFalse(JobReportResult.objects.filter(report=report).exists())
+
+    def test_report_range_must_not_be_reversed(self):
+        response = self.client.post(reverse('report-list'), {
+            'title': 'Reversed', 'quarter_from': 'Q2', 'year_from': self.year,
+            'quarter_to': 'Q1', 'year_to': self.year,
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Report.objects.exists())
+
+    def test_report_requeued_while_running_stays_queued(self):
+        report_id = self.create_report()
+        report = claim_next_report()
+
+        def requeue(*args, **kwargs):
+            enqueue_report(Report.objects.get(pk=report_id))
+            return {}
+        with mock.patch('stat_analysis.orchestrator.generate_report', side_effect=requeue):
+            run_report(report)
+
+        self.assertEqual(Report.objects.get(pk=report_id).status, 'queued')
+        self.assertIsNotNone(claim_next_report())
+
+    def test_report_deleted_while_running(self):
+        report_id = self.create_report()
+        report = claim_next_report()
+        with mock.patch('stat_analysis.orchestrator.generate_report', side_effect=lambda *args, **kwargs: Report.objects.filter(pk=report_id).delete()):
+            run_report(report)
+        self.assertFalse(Report.objects.filter(pk=report_id).exists())
+
+    def test_synchronously_computed_report_is_not_queued(self):
+        calculate_job_stats(self.quarter, self.year, self.quarter, self.year)
+        self.assertEqual(Report.objects.get().status, 'done')
+        self.assertIsNone(claim_next_report())
+
+
+class ReportOrchestratorTestCase(TestCase):
+    def setUp(self):
+        caches['stat_reports'].clear()
+        self.year = timezone.now().year
+
+    def test_generate_report(self):
+        User.objects.create_user(username="customer", password="pass", user_type="CUSTOMER")
+        report = generate_report('Q1', self.year, 'Q4', self.year)
+        self.assertEqual(report.userreportresult.new_users, 1)
+        self.assertEqual(report.jobreportresult.total_jobs, 0)
+        self.assertEqual(report.orderreportresult.total_orders, 0)
+        self.assertEqual(Report.objects.count(), 1)
+
+    def test_calculators_run_concurrently(self):
+        threads = []
+        # Each calculator waits until all five are running at once; run one after
+        # another, the first wait times out and breaks the barrier.
+        all_running = threading.Barrier(5, timeout=10)
+
+        def fake_calculator(stats):
+            def calculate(*quarter_range):
+                threads.append(threading.get_ident())
+                all_running.wait()
+                return stats
+            return calculate
+
+        calculators = {
+            'compute_job_stats': fake_calculator({'total_jobs': 1, 'avg_completion_time_regular': 0, 'avg_completion_time_wafer_run': 0, 'jobs_created': 1, 'jobs_active': 0, 'jobs_completed': 0}),
+            'compute_order_stats': fake_calculator({'total_orders': 2, 'total_revenue': 10, 'average_order_value': 5}),
+            'compute_user_stats': fake_calculator({'total_users': 3, 'new_users': 3}),
+            'compute_provider_breakdown': fake_calculator([]),
+            'compute_account_manager_breakdown': fake_calculator([]),
+        }
+        progress = []
+        with mock.patch.multiple('stat_analysis.stat_utils', **calculators), \
+                mock.patch('stat_analysis.orchestrator.can_run_in_parallel', return_value=True):
+            report = generate_report('Q1', self.year, 'Q4', self.year, on_progress=lambda *args: progress.append(args))
+
+        self.assertEqual(len(set(threads)), 5)
+        self.assertNotIn(threading.get_ident(), threads)
+        self.assertFalse(all_running.broken)
+        self.assertEqual(progress, [(completed, 5) for completed in range(1, 6)])
+        self.assertEqual(report.jobreportresult.total_jobs, 1)
+        self.assertEqual(report.orderreportresult.total_orders, 2)
+        self.assertEqual(report.userreportresult.total_users, 3)
+
+    def test_runs_sequentially_inside_transactions(self):
+        from stat_analysis.orchestrator import can_run_in_parallel
+        self.assertFalse(can_run_in_parallel())
+
+
+class ReportCacheTestCase(TestCase):
+    def setUp(self):
+        caches['stat_reports'].clear()
+        self.service_provider = ServiceProvider.objects.create(name="Provider")
+        self.year = timezone.now().year - 2
+
+    def create_job(self, quarter, completion_time):
+        start = quarter_start(quarter_index(quarter, self.year)) + timedelta(days=1)
+        return Job.objects.create(job_name="Job", state="completed", job_type="regular", starting_date=start, end_date=start + timedelta(days=2), completion_time=completion_time, service_provider=self.service_provider, price=100)
+
+    def test_cached_until_range_changes(self):
+        self.create_job('Q2', 4)
+        self.assertEqual(compute_job_stats('Q2', self.year, 'Q3', self.year)['total_jobs'], 1)
+        with self.assertNumQueries(0):
+            compute_job_stats('Q2', self.year, 'Q3', self.year)
+
+        # Writes outside the range keep the entry valid
+        self.create_job('Q1', 10)
+        self.create_job('Q4', 10)
+        with self.assertNumQueries(0):
+            stats = compute_job_stats('Q2', self.year, 'Q3', self.year)
+        self.assertEqual(stats['total_jobs'], 1)
+
+        job = self.create_job('Q3', 8)
+        stats = compute_job_stats('Q2', self.year, 'Q3', self.year)
+        self.assertEqual(stats['total_jobs'], 2)
+        self.assertAlmostEqual(stats['avg_completion_time_regular'], 6)
+
+        job.delete()
+        self.assertEqual(compute_job_stats('Q2', self.year, 'Q3', self.year)['total_jobs'], 1)
+
+    def test_order_cache_follows_job_price(self):
+        customer = User.objects.create_user(username="customer", password="pass", user_type="CUSTOMER").customer
+        job = self.create_job('Q2', 4)
+        Order.objects.create(customer=customer, job=job)
+        quarter = f"Q{(timezone.now().month - 1) // 3 + 1}"
+        self.assertEqual(compute_order_stats(quarter, timezone.now().year, quarter, timezone.now().year)['total_revenue'], 100)
+
+        job.price = 250
+        job.save()
+        self.assertEqual(compute_order_stats(quarter, timezone.now().year, quarter, timezone.now().year)['total_revenue'], 250)
+
+    def test_user_cache_depends_on_earlier_quarters(self):
+        self.assertEqual(compute_user_stats('Q3', self.year, 'Q3', self.year)['total_users'], 0)
+        user = User.objects.create_user(username="early", password="pass", user_type="CUSTOMER")
+        user.date_joined = quarter_start(quarter_index('Q1', self.year))
+        user.save()
+        self.assertEqual(compute_user_stats('Q3', self.year, 'Q3', self.year), {'total_users': 1, 'new_users': 0})
+
+        # A later sign-up does not affect the range
+        User.objects.create_user(username="late", password="pass", user_type="CUSTOMER")
+        with self.assertNumQueries(0):
+            compute_user_stats('Q3', self.year, 'Q3', self.year)
+
+    def test_job_writes_bump_one_version(self):
+        cache = caches['stat_reports']
+        with mock.patch.object(cache, 'set_many', wraps=cache.set_many) as set_many:
+            report_cache.invalidate('job', [quarter_index('Q2', self.year)])
+        self.assertEqual(len(set_many.call_args.args[0]), 1)
+
+    def test_autocommit_writes_bump_once(self):
+        # Outside a transaction on_commit() runs at once; a second bump would only cost time.
+        with mock.patch.object(cache_versions, 'bump') as bump, mock.patch.object(connection, 'in_atomic_block', False):
+            report_cache.invalidate('job', [quarter_index('Q2', self.year)])
+        self.assertEqual(bump.call_count, 1)
+
+    def test_bumps_do_not_read_the_version(self):
+        # FileBasedCache.incr() is a get() and a set(), so two increments racing from the
+        # same value would store the same version. A bump stores a fresh value unread.
+        cache = caches['stat_reports']
+        versions = {report_cache.range_version(cache, 'job', 1, 1)}
+        for _ in range(2):
+            with mock.patch.object(cache, 'get', side_effect=AssertionError), \
+                    mock.patch.object(cache, 'get_many', side_effect=AssertionError):
+                report_cache.invalidate('job', [1])
+            versions.add(report_cache.range_version(cache, 'job', 1, 1))
+        self.assertEqual(len(versions), 3)
+
+    def test_versions_are_shared_between_processes(self):
+        # A separate backend instance, as another web worker or the report worker would create.
+        from django.core.cache.backends.locmem import LocMemCache
+
+        # LocMemCache instances only share entries within one process.
+        self.assertNotIsInstance(caches['stat_reports'], LocMemCache)
+        other_process = caches.create_connection('stat_reports')
+        self.create_job('Q2', 4)
+        with mock.patch('stat_analysis.report_cache.get_cache', return_value=other_process):
+            self.assertEqual(compute_job_stats('Q2', self.year, 'Q2', self.year)['total_jobs'], 1)
+
+        # The write bumps the versions through this process's instance.
+        self.create_job('Q2', 8)
+        with mock.patch('stat_analysis.report_cache.get_cache', return_value=other_process):
+            self.assertEqual(compute_job_stats('Q2', self.year, 'Q2', self.year)['total_jobs'], 2)
+
+
+class CompletionTimeSketchTestCase(TestCase):
+    def test_quantiles_within_relative_accuracy(self):
+        values = [random.Random(seed).lognormvariate(2, 1.5) for seed in range(2000)]
+        # Build the sketch in two halves and merge them, as a multi-quarter report does
+        sketch = sketches.merge(self.sketch_of(values[:1000]), self.sketch_of(values[1000:]))
+        ordered = sorted(values)
+        for q in (0, 0.5, 0.9, 0.99, 1):
+            exact = ordered[int(q * (len(values) - 1))]
+            self.assertAlmostEqual(sketches.quantile(sketch, q), exact, delta=exact * sketches.RELATIVE_ACCURACY)
+
+    def test_removal_and_empty_sketch(self):
+        sketch = self.sketch_of([0, 3, 3, 40])
+        sketches.add(sketch, 40, -1)
+        sketches.add(sketch, 3, -2)
+        self.assertEqual(sketch, self.sketch_of([0]))
+        self.assertEqual(sketches.quantile(sketch, 0.5), 0)
+        self.assertIsNone(sketches.quantile(sketches.empty(), 0.5))
+        self.assertEqual(sketches.histogram(self.sketch_of([0.5, 3, 700])), [1, 0, 1, 0, 0, 0, 0, 0, 0, 1])
+
+    def sketch_of(self, values):
+        sketch = sketches.empty()
+        for value in values:
+            sketches.add(sketch, value)
+        return sketch
+
+class QuarterSpanDataMixin:
+    # Jobs spanning one or more quarters over seven quarters, one order per job, and users joining over time.
+    def setUp(self):
+        caches['stat_reports'].clear()
+        customer = User.objects.create_user(username="customer", password="pass", user_type="CUSTOMER").customer
+        self.providers = [ServiceProvider.objects.create(name="Provider"), ServiceProvider.objects.create(name="Other")]
+        self.year = timezone.now().year - 2
+        first = quarter_index('Q1', self.year)
+        spans = [(0, 0, 'regular', 'created', 2), (0, 1, 'wafer_run', 'active', 40), (1, 1, 'regular', 'completed', 5),
+                 (2, 4, 'wafer_run', 'completed', 90), (3, 3, 'regular', 'active', 7), (5, 6, 'regular', 'created', 11)]
+        for position, (start, end, job_type, state, completion_time) in enumerate(spans):
+            starting_date = quarter_start(first + start) + timedelta(days=3)
+            job = Job.objects.create(
+                job_name="Job", state=state, job_type=job_type, starting_date=starting_date,
+                end_date=quarter_start(first + end) + timedelta(days=20), completion_time=completion_time,
+                service_provider=self.providers[position % 2], price=Decimal('10.25') * (start + 1),
+            )
+            order = Order.objects.create(customer=customer, job=job)
+            order.created_at = starting_date
+            order.save()
+        for offset in (0, 2, 2, 5):
+            user = User.objects.create_user(username=f"user{offset}-{User.objects.count()}", password="pass", user_type="CUSTOMER")
+            user.date_joined = quarter_start(first + offset)
+            user.save()
+
+        quarters = [(f"Q{i % 4 + 1}", self.year + i // 4) for i in range(7)]
+        self.ranges = [(qf, yf, qt, yt) for i, (qf, yf) in enumerate(quarters) for (qt, yt) in quarters[i:]]
+
+class ReportBatchTestCase(QuarterSpanDataMixin, TestCase):
+
+    def test_batch_matches_single_reports(self):
+        reports = calculate_report_batch(self.ranges)
+        self.assertEqual(len(reports), len(self.ranges))
+        for quarter_range in self.ranges:
+            report = reports[quarter_range]
+            job_stats = compute_job_stats(*quarter_range)
+            order_stats = compute_order_stats(*quarter_range)
+            user_stats = compute_user_stats(*quarter_range)
+            stored = JobReportResult.objects.get(report=report)
+            for field, value in job_stats.items():
+                self.assertAlmostEqual(getattr(stored, field), value, places=6, msg=(quarter_range, field))
+            stored = OrderReportResult.objects.get(report=report)
+            self.assertEqual(stored.total_orders, order_stats['total_orders'])
+            self.assertEqual(stored.total_revenue, order_stats['total_revenue'])
+            self.assertEqual(stored.average_order_value, Decimal(order_stats['average_order_value']).quantize(Decimal('0.01')))
+            stored = UserReportResult.objects.get(report=report)
+            self.assertEqual((stored.total_users, stored.new_users), (user_stats['total_users'], user_stats['new_users']))
+
+    def test_batch_upserts_with_constant_queries(self):
+        calculate_report_batch(self.ranges[:3])
+        with self.assertNumQueries(11):
+            calculate_report_batch(self.ranges)
+        self.assertEqual(Report.objects.count(), len(self.ranges))
+        self.assertEqual(JobReportResult.objects.count(), len(self.ranges))
+
+
+@unittest.skipUnless(vectorized.is_available(), "NumPy is not installed")
+class VectorizedBackendTestCase(QuarterSpanDataMixin, TestCase):
+    def test_matches_orm_statistics(self):
+        start, end = get_datetime_range(*self.ranges[-1])
+        start = get_datetime_range(*self.ranges[0])[0]
+        frame = vectorized.ReportFrame.load(start, end, chunk_size=2)
+        for quarter_range in self.ranges:
+            range_start, range_end = get_datetime_range(*quarter_range)
+            expected = aggregate_job_stats(range_start, range_end)
+            for field, value in frame.job_stats(range_start, range_end).items():
+                self.assertAlmostEqual(value, expected[field], places=6, msg=(quarter_range, field))
+            self.assertEqual(frame.order_stats(range_start, range_end), aggregate_order_stats(range_start, range_end))
+            self.assertEqual(frame.user_stats(range_start, range_end), aggregate_user_stats(range_start, range_end))
+
+    def test_richer_metrics(self):
+        start, end = get_datetime_range('Q1', self.year, 'Q3', self.year + 1)
+        frame = vectorized.ReportFrame.load(start, end)
+        self.assertEqual(frame.completion_time_percentiles(start, end, percentiles=(0, 50, 100)), {0: 2.0, 50: 9.0, 100: 90.0})
+        self.assertEqual(frame.completion_time_percentiles(start, end, percentiles=(50,), job_type='wafer_run'), {50: 65.0})
+        counts, edges = frame.completion_time_histogram(start, end, bins=2)
+        self.assertEqual((counts, edges), ([5, 1], [2.0, 46.0, 90.0]))
+
+        breakdown = frame.provider_breakdown(start, end)
+        first, other = self.providers
+        self.assertEqual(breakdown[first.pk], {'total_jobs': 3, 'total_orders': 3, 'total_revenue': Decimal('71.75')})
+        self.assertEqual(breakdown[other.pk], {'total_jobs': 3, 'total_orders': 3, 'total_revenue': Decimal('102.50')})
+
+    def assertHistogramWithinAccuracy(self, counts, values):
+        # A sketch bucket straddling an edge is counted below it, so the count up to
+        # each edge is at least that of the exact values and at most GAMMA above it.
+        cumulative = list(itertools.accumulate(counts))
+        for edge, count in zip(sketches.HISTOGRAM_EDGES, cumulative):
+            self.assertLessEqual(sum(value <= edge for value in values), count, msg=edge)
+            self.assertLessEqual(count, sum(value <= edge * sketches.GAMMA for value in values), msg=edge)
+        self.assertEqual(cumulative[-1], len(values))
+
+    def test_distribution_matches_sketches(self):
+        for quarter_range in self.ranges:
+            start, end = get_datetime_range(*quarter_range)
+            frame = vectorized.ReportFrame.load(start, end)
+            exact = frame.completion_time_distribution(start, end)
+            approximate = rollup_completion_time_distribution(*get_quarter_range(*quarter_range))
+            self.assertEqual(approximate['completion_time_histogram']['edges'], exact['completion_time_histogram']['edges'])
+            for code, job_type in enumerate(vectorized.JOB_TYPES):
+                values = frame.jobs['completion_time'][frame.job_mask(start, end) & (frame.jobs['job_type'] == code)]
+                self.assertHistogramWithinAccuracy(approximate['completion_time_histogram'][job_type], values.tolist())
+            for field, value in exact.items():
+                if field.startswith('completion_time_p') and value is not None:
+                    self.assertAlmostEqual(approximate[field], value, delta=value * sketches.RELATIVE_ACCURACY)
+                elif field.startswith('completion_time_p'):
+                    self.assertIsNone(approximate[field])
+
+    @override_settings(STAT_ANALYSIS_BACKEND='vectorized')
+    def test_orchestrator_uses_vectorized_backend(self):
+        quarter_range = ('Q1', self.year, 'Q4', self.year)
+        with mock.patch('stat_analysis.stat_utils.compute_job_stats') as compute_job_stats_mock:
+            report = generate_report(*quarter_range)
+        compute_job_stats_mock.assert_not_called()
+        self.assertEqual(JobReportResult.objects.get(report=report).total_jobs, 4)
+        self.assertEqual(OrderReportResult.objects.get(report=report).total_orders, 5)
+
+
+class ReportBreakdownTestCase(APITestCase):
+    def setUp(self):
+        caches['stat_reports'].clear()
+        self.year = timezone.now().year - 1
+        customer = User.objects.create_user(username="customer", password="pass", user_type="CUSTOMER").customer
+        self.managers = [
+            User.objects.create_user(username=f"manager{i}", password="pass", user_type="ACCOUNT_MANAGER").account_manager
+            for i in range(2)
+        ]
+        self.providers = [ServiceProvider.objects.create(name=f"Provider {i}") for i in range(3)]
+        created_at = quarter_start(quarter_index('Q2', self.year)) + timedelta(days=5)
+        # (provider, manager, price, completion time, orders)
+        for provider, manager, price, completion_time, orders in [(0, 0, 100, 4, 1), (1, 0, 50, 10, 3), (1, 1, 30, 20, 1), (2, None, 10, 6, 2)]:
+            job = Job.objects.create(
+                job_name="Job", state="completed", job_type="regular", starting_date=created_at,
+                end_date=created_at + timedelta(days=3), completion_time=completion_time,
+                service_provider=self.providers[provider], price=price,
+            )
+            for _ in range(orders):
+                order = Order.objects.create(customer=customer, job=job, account_manager=self.managers[manager] if manager is not None else None)
+                order.created_at = created_at
+                order.save()
+        self.quarter_range = ('Q1', self.year, 'Q4', self.year)
+
+    def test_provider_breakdown(self):
+        with self.assertNumQueries(2):
+            rows = compute_provider_breakdown(*self.quarter_range)
+        self.assertEqual(
+            [(row['service_provider_id'], row['total_orders'], row['total_revenue'], row['total_jobs'], row['avg_completion_time']) for row in rows],
+            [(self.providers[1].pk, 4, 180, 2, 15), (self.providers[0].pk, 1, 100, 1, 4), (self.providers[2].pk, 2, 20, 1, 6)],
+        )
+        top = compute_provider_breakdown(*self.quarter_range, top=1)
+        self.assertEqual([(row['service_provider_id'], row['total_jobs']) for row in top], [(self.providers[1].pk, 2)])
+
+    def test_account_manager_breakdown(self):
+        with self.assertNumQueries(1):
+            rows = compute_account_manager_breakdown(*self.quarter_range)
+        self.assertEqual(
+            [(row['account_manager_id'], row['total_orders'], row['total_revenue'], row['avg_completion_time']) for row in rows],
+            [(self.managers[0].pk, 4, 250, 8.5), (self.managers[1].pk, 1, 30, 20)],
+        )
+
+    def test_query_count_independent_of_providers(self):
+        for i in range(20):
+            ServiceProvider.objects.create(name=f"Idle {i}")
+        with self.assertNumQueries(2):
+            compute_provider_breakdown(*self.quarter_range, top=2)
+
+    def test_report_stores_breakdowns(self):
+        report = generate_report(*self.quarter_range)
+        generate_report(*self.quarter_range, report=report)
+        self.assertEqual(ProviderReportResult.objects.filter(report=report).count(), 3)
+        self.assertEqual(AccountManagerReportResult.objects.filter(report=report).count(), 2)
+
+        response = self.client.get(reverse('report-providers', args=[report.pk]), {'top': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['service_provider'] for row in response.data], [self.providers[1].pk, self.providers[0].pk])
+        response = self.client.get(reverse('report-account-managers', args=[report.pk]), {'order_by': 'avg_completion_time', 'top': 1})
+        self.assertEqual([row['account_manager'] for row in response.data], [self.managers[1].pk])
+        response = self.client.get(reverse('report-providers', args=[report.pk]), {'order_by': 'job_name'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        for top in ('-3', '0', 'ten'):
+            response = self.client.get(reverse('report-providers', args=[report.pk]), {'top': top})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(READ_REPLICA_ALIAS='replica')
+class ReadReplicaRoutingTestCase(ReplicaTestMixin, QuarterSpanDataMixin, TransactionTestCase):
+    # The replica is up to date after setUp() and lags behind later writes.
+
+    def setUp(self):
+        super().setUp()
+        from execution.models import Customer
+
+        self.replicate(User, ServiceProvider, AccountManager, Customer, Job, Order, JobQuarterRollup, OrderQuarterRollup, UserQuarterRollup)
+
+    def test_routing(self):
+        self.assertEqual(Job.objects.db, 'default')
+        with read_from_replica():
+            self.assertEqual(Job.objects.db, 'replica')
+            self.assertEqual(Report.objects.db, 'replica')
+            job = Job.objects.first()
+            self.assertEqual(job._state.db, 'replica')
+            with transaction.atomic():
+                self.assertEqual(Job.objects.db, 'default')
+        with CaptureQueriesContext(connections['default']) as primary:
+            job.save(update_fields=['job_name'])
+        self.assertEqual([query['sql'].split()[0] for query in primary], ['BEGIN', 'UPDATE', 'COMMIT'])
+
+    def test_report_reads_use_replica(self):
+        quarter_range = self.ranges[-1]
+        expected = compute_job_stats(*quarter_range)
+        with CaptureQueriesContext(connections['replica']) as replica, \
+                CaptureQueriesContext(connections['default']) as primary:
+            report = generate_report(*quarter_range)
+            calculate_report_batch(self.ranges[:3])
+        self.assertTrue(replica.captured_queries)
+        self.assertTrue(all(query['sql'].startswith('SELECT') for query in replica.captured_queries))
+        self.assertTrue(any(query['sql'].startswith('INSERT') for query in primary.captured_queries))
+        self.assertEqual(JobReportResult.objects.get(report=report).total_jobs, expected['total_jobs'])
+
+    def test_results_of_a_lagging_replica_are_not_cached(self):
+        quarter_range = self.ranges[0]
+        start = quarter_start(quarter_index(*quarter_range[:2])) + timedelta(days=1)
+        Job.objects.create(
+            job_name="Late", state="created", job_type="regular", starting_date=start, end_date=start + timedelta(days=1),
+            completion_time=1, service_provider=self.providers[0], price=1,
+        )
+        with read_from_replica():
+            lagging = compute_job_stats(*quarter_range)
+        self.assertEqual(compute_job_stats(*quarter_range)['total_jobs'], lagging['total_jobs'] + 1)
+
+    def test_calculator_threads_inherit_replica_reads(self):
+        databases = []
+
+        def calculate(*quarter_range):
+            databases.append(Job.objects.db)
+            return {}
+
+        names = ['compute_job_stats', 'compute_order_stats', 'compute_user_stats',
+                 'compute_provider_breakdown', 'compute_account_manager_breakdown']
+        from stat_analysis.orchestrator import compute_report
+        with mock.patch.multiple('stat_analysis.stat_utils', **{name: calculate for name in names}), \
+                mock.patch('stat_analysis.orchestrator.can_run_in_parallel', return_value=True):
+            compute_report(*self.ranges[0])
+        self.assertEqual(databases, ['replica'] * 5)
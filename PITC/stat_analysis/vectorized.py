@@ -0,0 +1,249 @@
+"""stat_analysis.vectorized
+
+In-memory columnar backend for report statistics, built on NumPy.
+
+ReportFrame.load() streams the columns the reports need out of Job,
+Order and User in chunks and keeps them as NumPy arrays: timestamps as
+int64 microseconds since the epoch, job types, states and service
+providers as small integer codes, prices and revenue (quantity * price)
+as int64 cents. Report metrics
+are then computed with boolean masks and ``bincount`` instead of SQL, and
+the same arrays answer metrics the rollups cannot, such as completion
+time percentiles, histograms and per-provider breakdowns, without further
+queries.
+
+NumPy is optional: is_available() is False when it is not installed, and
+the orchestrator only uses this backend when
+``STAT_ANALYSIS_BACKEND = 'vectorized'`` and NumPy can be imported.
+"""
+
+import datetime
+from decimal import Decimal
+from itertools import islice
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+
+from .quarters import quarter_bounds, quarter_index
+from .sketches import HISTOGRAM_EDGES, MIN_VALUE
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - exercised only without NumPy
+    np = None
+
+User = get_user_model()
+Job = apps.get_model('execution', 'Job')
+Order = apps.get_model('execution', 'Order')
+
+JOB_TYPES = [value for value, _ in Job.JOB_TYPE_CHOICES]
+STATES = [value for value, _ in Job.STATE_CHOICES]
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+ONE_MICROSECOND = datetime.timedelta(microseconds=1)
+
+def is_available():
+    return np is not None
+
+def to_micros(value):
+    # Exact integer conversion; datetime.timestamp() would round through a float.
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return (value - EPOCH) // ONE_MICROSECOND
+
+def _chunks(queryset, fields, chunk_size):
+    rows = queryset.values_list(*fields).iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+def _load_columns(queryset, fields, converters, chunk_size):
+    """Stream ``fields`` of ``queryset`` into one NumPy array per field.
+
+    ``converters`` maps each field to (dtype, function applied to every value).
+    """
+    parts = {field: [] for field in fields}
+    for chunk in _chunks(queryset, fields, chunk_size):
+        for position, field in enumerate(fields):
+            dtype, convert = converters[field]
+            parts[field].append(np.fromiter((convert(row[position]) for row in chunk), dtype=dtype, count=len(chunk)))
+    return {
+        field: np.concatenate(arrays) if arrays else np.empty(0, dtype=converters[field][0])
+        for field, arrays in parts.items()
+    }
+
+def _codes(values):
+    # Values outside the choices share the last code, so bincount never sees a negative.
+    codes = {value: code for code, value in enumerate(values)}
+    return lambda value: codes.get(value, len(values))
+
+def _cents(value):
+    return int(value * 100)
+
+class ReportFrame:
+    """Columns of the jobs, orders and users relevant to a datetime range.
+
+    Jobs are those inside [start, end), orders those created in it and users
+    those who joined before ``end``, so any sub-range of [start, end) can be
+    answered from the frame.
+    """
+
+    def __init__(self, jobs, orders, users, providers):
+        self.jobs = jobs
+        self.orders = orders
+        self.users = users
+        # Provider primary keys, indexed by the provider codes used in the columns.
+        self.providers = providers
+
+    @classmethod
+    def load(cls, start, end, chunk_size=5000):
+        providers = {}
+
+        def provider_code(pk):
+            return providers.setdefault(pk, len(providers))
+
+        jobs = _load_columns(
+            Job.objects.filter(starting_date__gte=start, end_date__lt=end).order_by(),
+            ['starting_date', 'end_date', 'job_type', 'state', 'completion_time', 'service_provider_id', 'price'],
+            {
+                'starting_date': (np.int64, to_micros),
+                'end_date': (np.int64, to_micros),
+                'job_type': (np.int8, _codes(JOB_TYPES)),
+                'state': (np.int8, _codes(STATES)),
+                'completion_time': (np.float64, float),
+                'service_provider_id': (np.int32, provider_code),
+                'price': (np.int64, _cents),
+            },
+            chunk_size,
+        )
+        orders = _load_columns(
+            Order.objects.filter(created_at__gte=start, created_at__lt=end).order_by(),
+            ['created_at', 'quantity', 'job__price', 'job__service_provider_id'],
+            {
+                'created_at': (np.int64, to_micros),
+                'quantity': (np.int64, int),
+                'job__price': (np.int64, _cents),
+                'job__service_provider_id': (np.int32, provider_code),
+            },
+            chunk_size,
+        )
+        orders['revenue'] = orders['quantity'] * orders['job__price']
+        users = _load_columns(
+            User.objects.filter(date_joined__lt=end).order_by(),
+            ['date_joined'],
+            {'date_joined': (np.int64, to_micros)},
+            chunk_size,
+        )
+        return cls(jobs, orders, users, list(providers))
+
+    def job_mask(self, start, end):
+        return (self.jobs['starting_date'] >= to_micros(start)) & (self.jobs['end_date'] < to_micros(end))
+
+    def order_mask(self, start, end):
+        created_at = self.orders['created_at']
+        return (created_at >= to_micros(start)) & (created_at < to_micros(end))
+
+    def job_stats(self, start, end):
+        mask = self.job_mask(start, end)
+        job_type = self.jobs['job_type'][mask]
+        type_counts = np.bincount(job_type, minlength=len(JOB_TYPES) + 1)
+        type_times = np.bincount(job_type, weights=self.jobs['completion_time'][mask], minlength=len(JOB_TYPES) + 1)
+        state_counts = np.bincount(self.jobs['state'][mask], minlength=len(STATES) + 1)
+
+        def average(job_type):
+            code = JOB_TYPES.index(job_type)
+            return float(type_times[code] / type_counts[code]) if type_counts[code] else 0
+
+        return {
+            'total_jobs': int(mask.sum()),
+            'avg_completion_time_regular': average('regular'),
+            'avg_completion_time_wafer_run': average('wafer_run'),
+            'jobs_created': int(state_counts[STATES.index('created')]),
+            'jobs_active': int(state_counts[STATES.index('active')]),
+            'jobs_completed': int(state_counts[STATES.index('completed')]),
+        }
+
+    def order_stats(self, start, end):
+        mask = self.order_mask(start, end)
+        total_orders = int(mask.sum())
+        total_revenue = Decimal(int(self.orders['revenue'][mask].sum())) / 100
+        return {
+            'total_orders': total_orders,
+            'total_revenue': total_revenue,
+            'average_order_value': total_revenue / total_orders if total_orders > 0 else 0,
+        }
+
+    def user_stats(self, start, end):
+        date_joined = self.users['date_joined']
+        before_end = date_joined < to_micros(end)
+        return {
+            'total_users': int(before_end.sum()),
+            'new_users': int((before_end & (date_joined >= to_micros(start))).sum()),
+        }
+
+    def completion_time_percentiles(self, start, end, percentiles=(50, 90, 99), job_type=None):
+        """Return {percentile: completion time} over the jobs in the range, None when there are none."""
+        mask = self.job_mask(start, end)
+        if job_type is not None:
+            mask &= self.jobs['job_type'] == JOB_TYPES.index(job_type)
+        times = self.jobs['completion_time'][mask]
+        if not times.size:
+            return {percentile: None for percentile in percentiles}
+        values = np.percentile(times, percentiles)
+        return {percentile: float(value) for percentile, value in zip(percentiles, values)}
+
+    def completion_time_distribution(self, start, end):
+        """The fields of rollup_utils.completion_time_distribution, computed from the completion times themselves.
+
+        The percentile and bucket rules are the same, but the rollups read
+        the distribution off DDSketches: their percentiles are within
+        sketches.RELATIVE_ACCURACY of these, and their histogram may count
+        a value that is less than that above an edge in the bucket below it.
+        """
+        mask = self.job_mask(start, end)
+        times = np.where(self.jobs['completion_time'] <= MIN_VALUE, 0.0, self.jobs['completion_time'])
+        stats = {'completion_time_histogram': {'edges': list(HISTOGRAM_EDGES)}}
+        for job_type in ('regular', 'wafer_run'):
+            values = times[mask & (self.jobs['job_type'] == JOB_TYPES.index(job_type))]
+            for percentile in (50, 90, 99):
+                stats[f'completion_time_p{percentile}_{job_type}'] = (
+                    float(np.percentile(values, percentile, method='lower')) if values.size else None
+                )
+            buckets = np.searchsorted(np.asarray(HISTOGRAM_EDGES, dtype=np.float64), values, side='left')
+            stats['completion_time_histogram'][job_type] = np.bincount(buckets, minlength=len(HISTOGRAM_EDGES) + 1).tolist()
+        return stats
+
+    def completion_time_histogram(self, start, end, bins=10):
+        """Return (counts, bin edges) of the completion times of the jobs in the range."""
+        counts, edges = np.histogram(self.jobs['completion_time'][self.job_mask(start, end)], bins=bins)
+        return counts.tolist(), edges.tolist()
+
+    def provider_breakdown(self, start, end):
+        """Return {provider pk: stats} with each provider's jobs, orders and revenue in the range."""
+        size = len(self.providers)
+        job_mask = self.job_mask(start, end)
+        order_mask = self.order_mask(start, end)
+        job_counts = np.bincount(self.jobs['service_provider_id'][job_mask], minlength=size)
+        order_providers = self.orders['job__service_provider_id'][order_mask]
+        order_counts = np.bincount(order_providers, minlength=size)
+        # bincount weights are floats; summing int64 cents per provider keeps revenue exact.
+        revenue = np.zeros(size, dtype=np.int64)
+        np.add.at(revenue, order_providers, self.orders['revenue'][order_mask])
+        return {
+            provider: {
+                'total_jobs': int(job_counts[code]),
+                'total_orders': int(order_counts[code]),
+                'total_revenue': Decimal(int(revenue[code])) / 100,
+            }
+            for code, provider in enumerate(self.providers)
+            if job_counts[code] or order_counts[code]
+        }
+
+def compute_report(quarter_from, year_from, quarter_to, year_to):
+    """Return (job stats, order stats, user stats) for the range from one load of the columns."""
+    start, end = quarter_bounds(quarter_index(quarter_from, year_from), quarter_index(quarter_to, year_to))
+    frame = ReportFrame.load(start, end)
+    job_stats = {**frame.job_stats(start, end), **frame.completion_time_distribution(start, end)}
+    return job_stats, frame.order_stats(start, end), frame.user_stats(start, end)
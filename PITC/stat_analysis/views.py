@@ -0,0 +1,44 @@
+from rest_framework import mixins, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from PITC.routers import ReplicaReadMixin
+from .models import Report, ProviderReportResult, AccountManagerReportResult
+from .serializers import ReportSerializer, ProviderReportResultSerializer, AccountManagerReportResultSerializer
+from .stat_utils import top_report_breakdown
+from .tasks import enqueue_report
+
+class ReportViewSet(ReplicaReadMixin, mixins.CreateModelMixin, viewsets.ReadOnlyModelViewSet):
+    """Create reports and poll the status of their background computation.
+
+    Only the list reads from the replica; polling a report reads the primary,
+    where its worker writes the status.
+    """
+    queryset = Report.objects.all()
+    serializer_class = ReportSerializer
+    breakdown_orderings = ('total_revenue', 'total_orders', 'avg_completion_time')
+
+    def perform_create(self, serializer):
+        enqueue_report(serializer.save())
+
+    def breakdown_response(self, result_model, serializer_class):
+        # ?top=N&order_by=<field>, descending; the top rows come straight off the breakdown index.
+        try:
+            top = int(self.request.query_params.get('top', 10))
+        except ValueError:
+            top = 0
+        if top < 1:
+            return Response({'error': 'top must be a positive integer'}, status=status.HTTP_400_BAD_REQUEST)
+        top = min(top, 1000)
+        order_by = self.request.query_params.get('order_by', 'total_revenue')
+        if order_by not in self.breakdown_orderings:
+            return Response({'error': f"order_by must be one of {', '.join(self.breakdown_orderings)}"}, status=status.HTTP_400_BAD_REQUEST)
+        rows = top_report_breakdown(result_model, self.get_object(), top, order_by=f'-{order_by}')
+        return Response(serializer_class(rows, many=True).data)
+
+    @action(detail=True, methods=['get'])
+    def providers(self, request, pk=None):
+        return self.breakdown_response(ProviderReportResult, ProviderReportResultSerializer)
+
+    @action(detail=True, methods=['get'], url_path='account-managers')
+    def account_managers(self, request, pk=None):
+        return self.breakdown_response(AccountManagerReportResult, AccountManagerReportResultSerializer)